@@ -0,0 +1,155 @@
+"""
+Cache of ready-to-use crews for the three pipeline stages.
+Building an LLM, Agent, Task and Crew is expensive, so each crew is built once per thread and reused;
+items run on threads owned by the cache, so their crews stay warm from one run to the next.
+The agent modules (and crewai with them) are only imported once a crew is actually needed.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import DEFAULT_LLM_MODEL, MAX_CONCURRENT_ITEMS, LLM_CONCURRENCY_INITIAL, LLM_CONCURRENCY_MAX, \
+    SEARCH_CONCURRENCY_INITIAL, SEARCH_CONCURRENCY_MAX, load_environment
+from utils.concurrency_utils import AdaptiveLimiter, SingleFlight
+
+
+def create_llm(model=DEFAULT_LLM_MODEL):
+    """
+    Create the LLM shared by all agents.
+
+    Args:
+        model: The model name to use (default: gemini/gemini-2.0-flash)
+
+    Returns:
+        LLM: The configured LLM instance
+    """
+    from crewai import LLM
+
+    load_environment()
+    return LLM(
+        model=model,
+        api_key=os.getenv("GEMINI_API_KEY")
+    )
+
+
+class CrewCache:
+    """
+    Builds the crews of each pipeline stage lazily and keeps them for reuse.
+
+    Crews keep state between kickoffs, so they must not be shared by threads running
+    at the same time; each thread gets its own set of crews. Runs process their items on the
+    cache's item threads (see run_items), which live as long as the cache, so the crews they
+    build serve every later run instead of being rebuilt each time. The adaptive limits on LLM
+    and web search calls, and the single-flight groups collapsing identical requests in
+    flight, are shared by every thread and stage using the cache.
+    """
+
+    def __init__(self, llm_instance=None, max_item_threads=MAX_CONCURRENT_ITEMS, processes=1):
+        """
+        Initialize the crew cache.
+
+        Args:
+            llm_instance: Optional LLM instance shared by all agents (built on first use if omitted)
+            max_item_threads: Number of item threads shared by the runs using the cache
+            processes: Number of processes calling the same providers (e.g. the workers of a
+                sharded run); each cache gets an equal share of the concurrency limits
+        """
+        self.llm = llm_instance
+        self._llm_lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_item_threads, thread_name_prefix="item")
+        self.llm_limiter = AdaptiveLimiter("llm", max(1, LLM_CONCURRENCY_INITIAL // processes),
+                                           max_limit=max(1, LLM_CONCURRENCY_MAX // processes))
+        self.search_limiter = AdaptiveLimiter("search", max(1, SEARCH_CONCURRENCY_INITIAL // processes),
+                                              max_limit=max(1, SEARCH_CONCURRENCY_MAX // processes))
+        self.llm_requests = SingleFlight()
+        self.search_requests = SingleFlight()
+
+    def get_llm(self):
+        """Return the shared LLM instance, creating it on first use."""
+        with self._llm_lock:
+            if self.llm is None:
+                self.llm = create_llm()
+            return self.llm
+
+    def run_items(self, function, arguments, max_concurrent):
+        """
+        Call a function for each item on the item threads, at most max_concurrent at a time.
+
+        Every item is processed even if some fail; the first error is raised once all are done.
+
+        Args:
+            function: The callable processing one item
+            arguments: List of argument tuples, one per item, processed in order
+            max_concurrent: Maximum number of items of this call processed at the same time
+
+        Raises:
+            Exception: The first error raised by the function
+        """
+        pending = iter(arguments)
+        pending_lock = threading.Lock()
+        errors = []
+
+        def process_items():
+            while True:
+                with pending_lock:
+                    args = next(pending, None)
+                if args is None:
+                    return
+                try:
+                    function(*args)
+                except Exception as e:
+                    errors.append(e)
+
+        futures = [self._executor.submit(process_items) for _ in range(min(max_concurrent, len(arguments)))]
+        for future in futures:
+            future.result()
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        """Stop the item threads once the runs using them are done."""
+        self._executor.shutdown(wait=True)
+
+    def _get_crew(self, key, build):
+        """Return the calling thread's crew for the given key, building it if needed."""
+        crews = self._local.__dict__.setdefault('crews', {})
+        if key not in crews:
+            crews[key] = build()
+        return crews[key]
+
+    def market_research_crew(self, max_searches=1, search_site="amazon"):
+        """Return a market research crew for the given search settings."""
+        def build():
+            from agents.market_research_agent import create_market_researcher, create_market_research_task, \
+                create_market_research_crew
+
+            researcher = create_market_researcher(self.get_llm(), search_limiter=self.search_limiter,
+                                                  search_requests=self.search_requests)
+            task = create_market_research_task(researcher, max_searches=max_searches, search_site=search_site)
+            return create_market_research_crew(researcher, task)
+
+        return self._get_crew(('market_research', max_searches, search_site), build)
+
+    def item_analysis_crew(self):
+        """Return an item analysis crew."""
+        def build():
+            from agents.item_analyst import create_item_analyst, create_item_analysis_task, create_item_analysis_crew
+
+            analyst = create_item_analyst(self.get_llm())
+            task = create_item_analysis_task(analyst)
+            return create_item_analysis_crew(analyst, task)
+
+        return self._get_crew(('item_analysis',), build)
+
+    def deal_message_crew(self):
+        """Return a deal message crew."""
+        def build():
+            from agents.deal_message_agent import create_deal_specialist, create_deal_message_task, \
+                create_deal_message_crew
+
+            specialist = create_deal_specialist(self.get_llm())
+            task = create_deal_message_task(specialist)
+            return create_deal_message_crew(specialist, task)
+
+        return self._get_crew(('deal_message',), build)
@@ -7,11 +7,10 @@ import os
 
 from crewai import Agent, Task, Crew
 from crewai import LLM
-from dotenv import load_dotenv
 
+from config.settings import load_environment
 from models.deal_models import DealMessageResult
 
-load_dotenv()
 
 def create_deal_specialist(llm_instance=None):
     """
@@ -24,6 +23,7 @@ def create_deal_specialist(llm_instance=None):
         Agent: The configured deal message specialist agent
     """
     if not llm_instance:
+        load_environment()
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         llm_instance = LLM(
             model='gemini/gemini-2.0-flash',
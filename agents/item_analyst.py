@@ -7,6 +7,7 @@ import os
 from crewai import Agent, Task, Crew
 from crewai import LLM
 
+from config.settings import load_environment
 from models.item_models import ItemAnalysisResult
 
 
@@ -22,6 +23,7 @@ def create_item_analyst(llm_instance=None):
     """
     # If no LLM instance is provided, create one using environment variables
     if not llm_instance:
+        load_environment()
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         llm_instance = LLM(
             model='gemini/gemini-2.0-flash',
@@ -2,23 +2,71 @@
 Agent definition for the Market Research Agent that searches for item market values.
 This agent uses SerperDevTool to find pricing information for second-hand items.
 """
+import contextlib
 import json
 import os
+import time
 
 from crewai import Agent, Task, Crew
 from crewai import LLM
-from crewai_tools import SerperDevTool
-from dotenv import load_dotenv
 
+from config.settings import load_environment
 from models.market_models import MarketValueResult
+from utils.trace_utils import span
+
+
+# Deal score bands: label, score range, and the (highest price as % of the market price, score)
+# steps scores are taken from; prices above the last step score 1-19, falling as the price rises
+DEAL_SCORE_BANDS = (
+    ("Excellent deal", (80, 100), ((30, 100), (40, 80))),
+    ("Good deal", (60, 79), ((50, 79), (60, 60))),
+    ("Fair price", (40, 59), ((75, 59), (90, 40))),
+    ("Above market", (20, 39), ((105, 39), (120, 20))),
+    ("Significantly overpriced", (1, 19), ()),
+)
+DEAL_SCORE_STEPS = tuple(step for _, _, steps in DEAL_SCORE_BANDS for step in steps)
+
+
+def _overpriced_score(price_ratio):
+    """Return the score of a price above the last step: 1-19, lower as the price rises."""
+    return max(1, min(19, int(200 - price_ratio)))
+
+
+def deal_score_label(price_ratio):
+    """
+    Return the label of the deal score band a price falls in.
+
+    Args:
+        price_ratio: The listing price as a percentage of the market price
+
+    Returns:
+        str: The band label, e.g. "Fair price"
+    """
+    for label, _, steps in DEAL_SCORE_BANDS:
+        if not steps or price_ratio <= steps[-1][0]:
+            return label
+
+
+def deal_score_criteria():
+    """
+    Describe the deal score bands, one line per band, for prompts and explanations.
+
+    Returns:
+        list: Lines like "Score 40-59: Fair price (61-90% of market price)"
+    """
+    lines = []
+    previous_ceiling = None
+    for label, (low, high), steps in DEAL_SCORE_BANDS:
+        if not steps:
+            prices = f">{previous_ceiling}%"
+        elif previous_ceiling is None:
+            prices = f"≤{steps[-1][0]}%"
+        else:
+            prices = f"{previous_ceiling + 1}-{steps[-1][0]}%"
+        lines.append(f"Score {low}-{high}: {label} ({prices} of market price)")
+        previous_ceiling = steps[-1][0] if steps else previous_ceiling
+    return lines
 
-load_dotenv()
-# Retrieve the SERPER_API_KEY value
-serper_api_key = os.getenv('SERPER_API_KEY')
-if serper_api_key:
-    os.environ["SERPER_API_KEY"] = serper_api_key
-else:
-    print("Warning: SERPER_API_KEY not found in environment variables")
 
 def calculate_deal_score(listing_price, market_avg_price):
     """
@@ -29,41 +77,103 @@ def calculate_deal_score(listing_price, market_avg_price):
         market_avg_price: Average market price
 
     Returns:
-        int: Score from 1-100 where:
-        80-100: Excellent deal (≤40% of market price)
-        60-79: Good deal (41-60% of market price)
-        40-59: Fair price (61-90% of market price)
-        20-39: Above market (91-120% of market price)
-        1-19: Significantly overpriced (>120% of market price)
+        int: Score from 1-100 in the bands of DEAL_SCORE_BANDS (see deal_score_criteria)
     """
     price_ratio = (listing_price / market_avg_price) * 100
 
-    if price_ratio <= 40:
-        # 80-100 range for excellent deals
-        return 100 if price_ratio <= 30 else 80
-    elif price_ratio <= 60:
-        # 60-79 range for good deals
-        return 79 if price_ratio <= 50 else 60
-    elif price_ratio <= 90:
-        # 40-59 range for fair prices
-        return 59 if price_ratio <= 75 else 40
-    elif price_ratio <= 120:
-        # 20-39 range for above market
-        return 39 if price_ratio <= 105 else 20
-    else:
-        # 1-19 range for significantly overpriced
-        return max(1, min(19, int(200 - price_ratio)))
-
-def create_market_researcher(llm_instance=None):
+    for highest_ratio, score in DEAL_SCORE_STEPS:
+        if price_ratio <= highest_ratio:
+            return score
+    return _overpriced_score(price_ratio)
+
+
+def calculate_deal_scores(listing_prices, market_avg_prices):
+    """
+    Calculate deal scores for many listings at once, with the bands of calculate_deal_score.
+
+    Args:
+        listing_prices: Sequence or array of listing prices
+        market_avg_prices: Sequence or array of average market prices, aligned with listing_prices
+
+    Returns:
+        numpy.ndarray: int64 scores equal to calculate_deal_score element by element; listings
+        without a price or without a positive market price score 0
+    """
+    # numpy is only needed for batch scoring, so it isn't loaded at startup
+    import numpy as np
+
+    listing_prices = np.asarray(listing_prices, dtype=np.float64)
+    market_avg_prices = np.asarray(market_avg_prices, dtype=np.float64)
+    valid = np.isfinite(listing_prices) & np.isfinite(market_avg_prices) & (market_avg_prices > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_ratio = (listing_prices / market_avg_prices) * 100
+        overpriced = np.clip(np.trunc(200 - price_ratio), 1, 19)
+
+    scores = np.select(
+        [price_ratio <= highest_ratio for highest_ratio, _ in DEAL_SCORE_STEPS],
+        [score for _, score in DEAL_SCORE_STEPS],
+        default=overpriced
+    )
+    return np.where(valid, scores, 0).astype(np.int64)
+
+
+def create_search_tool(limiter=None, requests=None):
+    """
+    Create the web search tool of the researcher.
+
+    Args:
+        limiter: Optional AdaptiveLimiter every search waits for
+        requests: Optional SingleFlight sharing the results of identical searches in flight
+
+    Returns:
+        SerperDevTool: The search tool
+    """
+    # crewai_tools is slow to import, so it is only loaded once a researcher is needed
+    from crewai_tools import SerperDevTool
+
+    from services.cache_service import ResultCache
+
+    class SharedSerperDevTool(SerperDevTool):
+        """
+        SerperDevTool whose searches are traced and go through the shared limiter and
+        single-flight group, when given.
+        """
+
+        def _search(self, kwargs):
+            with limiter.slot("search") if limiter is not None else contextlib.nullcontext(), \
+                    span("serper.request"):
+                return super()._run(**kwargs)
+
+        def _run(self, **kwargs):
+            with span("tool.serper", query=kwargs.get("search_query")) as tool_span:
+                started = time.perf_counter()
+                if requests is None:
+                    result, shared = self._search(kwargs), False
+                else:
+                    result, shared = requests.do(ResultCache.fingerprint("serper", kwargs), self._search, kwargs)
+                # A hit is a search answered by an identical one already in flight
+                tool_span.set_attributes(hit=shared, latency=round(time.perf_counter() - started, 3))
+                return result
+
+    return SharedSerperDevTool()
+
+
+def create_market_researcher(llm_instance=None, search_limiter=None, search_requests=None):
     """
     Create and return a Market Research agent.
 
     Args:
         llm_instance: Optional LLM instance to use for the agent
+        search_limiter: Optional AdaptiveLimiter bounding the concurrent web searches
+        search_requests: Optional SingleFlight sharing the results of identical searches in flight
 
     Returns:
         Agent: The configured Market Research agent
     """
+    # SerperDevTool reads SERPER_API_KEY from the environment
+    load_environment()
+
     if not llm_instance:
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         llm_instance = LLM(
@@ -82,7 +192,7 @@ def create_market_researcher(llm_instance=None):
     return Agent(
         config=agent_config,
         llm=llm_instance,
-        tools=[SerperDevTool()]
+        tools=[create_search_tool(search_limiter, search_requests)]
     )
 
 def create_market_research_task(agent, item_data=None, max_searches=1, search_site="amazon"):
@@ -98,22 +208,21 @@ def create_market_research_task(agent, item_data=None, max_searches=1, search_si
     Returns:
         Task: The configured market research task
     """
+    criteria = "\n".join(f"           - {line}" for line in deal_score_criteria())
     task_config = {
         "description": f"""
         Research the current market value for this second-hand item: {{item_data}}
 
         Follow these steps:
-        1. Extract key information like brand, model, specifications, and condition
+        1. Extract key information like brand, model, specifications, and condition (when the item data
+           has specs, they were already extracted: use them as given)
         2. Search for similar items on {search_site.capitalize()} (limit to {max_searches} search)
-        3. Find comparable listings with similar specifications and condition
+        3. Find comparable listings with similar specifications and condition; any similar_vinted_listings
+           in the item data are recent Vinted prices and count as comparables with source "Vinted"
         4. Calculate the average market price for similar items
         5. Note any factors that might affect the value (rarity, demand, etc.)
         6. Calculate the deal score using these criteria:
-           - Score 80-100: Excellent deal (≤40% of market price)
-           - Score 60-79: Good deal (41-60% of market price)
-           - Score 40-59: Fair price (61-90% of market price)
-           - Score 20-39: Above market (91-120% of market price)
-           - Score 1-19: Significantly overpriced (>120% of market price)
+{criteria}
 
         Provide a detailed analysis with specific price points and clear scoring justification. The score value should be between 0 and 100.
         """,
@@ -0,0 +1,82 @@
+"""
+Benchmark of batch deal scoring: calculate_deal_score in a Python loop against the
+vectorized calculate_deal_scores.
+
+Before timing, the vectorized scores are checked to equal the scalar ones element by element,
+on the random prices and on ratios sitting exactly on every band boundary.
+
+Usage:
+    python benchmarks/deal_score_benchmark.py [--listings 1000000] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import numpy as np  # noqa: E402
+
+from agents.market_research_agent import calculate_deal_score, calculate_deal_scores  # noqa: E402
+
+# Price ratios (in % of the market price) where calculate_deal_score changes band
+BAND_EDGES = (30, 40, 50, 60, 75, 90, 105, 120, 181, 199, 200)
+
+
+def make_prices(count, seed):
+    """Build listing and market prices covering every band, plus exact band edges."""
+    rng = np.random.default_rng(seed)
+    market = rng.uniform(5, 500, count).round(2)
+    listing = (market * rng.uniform(0.05, 2.5, count)).round(2)
+
+    edges = np.array([edge + offset for edge in BAND_EDGES for offset in (-0.01, 0, 0.01)])
+    listing = np.concatenate([listing, edges, edges * 3.7])
+    market = np.concatenate([market, np.full(edges.size, 100.0), np.full(edges.size, 370.0)])
+    return listing, market
+
+
+def check_equivalence(listing, market):
+    """Assert the vectorized scores equal the scalar ones for every listing."""
+    expected = np.array([calculate_deal_score(price, average) for price, average
+                         in zip(listing.tolist(), market.tolist())], dtype=np.int64)
+    actual = calculate_deal_scores(listing, market)
+    mismatches = np.flatnonzero(expected != actual)
+    assert mismatches.size == 0, (
+        f"{mismatches.size} mismatches, first at price={listing[mismatches[0]]} market={market[mismatches[0]]}: "
+        f"scalar {expected[mismatches[0]]}, vectorized {actual[mismatches[0]]}"
+    )
+
+
+def measure(score, repeats):
+    """Return the best wall time of score() over the repeats, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        score()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure scalar vs vectorized deal scoring")
+    parser.add_argument("--listings", type=int, default=1_000_000, help="Number of listings scored")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic prices")
+    args = parser.parse_args()
+
+    listing, market = make_prices(args.listings, args.seed)
+    check_equivalence(listing, market)
+    print(f"Vectorized scores match calculate_deal_score on {listing.size:,} listings")
+
+    listing_list, market_list = listing.tolist(), market.tolist()
+    scalar_ms = measure(lambda: [calculate_deal_score(price, average)
+                                 for price, average in zip(listing_list, market_list)], repeats=1)
+    vectorized_ms = measure(lambda: calculate_deal_scores(listing, market), repeats=5)
+
+    print(f"Scalar loop:  {scalar_ms:10.1f} ms")
+    print(f"Vectorized:   {vectorized_ms:10.1f} ms")
+    print(f"Speed-up:     {scalar_ms / vectorized_ms:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
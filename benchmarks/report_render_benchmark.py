@@ -0,0 +1,92 @@
+"""
+Microbenchmark of the per-report render overhead of ReportService.
+
+Compares building a fresh Jinja2 environment and re-parsing the template for every report
+(the previous behaviour) with the shared, precompiled environment ReportService now uses.
+Only rendering is measured; nothing is written to disk.
+
+Usage:
+    python benchmarks/report_render_benchmark.py [--reports 200] [--items 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import jinja2  # noqa: E402
+
+from models.item_models import ItemAnalysisResult  # noqa: E402
+from models.listing_models import VintedListing  # noqa: E402
+from models.market_models import MarketValueResult  # noqa: E402
+from models.record_models import ItemRecord  # noqa: E402
+from services.report_service import ReportService, REPORT_TEMPLATE  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(PROJECT_DIR, "templates")
+
+
+def make_records(count):
+    """Build synthetic records resembling a real sweep."""
+    records = []
+    for i in range(count):
+        item_id = str(1000 + i)
+        listing = VintedListing(id=item_id, title=f"Ssd Samsung 860 evo 500gb #{i}", price=40.0 + i, currency="EUR",
+                                brand="Samsung", status="New with tags", location="Monza, Italy")
+        research = MarketValueResult(item_id=item_id, average_price=80.0, price_range=[60.0, 95.0],
+                                     comparable_items=[], value_assessment="Underpriced", market_demand="High",
+                                     price_factors=["Capacity", "Condition"], confidence_score=7,
+                                     notes="Consistent pricing across sources.")
+        analysis = ItemAnalysisResult(item_id=item_id, score=i % 100, title=listing.title, price=listing.price,
+                                      status=listing.status, notes="Priced well below the market average. " * 5)
+        records.append(ItemRecord(item_id=item_id, listing=listing, research=research, analysis=analysis))
+    return records
+
+
+def render_uncached(template_data):
+    """Render the way ReportService used to: a new environment and template parse per report."""
+    environment = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=TEMPLATE_DIR))
+    return environment.get_template(REPORT_TEMPLATE).render(**template_data)
+
+
+def render_cached(report_service, template_data):
+    """Render through ReportService's shared environment."""
+    return report_service._get_template(REPORT_TEMPLATE).render(**template_data)
+
+
+def measure(render, reports):
+    """Return the mean milliseconds per report."""
+    started = time.perf_counter()
+    for _ in range(reports):
+        render()
+    return (time.perf_counter() - started) * 1000 / reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-report render overhead")
+    parser.add_argument("--reports", type=int, default=200, help="Reports rendered per variant")
+    parser.add_argument("--items", type=int, default=5, help="Items per report")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        report_service = ReportService(template_dir=TEMPLATE_DIR, output_dir=scratch,
+                                       bytecode_cache_dir=os.path.join(scratch, "bytecode"))
+        template_data = report_service._prepare_template_data("ssd", make_records(args.items))
+
+        # Warm both paths once so the comparison is steady state
+        render_uncached(template_data)
+        render_cached(report_service, template_data)
+
+        before = measure(lambda: render_uncached(template_data), args.reports)
+        after = measure(lambda: render_cached(report_service, template_data), args.reports)
+
+    print(f"{args.items} items per report, {args.reports} reports per variant")
+    print(f"  new environment per report: {before:7.3f} ms/report")
+    print(f"  shared compiled template:   {after:7.3f} ms/report")
+    print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
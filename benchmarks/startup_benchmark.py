@@ -0,0 +1,106 @@
+"""
+Startup benchmark for the command-line interface.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``; the script reports
+the median wall-clock time, the total import time and the slowest top-level imports.
+
+Scenarios:
+    help          python main.py --help
+    quick-cached  python main.py --quick up to the first network call. With every stage
+                  result in ./cache, this is the whole startup cost of the run: the LLM
+                  and crews are never built.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUICK_CACHED_SNIPPET = """
+import sys
+sys.argv = ["main.py", "--quick"]
+import main
+main.create_pipeline({
+    "search_text": main.DEFAULT_SEARCH_TEXT,
+    "max_items": main.DEFAULT_MAX_ITEMS,
+    "max_searches": 1,
+    "search_site": "amazon",
+})
+"""
+
+SCENARIOS = {
+    "help": ["main.py", "--help"],
+    "quick-cached": ["-c", QUICK_CACHED_SNIPPET],
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of -X importtime.
+
+    Returns:
+        A list of (module, cumulative microseconds) tuples for the top-level imports
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # Nested imports are indented below the import that triggered them
+        if not module[1:].startswith(" "):
+            imports.append((module.strip(), int(cumulative)))
+    return imports
+
+
+def run_scenario(arguments):
+    """Run a scenario once and return (wall-clock seconds, top-level imports)."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return elapsed, parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of main.py")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to show")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append",
+                        help="Scenario to run (default: all)")
+    args = parser.parse_args()
+
+    for name in args.scenario or SCENARIOS:
+        timings = []
+        import_totals = []
+        imports = []
+        for _ in range(args.runs):
+            try:
+                elapsed, imports = run_scenario(SCENARIOS[name])
+            except RuntimeError as e:
+                print(f"{name}: failed ({e})")
+                break
+            timings.append(elapsed)
+            import_totals.append(sum(cumulative for _, cumulative in imports))
+        if not timings:
+            continue
+
+        print(f"\n{name}: wall {statistics.median(timings) * 1000:.1f} ms, "
+              f"imports {statistics.median(import_totals) / 1000:.1f} ms (median of {len(timings)} runs)")
+        for module, cumulative in sorted(imports, key=lambda entry: entry[1], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,23 +4,31 @@ Configuration settings for the Vinted Analyzer application.
 import os
 import warnings
 
-from dotenv import load_dotenv
-
 # Suppress deprecation warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-# Load environment variables from .env file
-load_dotenv()
+_environment_loaded = False
+
+
+def load_environment():
+    """
+    Load the API keys from the .env file into the environment.
+
+    This is deferred until a stage actually needs the keys, so commands such as --help
+    or fully cached runs don't pay for it. Calling it again is a no-op.
+    """
+    global _environment_loaded
+    if _environment_loaded:
+        return
 
-# API Keys
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-SERPER_API_KEY = os.getenv('SERPER_API_KEY')
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _environment_loaded = True
+
+    if not os.getenv('SERPER_API_KEY'):
+        print("Warning: SERPER_API_KEY not found in environment variables")
 
-# Set Serper API key in environment if available
-if SERPER_API_KEY:
-    os.environ["SERPER_API_KEY"] = SERPER_API_KEY
-else:
-    print("Warning: SERPER_API_KEY not found in environment variables")
 
 # Vinted settings
 VINTED_BASE_URL = "https://www.vinted.it"
@@ -32,4 +40,73 @@ DEFAULT_USER_AGENT = (
 
 # Default search parameters
 DEFAULT_SEARCH_TEXT = "ssd"
-DEFAULT_MAX_ITEMS = 5
\ No newline at end of file
+DEFAULT_MAX_ITEMS = 5
+# LLM settings
+DEFAULT_LLM_MODEL = "gemini/gemini-2.0-flash"
+
+# Concurrency settings: items run through the stages in parallel, and adaptive (AIMD) limits
+# bound the LLM and web search calls in flight from the providers' latency and errors
+MAX_CONCURRENT_ITEMS = 16  # Items processed at the same time; the limits below decide how many calls run
+LLM_CONCURRENCY_INITIAL = 2  # Concurrent crew kickoffs allowed at first
+LLM_CONCURRENCY_MAX = 16
+SEARCH_CONCURRENCY_INITIAL = 2  # Concurrent Serper searches allowed at first
+SEARCH_CONCURRENCY_MAX = 8
+CONCURRENCY_BACKOFF = 0.5  # Limit multiplier after a rate-limit (429) or server (5xx) error
+CONCURRENCY_LATENCY_TOLERANCE = 2.0  # Latency above this multiple of the usual one signals congestion
+CONCURRENCY_LATENCY_BACKOFF = 0.9  # Limit multiplier after a congested call
+
+# Result cache settings
+CACHE_DIR = "./cache"
+RESULT_CACHE_PATH = os.path.join(CACHE_DIR, "results.sqlite")
+RESULT_CACHE_TTL = 24 * 60 * 60  # Seconds before a cached stage result is considered stale
+RESULT_CACHE_MEMORY_ENTRIES = 10000  # Entries kept in memory in front of the SQLite store
+
+# Price history settings
+PRICE_HISTORY_DB_PATH = os.path.join(CACHE_DIR, "prices.sqlite")
+PRICE_HISTORY_WINDOW_DAYS = 60  # Observations older than this don't count towards the statistics
+PRICE_HISTORY_MIN_SAMPLES = 8  # Listings of a product needed to skip web research
+COMPARABLES_TOP_K = 5  # Similar Vinted listings looked up for each item
+COMPARABLES_MIN_SIMILARITY = 0.75  # Title similarity (0-1) for a listing to count as a close match
+COMPARABLES_MIN_MATCHES = 5  # Close matches needed to skip web research
+PRICE_SKETCH_COMPRESSION = 100  # t-digest size parameter; about this many centroids per product or category
+PRICE_OUTLIER_IQR_FACTOR = 1.5  # Prices beyond this many interquartile ranges from the quartiles are outliers
+
+# Near-duplicate detection settings
+DEDUP_SIMILARITY = 0.8  # Jaccard similarity of title and description shingles for two listings to be duplicates
+DEDUP_SHINGLE_SIZE = 5  # Characters per shingle
+DEDUP_NUM_PERM = 64  # MinHash permutations per listing
+DEDUP_BANDS = 16  # LSH bands (4 rows each), catching most pairs above ~0.6 similarity
+DEDUP_PRICE_TOLERANCE = 0.25  # Relative price difference allowed between a listing and its relist
+
+# History settings
+HISTORY_DB_PATH = os.path.join(CACHE_DIR, "history.sqlite")
+HISTORY_RETENTION_DAYS = 90  # Days of runs kept by --prune-history
+
+# Report settings
+TEMPLATE_BYTECODE_CACHE_DIR = os.path.join(CACHE_DIR, "templates")  # Compiled Jinja2 templates
+THUMBNAIL_DIR_NAME = "thumbnails"  # Thumbnail cache, relative to the report output directory
+THUMBNAIL_SIZE = (320, 320)  # Bounding box of the cached thumbnails (applied when Pillow is installed)
+THUMBNAIL_DOWNLOAD_TIMEOUT = 10  # Seconds
+THUMBNAIL_DOWNLOAD_WORKERS = 8  # Photos downloaded at the same time
+REPORT_VIRTUAL_THRESHOLD = 200  # Items above which the "auto" layout switches to the virtualized report
+
+# Priority scheduling settings: listings are processed best first by a cheap pre-score
+PRIORITY_WEIGHTS = {'price': 0.6, 'seller': 0.2, 'freshness': 0.2}  # Weights of the pre-score components
+PRIORITY_FRESHNESS_DAYS = 7  # Days over which the freshness of a listing decays by a factor e
+PRIORITY_SELLER_MIN_FEEDBACKS = 20  # Feedbacks a seller needs for their rating to count fully
+EARLY_RECOMMENDATIONS_FRACTION = 0.25  # Share of the items after which provisional recommendations are emitted
+
+# Memory-bounded mode settings (--memory-bounded)
+RECORD_SPILL_DIR = os.path.join(CACHE_DIR, "spill")  # Temporary files holding the finished records of a run
+
+# Profiling settings (--profile)
+PROFILE_TOP_FUNCTIONS = 25  # Functions listed per stage in the summary
+PROFILE_TOP_ALLOCATIONS = 15  # Allocation sites listed per stage in the summary
+PROFILE_TRACEMALLOC_FRAMES = 1  # Frames stored per allocation; sites are grouped by their innermost line
+
+# Service mode settings
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_MAX_CONCURRENT_JOBS = 2  # Searches analyzed at the same time
+SERVICE_MAX_QUEUED_JOBS = 20  # Searches waiting for a free slot before new ones are rejected
+SERVICE_MAX_FINISHED_JOBS = 100  # Completed/failed jobs kept for polling; older ones are forgotten
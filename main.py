@@ -1,325 +1,29 @@
 """
 Main application script for the Vinted Analyzer.
 This script orchestrates the entire analysis process.
+
+Heavy dependencies (crewai, rich, jinja2, ...) are imported by the functions that need
+them, so --help and fully cached runs start quickly.
 """
 
 import argparse
-import json
+import contextlib
 import os
 import sys
 import time
 
-import colorama
-from crewai import Flow
-from crewai import LLM
-from crewai.flow.flow import listen, start
-from dotenv import load_dotenv
-from rich import box
-from rich.console import Console
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
-from rich.prompt import Prompt, IntPrompt, Confirm
-from rich.table import Table
-
-from agents.deal_message_agent import create_deal_specialist, create_deal_message_task, create_deal_message_crew
-from agents.item_analyst import create_item_analyst, create_item_analysis_task, create_item_analysis_crew
-from agents.market_research_agent import create_market_researcher, create_market_research_task, \
-    create_market_research_crew
-from config.settings import DEFAULT_SEARCH_TEXT, DEFAULT_MAX_ITEMS, VINTED_BASE_URL
-from services.report_service import ReportService
-from services.vinted_service import VintedService
-from utils.browser_utils import open_html_report
-
-# Initialize colorama for cross-platform colored terminal output
-colorama.init()
-
-
-class SecondHandItemAnalysisPipeline(Flow):
-    """Flow for analyzing second-hand items from Vinted."""
-
-    def __init__(self, search_text=DEFAULT_SEARCH_TEXT, max_items=DEFAULT_MAX_ITEMS, max_searches=1,
-                 search_site="amazon", vinted_base_url=VINTED_BASE_URL):
-        """
-        Initialize the analysis pipeline.
-
-        Args:
-            search_text: The search query to use on Vinted
-            max_items: Maximum number of items to analyze
-            max_searches: Maximum number of searches to perform per item (default: 1)
-            search_site: Site to focus search on (default: "amazon")
-            vinted_base_url: Base URL for Vinted (default: https://www.vinted.it)
-        """
-        super().__init__()
-        self.search_text = search_text
-        self.max_items = max_items
-        self.max_searches = max_searches
-        self.search_site = search_site
-        self.vinted_base_url = vinted_base_url
-        self.results = []
-        self.raw_items = []  # Store the raw item data for HTML generation
-        self.market_research_results = []  # Store market research results
-        self.deal_messages = {}  # Store deal messages for each item
-        self.vinted_service = VintedService(base_url=vinted_base_url)
-        self.report_service = ReportService()
-
-    @start()
-    def fetch_items_from_vinted(self):
-        """Fetch items from Vinted using the vinted_scraper."""
-        print("1- Fetching items from Vinted")
-
-        # Use the VintedService to search for items
-        detailed_items = self.vinted_service.search_items(
-            self.search_text,
-            self.max_items
-        )
-
-        # Store raw item data for later use
-        self.raw_items = detailed_items
-
-        return detailed_items
-
-    @listen(fetch_items_from_vinted)
-    def research_market_values(self, items):
-        """Research market values for each item using the Market Research agent."""
-        print(f"2- Researching market values for {len(items)} items")
-
-        market_research_results = []
-
-        # Create agent, task, and crew for market research
-        researcher = create_market_researcher(llm)
-        task = create_market_research_task(
-            researcher,
-            max_searches=self.max_searches,
-            search_site=self.search_site
-        )
-        crew = create_market_research_crew(researcher, task)
-
-        for i, item in enumerate(items):
-            print(f"  Researching market value for item {i + 1}/{len(items)} (ID: {item.get('id', 'unknown')})")
-
-            # Format the item data for the market research task
-            # Convert ID to string to avoid Pydantic validation errors
-            if 'id' in item and not isinstance(item['id'], str):
-                item_copy = item.copy()
-                item_copy['id'] = str(item_copy['id'])
-                formatted_data = {"item_data": json.dumps(item_copy, indent=2)}
-            else:
-                formatted_data = {"item_data": json.dumps(item, indent=2)}
-
-            # Research the current item's market value
-            try:
-                research_result = crew.kickoff(formatted_data)
-                market_research_results.append(research_result)
-            except Exception as e:
-                print(f"Error researching market value for item {i + 1}: {str(e)}")
-                # Create a minimal research result to avoid breaking the pipeline
-                minimal_result = {
-                    "item_id": str(item.get('id', f"unknown-{i}")),
-                    "average_price": 0.0,
-                    "price_range": [0.0, 0.0],
-                    "comparable_items": [],
-                    "value_assessment": "Could not determine due to error",
-                    "market_demand": "Unknown",
-                    "price_factors": ["Error during research"],
-                    "confidence_score": 1,
-                    "notes": f"Error during market research: {str(e)}"
-                }
-                market_research_results.append(minimal_result)
-
-        # Store market research results for later use
-        self.market_research_results = market_research_results
-
-        # Return both the original items and their market research results
-        return items, market_research_results
-
-    @listen(research_market_values)
-    def analyze_items(self, data):
-        """
-        Analyze each item individually using the AI crew, incorporating market research.
-
-        Args:
-            data: Tuple containing (items, market_research_results)
-        """
-        items, market_research_results = data
-        print(f"3- Analyzing {len(items)} items with market research data")
-
-        all_results = []
-
-        # Create agent, task, and crew for item analysis
-        analyst = create_item_analyst(llm)
-        task = create_item_analysis_task(analyst)
-        crew = create_item_analysis_crew(analyst, task)
-
-        for i, (item, research) in enumerate(zip(items, market_research_results)):
-            print(f"  Analyzing item {i + 1}/{len(items)} (ID: {item.get('id', 'unknown')})")
-
-            # Combine item data with market research for more informed analysis
-            # Use model_dump with exclude_defaults for Pydantic v2 compatibility to remove any unwanted default keys
-            enhanced_item_data = {
-                "item_data": item,
-                "market_research": research if isinstance(research, dict) else
-                (research.pydantic.model_dump(exclude_defaults=True) if hasattr(research, 'pydantic') else research)
-            }
-
-            # Convert the enhanced data to a JSON string
-            formatted_data = {"item_data": json.dumps(enhanced_item_data, indent=2)}
-
-            # Analyze the current item with market research context
-            try:
-                analysis_result = crew.kickoff(formatted_data)
-                all_results.append(analysis_result)
-            except Exception as e:
-                print(f"Error analyzing item {i + 1}: {str(e)}")
-                # Continue with next item
-
-        return all_results
-
-    @listen(analyze_items)
-    def generate_deal_messages(self, analysis_results):
-        """
-        Generate deal messages for each analyzed item.
-
-        Args:
-            analysis_results: List of CrewOutput objects containing item analysis results
-
-        Returns:
-            The analysis results to pass to the next step
-        """
-        print("4- Generating deal messages")
-
-        if not analysis_results:
-            return analysis_results
-
-        # Create agent, task, and crew for deal message generation
-        specialist = create_deal_specialist(llm)
-        task = create_deal_message_task(specialist)
-        crew = create_deal_message_crew(specialist, task)
-
-        for i, result in enumerate(analysis_results):
-            if not hasattr(result, 'pydantic'):
-                continue
-
-            item_data = result.pydantic
-            item_id = item_data.item_id
-
-            # Find the corresponding raw item data
-            raw_item = next((item for item in self.raw_items if str(item.get('id', '')) == str(item_id)), {})
-
-            # Extract price information properly
-            price = None
-            if 'price' in raw_item:
-                if isinstance(raw_item['price'], dict) and 'amount' in raw_item['price']:
-                    price = raw_item['price']['amount']
-                else:
-                    price = raw_item['price']
-
-            # Find the corresponding market research data
-            market_research = None
-            for research in self.market_research_results:
-                research_item_id = None
-                if hasattr(research, 'pydantic'):
-                    research_item_id = research.pydantic.item_id
-                elif isinstance(research, dict) and 'item_id' in research:
-                    research_item_id = research['item_id']
-
-                if research_item_id and str(research_item_id) == str(item_id):
-                    market_research = research
-                    break
-
-            # Extract market research data
-            market_data = {}
-            if market_research:
-                if hasattr(market_research, 'pydantic'):
-                    market_data = market_research.pydantic.model_dump(exclude_defaults=True)
-                elif hasattr(market_research, 'dict'):
-                    market_data = market_research.dict()
-                elif hasattr(market_research, 'model_dump'):
-                    market_data = market_research.model_dump()
-                else:
-                    market_data = market_research
-
-            # Prepare item data for deal message generation with all available information
-            item_info = {
-                'id': item_id,
-                'title': item_data.title,
-                'price': item_data.price,
-                'status': item_data.status,
-                'seller_rating': raw_item.get('user_rating', raw_item.get('seller_rating', 'Unknown')),
-                'analysis_score': item_data.score,
-                'analysis_notes': item_data.notes
-            }
-
-            # Generate deal message
-            try:
-                print(f"  Generating deal message for item {i + 1} (ID: {item_id})")
-
-                # Format the data for the deal message task
-                formatted_data = {
-                    "item_data": json.dumps(item_info, indent=2),
-                    "market_data": json.dumps(market_data, indent=2)
-                }
-
-                # Generate the deal message using the crew
-                deal_message_result = crew.kickoff(formatted_data)
-
-                if deal_message_result:
-                    self.deal_messages[item_id] = deal_message_result
-            except Exception as e:
-                print(f"Error generating deal message for item {i + 1}: {str(e)}")
-
-        return analysis_results
-
-    @listen(generate_deal_messages)
-    def prepare_recommendations(self, analysis_results):
-        """
-        Prepare recommendations based on the analysis results.
-
-        Args:
-            analysis_results: List of CrewOutput objects containing item analysis results
-
-        Returns:
-            A formatted string with recommendations
-        """
-        print("5- Preparing recommendations")
-
-        if not analysis_results:
-            return "No analysis results available to prepare recommendations."
-
-        sorted_results = sorted(
-            analysis_results,
-            key=lambda x: x.pydantic.score if hasattr(x, 'pydantic') else 0,
-            reverse=True
-        )
-
-        recommendations = "# Recommended Items\n\n"
-
-        for i, result in enumerate(sorted_results[:3], 1):
-            if hasattr(result, 'pydantic'):
-                item_data = result.pydantic
-                recommendations += f"## {i}. Item ID: {item_data.item_id}\n"
-                recommendations += f"**Score: {item_data.score}/100**\n\n"
-                recommendations += f"{item_data.notes}\n\n"
-                recommendations += "---\n\n"
-
-        # Generate HTML report and open it
-        try:
-            report_file = self.report_service.generate_html_report(
-                self.search_text,
-                self.raw_items,
-                sorted_results,
-                market_research=self.market_research_results,
-                deal_messages=self.deal_messages
-            )
-            if report_file:
-                open_html_report(report_file)
-        except Exception as e:
-            print(f"Error generating/opening HTML report: {str(e)}")
-
-        return recommendations
+from config.settings import DEFAULT_SEARCH_TEXT, DEFAULT_MAX_ITEMS, SERVICE_HOST, SERVICE_PORT, \
+    SERVICE_MAX_CONCURRENT_JOBS, HISTORY_RETENTION_DAYS
+from utils.output_utils import NdjsonWriter
 
 
 def display_welcome_screen():
     """Display a beautiful welcome screen for the application."""
+    from rich import box
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.table import Table
+
     console = Console()
 
     # Clear the screen
@@ -353,6 +57,11 @@ def display_welcome_screen():
 
 def get_user_preferences():
     """Get user preferences for the search in a beautiful way."""
+    from rich import box
+    from rich.console import Console
+    from rich.prompt import Prompt, IntPrompt
+    from rich.table import Table
+
     console = Console()
 
     # Get search query
@@ -393,8 +102,17 @@ def get_user_preferences():
     }
 
 
+def has_display():
+    """Return whether a browser can be opened (False on headless Linux servers)."""
+    if sys.platform in ("win32", "darwin"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
 def show_progress(message, duration=3):
     """Show a spinner with a message for the given duration."""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
     with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -406,6 +124,138 @@ def show_progress(message, duration=3):
             time.sleep(0.1)
 
 
+def show_history(args):
+    """Print the past items matching the history query in a table."""
+    import datetime
+
+    from rich.console import Console
+    from rich.table import Table
+
+    from services.history_service import HistoryService
+
+    console = Console()
+    history_service = HistoryService()
+    try:
+        if args.prune_history is not None:
+            deleted = history_service.prune(args.prune_history)
+            console.print(f"[green]Deleted {deleted} runs older than {args.prune_history} days.[/green]")
+            if args.history is None:
+                return
+
+        items = history_service.search(query=args.history, min_score=args.min_score, max_price=args.max_price,
+                                       days=args.days, limit=args.limit)
+    finally:
+        history_service.close()
+
+    if not items:
+        console.print("[yellow]No matching items in the history.[/yellow]")
+        return
+
+    table = Table(title=f"History: {args.history or 'all items'}")
+    table.add_column("Seen", style="dim")
+    table.add_column("Score", justify="right", style="bold")
+    table.add_column("Price", justify="right")
+    table.add_column("Market Avg", justify="right")
+    table.add_column("Title")
+    table.add_column("Search", style="dim")
+    table.add_column("URL", style="cyan", overflow="fold")
+    for item in items:
+        table.add_row(
+            datetime.datetime.fromtimestamp(item['observed_at']).strftime("%Y-%m-%d %H:%M"),
+            str(item['score']),
+            f"{item['price']} {item['currency']}" if item['price'] is not None else "?",
+            f"{item['average_price']}" if item['average_price'] is not None else "-",
+            item['title'],
+            item['search_text'],
+            item['url']
+        )
+    console.print(table)
+
+
+def create_pipeline(preferences, use_cache=True, open_report=True, on_record=None, workers=1, report_layout="auto",
+                    record_history=True, incremental_report=False, export_formats=(), use_price_history=True,
+                    spill_records=False, on_early_recommendations=None):
+    """
+    Create the analysis pipeline for the given preferences.
+
+    The pipeline module (and crewai with it) is only imported here; the LLM and crews
+    are built later, on the first cache miss that needs them.
+
+    Args:
+        preferences: Dictionary with search_text, max_items, max_searches and search_site
+        use_cache: Whether to reuse cached stage results
+        open_report: Whether to open the HTML report in the browser
+        on_record: Optional callback receiving each ItemRecord as soon as it is complete
+        workers: Number of worker processes to shard the sweep across
+        report_layout: HTML report layout: "auto", "cards" or "virtual"
+        record_history: Whether to store the run's records in the searchable history
+        incremental_report: Whether to update the search query's stable report instead of writing a new one
+        export_formats: Formats to export the records to ("jsonl", "csv", "parquet", "arrow")
+        use_price_history: Whether to record prices locally and use them as the market reference
+        spill_records: Whether to keep finished records on disk instead of in memory
+        on_early_recommendations: Optional callback receiving provisional recommendations before the
+            run completes (single-process runs only)
+
+    Returns:
+        SecondHandItemAnalysisPipeline, or ShardedAnalysisRunner when workers > 1
+    """
+    history_service = None
+    if record_history:
+        from services.history_service import HistoryService
+
+        history_service = HistoryService()
+
+    price_history = None
+    if use_price_history:
+        from services.price_history_service import PriceHistoryService
+
+        price_history = PriceHistoryService()
+
+    if workers > 1:
+        from services.shard_service import ShardedAnalysisRunner
+
+        return ShardedAnalysisRunner(
+            search_text=preferences["search_text"],
+            max_items=preferences["max_items"],
+            max_searches=preferences["max_searches"],
+            search_site=preferences["search_site"],
+            workers=workers,
+            use_cache=use_cache,
+            open_report=open_report,
+            on_record=on_record,
+            stdout_to_stderr=on_record is not None,
+            report_layout=report_layout,
+            history_service=history_service,
+            incremental_report=incremental_report,
+            export_formats=export_formats,
+            price_history=price_history,
+            spill_records=spill_records,
+            on_early_recommendations=on_early_recommendations
+        )
+
+    from agents.crew_cache import CrewCache
+    from services.analysis_pipeline import SecondHandItemAnalysisPipeline
+    from services.cache_service import ResultCache
+
+    return SecondHandItemAnalysisPipeline(
+        search_text=preferences["search_text"],
+        max_items=preferences["max_items"],
+        max_searches=preferences["max_searches"],
+        search_site=preferences["search_site"],
+        crew_cache=CrewCache(),
+        result_cache=ResultCache() if use_cache else None,
+        open_report=open_report,
+        on_record=on_record,
+        report_layout=report_layout,
+        history_service=history_service,
+        incremental_report=incremental_report,
+        export_formats=export_formats,
+        price_history=price_history,
+        spill_records=spill_records,
+        on_early_recommendations=on_early_recommendations
+    )
+
+
 def main():
     """Main entry point for the application."""
     # Parse command line arguments
@@ -416,9 +266,79 @@ def main():
     parser.add_argument("--site", type=str, choices=["amazon", "ebay", "all"], help="Site to focus search on")
     parser.add_argument("--quick", action="store_true",
                         help="Skip the interactive UI and use defaults or provided args")
+    parser.add_argument("--output", choices=["report", "ndjson"], default="report",
+                        help="Output format: an HTML report, or one JSON record per item on stdout as soon as "
+                             "it is complete (implies --quick)")
+    parser.add_argument("--report-layout", choices=["auto", "cards", "virtual"], default="auto",
+                        help="HTML report layout: a card per item, a virtualized list with client-side sorting "
+                             "and filtering for large sweeps, or auto to pick by item count")
+    parser.add_argument("--no-open", "--headless", action="store_true",
+                        help="Don't open the HTML report in a browser (implied when no display is available)")
+    parser.add_argument("--incremental-report", action="store_true",
+                        help="Add new and changed items to one stable report per search query instead of "
+                             "writing a new report file")
+    parser.add_argument("--export", choices=["jsonl", "csv", "parquet", "arrow"], action="append", default=[],
+                        help="Also export the results to output/exports in this format (repeatable; parquet and "
+                             "arrow require pyarrow)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes to split the items across (useful for large sweeps)")
+    parser.add_argument("--memory-bounded", action="store_true",
+                        help="Keep finished records in a temporary file instead of in memory and build the report, "
+                             "exports and history from it, so memory use stays flat on very large sweeps")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore cached research, analysis and message results")
+    parser.add_argument("--no-price-history", action="store_true",
+                        help="Always research market values on the web instead of using prices already seen on "
+                             "Vinted")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Don't store this run's results in the searchable history")
+    parser.add_argument("--trace", type=str, metavar="FILE",
+                        help="Record where the run spends its time (stages, items, crew kickoffs, HTTP requests) "
+                             "and write the spans to FILE as OTLP/JSON")
+    parser.add_argument("--profile", type=str, metavar="DIR",
+                        help="Profile CPU time (cProfile) and memory allocations (tracemalloc) per stage and write "
+                             "the statistics and a summary of the top functions and allocation sites to DIR")
+    parser.add_argument("--history", type=str, nargs="?", const="", metavar="QUERY",
+                        help="Search the results of past runs instead of running a new analysis")
+    parser.add_argument("--min-score", type=int, help="With --history: minimum bargain score")
+    parser.add_argument("--max-price", type=float, help="With --history: maximum listing price")
+    parser.add_argument("--days", type=float, help="With --history: only items seen in the last N days")
+    parser.add_argument("--limit", type=int, default=20, help="With --history: maximum number of items shown")
+    parser.add_argument("--prune-history", type=float, nargs="?", const=HISTORY_RETENTION_DAYS, metavar="DAYS",
+                        help=f"Delete runs older than DAYS (default: {HISTORY_RETENTION_DAYS}) from the history "
+                             "and compact it")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived service exposing a local HTTP/JSON API")
+    parser.add_argument("--host", type=str, default=SERVICE_HOST, help="Interface the service listens on")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port the service listens on")
+    parser.add_argument("--jobs", type=int, default=SERVICE_MAX_CONCURRENT_JOBS,
+                        help="Number of searches the service analyzes at the same time")
 
     args = parser.parse_args()
 
+    if args.history is not None or args.prune_history is not None:
+        show_history(args)
+        return 0
+
+    if args.serve:
+        from services.job_service import serve
+
+        serve(host=args.host, port=args.port, max_concurrent_jobs=args.jobs)
+        return 0
+
+    import colorama
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.prompt import Confirm
+
+    # Initialize colorama for cross-platform colored terminal output
+    colorama.init()
+
+    # In NDJSON mode stdout only carries records; everything else goes to stderr
+    stream_records = args.output == "ndjson"
+    if stream_records:
+        args.quick = True
+
     # If quick mode is not enabled, show the interactive UI
     if not args.quick:
         display_welcome_screen()
@@ -433,12 +353,14 @@ def main():
         }
 
     # Show a summary of the search parameters
-    console = Console()
+    console = Console(stderr=stream_records)
     console.print("\n[bold]Search Parameters:[/bold]")
     console.print(f"🔍 Query: [yellow]{preferences['search_text']}[/yellow]")
     console.print(f"📊 Items to analyze: [yellow]{preferences['max_items']}[/yellow]")
     console.print(f"🔄 Searches per item: [yellow]{preferences['max_searches']}[/yellow]")
     console.print(f"🛒 Target marketplace: [yellow]{preferences['search_site']}[/yellow]")
+    if args.workers > 1:
+        console.print(f"🧵 Worker processes: [yellow]{args.workers}[/yellow]")
 
     # Confirm and start
     if not args.quick:
@@ -446,49 +368,91 @@ def main():
             console.print("[yellow]Analysis cancelled.[/yellow]")
             return
 
-    # Show a loading animation
+    # Show a loading animation (skipped in quick mode, where nobody is watching)
     console.print("\n[bold green]Starting analysis...[/bold green]")
-    show_progress("Initializing AI agents", 2)
+    if not args.quick:
+        show_progress("Initializing AI agents", 2)
 
     # Create and run the analysis pipeline
+    from utils.profile_utils import enable_profiling, write_profiles
+    from utils.trace_utils import enable_tracing, export_trace, span
+
+    if args.trace:
+        enable_tracing()
+    if args.profile:
+        enable_profiling(args.profile)
+    flow = None
     try:
-        flow = SecondHandItemAnalysisPipeline(
-            search_text=preferences["search_text"],
-            max_items=preferences["max_items"],
-            max_searches=preferences["max_searches"],
-            search_site=preferences["search_site"]
+        record_writer = NdjsonWriter(sys.stdout) if stream_records else None
+        open_report = not (stream_records or args.no_open) and has_display()
+        flow = create_pipeline(
+            preferences,
+            use_cache=not args.no_cache,
+            open_report=open_report,
+            on_record=record_writer.write if record_writer else None,
+            workers=args.workers,
+            report_layout=args.report_layout,
+            record_history=not args.no_history,
+            incremental_report=args.incremental_report,
+            export_formats=args.export,
+            use_price_history=not args.no_price_history,
+            spill_records=args.memory_bounded,
+            on_early_recommendations=lambda text: console.print(
+                Panel(text, title="Early recommendations (provisional)", border_style="yellow"))
         )
 
-        # Run the pipeline
-        results = flow.kickoff()
-
-        # Show completion message
-        console.print("\n[bold green]✅ Analysis complete![/bold green]")
-        console.print("[italic]An HTML report has been generated and should open in your browser.[/italic]")
-
-        # Print the text results as well
-        console.print("\n[bold]Top Recommendations:[/bold]")
-        console.print(Panel(results, border_style="green"))
+        # Run the pipeline, keeping its progress messages off the record stream
+        with contextlib.redirect_stdout(sys.stderr) if stream_records else contextlib.nullcontext(), \
+                span("run", search_text=preferences['search_text'], max_items=preferences['max_items'],
+                     workers=args.workers):
+            results = flow.kickoff()
+
+            # Print the text results while the report is still being written
+            console.print("\n[bold green]✅ Analysis complete![/bold green]")
+            if flow.metrics.get('duplicates'):
+                console.print(f"♻️  Near-duplicates: [yellow]{flow.metrics['duplicates']}[/yellow] of "
+                              f"{flow.metrics['listings']} listings ({flow.metrics['duplicate_rate']:.0%}) "
+                              f"reused another listing's analysis")
+            llm_metrics = flow.metrics.get('llm_concurrency')
+            if llm_metrics and llm_metrics['calls']:
+                console.print(f"⚡ LLM calls: [yellow]{llm_metrics['calls']}[/yellow], up to "
+                              f"{llm_metrics['peak_in_flight']} at a time (adaptive limit now {llm_metrics['limit']}, "
+                              f"{llm_metrics['throughput']:.2f} calls/s, {llm_metrics['overloads']} rate-limited)")
+            console.print("\n[bold]Top Recommendations:[/bold]")
+            console.print(Panel(results, border_style="green"))
+
+            with span("publish.wait"):
+                flow.wait_for_report()
+
+        if args.trace:
+            span_count = export_trace(args.trace)
+            console.print(f"[italic]{span_count} trace spans written to {args.trace}[/italic]")
+        if args.profile:
+            console.print(f"[italic]Profile summary written to {write_profiles()}[/italic]")
+        if flow.report_file and open_report:
+            console.print("[italic]An HTML report has been generated and should open in your browser.[/italic]")
+        elif flow.report_file:
+            console.print(f"[italic]HTML report written to {flow.report_file}[/italic]")
+        for path in flow.export_files.values():
+            console.print(f"[italic]Results exported to {path}[/italic]")
 
     except Exception as e:
         console.print(f"\n[bold red]Error during analysis:[/bold red] {str(e)}")
         return 1
+    finally:
+        if flow is not None:
+            # Delete the records spilled by --memory-bounded, then close the item thread pool and the
+            # databases opened for the run, as the job service does on shutdown
+            flow.close()
+            for service in (getattr(flow, 'crew_cache', None), getattr(flow, 'result_cache', None),
+                            flow.price_history, flow.publisher.history_service):
+                if service is not None:
+                    service.close()
 
     return 0
 
 
 # Run the application
 if __name__ == "__main__":
-    # Load environment variables
-    load_dotenv()
-
-    # Initialize LLM
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    # Initialize the LLM
-    llm = LLM(
-        model='gemini/gemini-2.0-flash',
-        api_key=gemini_api_key
-    )
-
-    # Run the main function
+    # Run the main function (environment variables and the LLM are loaded on first use)
     sys.exit(main())
@@ -0,0 +1,28 @@
+"""
+Pydantic model for product attributes extracted from a listing by rules.
+"""
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class ProductAttributes(BaseModel):
+    """
+    Pydantic model for the structured specs of a listing.
+
+    Produced by the rule packs of utils.attribute_utils when a listing's title, description
+    and brand identify a known kind of product.
+    """
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    kind: str = Field(..., description="The rule pack that matched (e.g. 'ssd', 'phone').")
+    brand: Optional[str] = Field(None, description="The normalized brand.")
+    model: Optional[str] = Field(None, description="The normalized model name.")
+    specs: Dict[str, str] = Field(default_factory=dict, description="Further specs, e.g. capacity or interface.")
+    product_key: str = Field(..., description="Canonical key shared by listings of the same product.")
+
+    def to_prompt_data(self):
+        """Return the attributes worth sending to the agents, with the specs flattened."""
+        data = self.model_dump(exclude_none=True, exclude={'product_key', 'specs'})
+        data.update(self.specs)
+        return data
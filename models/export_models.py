@@ -0,0 +1,117 @@
+"""
+Pydantic model defining the flat schema of exported analysis results.
+"""
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class ItemExportRow(BaseModel):
+    """
+    Pydantic model for one item in the JSONL, CSV and Parquet/Arrow exports.
+
+    Every field is a scalar so the same schema works for all formats; list fields of the
+    records are flattened (price range into min/max columns, price factors joined with "; ").
+    Fields of stages that produced no result are null.
+    """
+    model_config = ConfigDict(extra='forbid')
+
+    # Run
+    exported_at: datetime.datetime = Field(..., description="UTC time the run was exported.")
+    search_query: str = Field(..., description="The Vinted search query of the run.")
+
+    # Listing
+    item_id: str = Field(..., description="The unique identifier of the listing.")
+    title: str = Field(..., description="The title of the listing.")
+    description: str = Field(..., description="The seller's description.")
+    brand: str = Field(..., description="The brand of the item.")
+    status: str = Field(..., description="The condition of the item.")
+    category: Optional[str] = Field(None, description="The Vinted catalog path of the listing.")
+    price: Optional[float] = Field(None, description="The listing price.")
+    currency: str = Field(..., description="The currency of the listing price.")
+    service_fee: Optional[float] = Field(None, description="The buyer protection fee.")
+    total_price: Optional[float] = Field(None, description="The price including the service fee.")
+    seller: str = Field(..., description="The login of the seller.")
+    seller_rating: Optional[float] = Field(None, description="The seller's feedback reputation (0-1).")
+    seller_feedback_count: Optional[int] = Field(None, description="Number of feedbacks the seller received.")
+    location: str = Field(..., description="The seller's city and country.")
+    created_at: Optional[str] = Field(None, description="ISO timestamp of the listing's creation.")
+    url: str = Field(..., description="The URL of the listing on Vinted.")
+    photo_url: str = Field(..., description="The URL of the primary photo.")
+
+    # Item analysis
+    score: int = Field(..., description="The bargain score (0-100).")
+    analysis_notes: str = Field(..., description="The analyst's explanation of the score.")
+
+    # Market research
+    average_price: Optional[float] = Field(None, description="Average market price.")
+    price_range_min: Optional[float] = Field(None, description="Lowest market price found.")
+    price_range_max: Optional[float] = Field(None, description="Highest market price found.")
+    value_assessment: Optional[str] = Field(None, description="Assessment of the item's value.")
+    market_demand: Optional[str] = Field(None, description="Market demand analysis.")
+    confidence_score: Optional[int] = Field(None, description="Confidence in the market data (0-10).")
+    price_factors: Optional[str] = Field(None, description="Factors influencing the price, joined with '; '.")
+    comparable_count: Optional[int] = Field(None, description="Number of comparable items found.")
+    research_notes: Optional[str] = Field(None, description="Additional notes on the market research.")
+
+    # Deal message
+    deal_message: Optional[str] = Field(None, description="The suggested message to the seller.")
+    deal_tone: Optional[str] = Field(None, description="The tone of the message.")
+    deal_success_rate: Optional[int] = Field(None, description="Expected success rate of the message (%).")
+    deal_offer_price: Optional[float] = Field(None, description="The price offered in the message.")
+
+    @classmethod
+    def from_record(cls, record, search_query, exported_at):
+        """
+        Flatten an ItemRecord.
+
+        Args:
+            record: The ItemRecord to export
+            search_query: The search query of the run
+            exported_at: The export time shared by every row of the run
+
+        Returns:
+            ItemExportRow: The flat row
+        """
+        listing = record.listing
+        research = record.research
+        message = record.message
+        price_range = research.price_range if research else []
+
+        return cls(
+            exported_at=exported_at,
+            search_query=search_query,
+            item_id=record.item_id,
+            title=listing.title,
+            description=listing.description,
+            brand=listing.brand,
+            status=listing.status,
+            category=listing.category,
+            price=listing.price,
+            currency=listing.currency,
+            service_fee=listing.service_fee,
+            total_price=listing.total_price,
+            seller=listing.seller,
+            seller_rating=listing.seller_rating,
+            seller_feedback_count=listing.seller_feedback_count,
+            location=listing.location,
+            created_at=listing.created_at,
+            url=listing.url,
+            photo_url=listing.photo_url,
+            score=record.analysis.score,
+            analysis_notes=record.analysis.notes,
+            average_price=research.average_price if research else None,
+            price_range_min=min(price_range) if price_range else None,
+            price_range_max=max(price_range) if price_range else None,
+            value_assessment=research.value_assessment if research else None,
+            market_demand=research.market_demand if research else None,
+            confidence_score=research.confidence_score if research else None,
+            price_factors="; ".join(research.price_factors) if research else None,
+            comparable_count=len(research.comparable_items) if research else None,
+            research_notes=research.notes if research else None,
+            deal_message=message.message if message else None,
+            deal_tone=message.tone if message else None,
+            deal_success_rate=message.expected_success_rate if message else None,
+            deal_offer_price=message.offer_price if message else None,
+        )
@@ -0,0 +1,154 @@
+"""
+Pydantic model for Vinted listings normalized from the raw API payload.
+"""
+from typing import Optional
+
+from pydantic import BaseModel, Field, ConfigDict
+
+PLACEHOLDER_PHOTO_URL = "https://via.placeholder.com/350x250?text=No+Image"
+# Vinted thumbnail sizes large enough for a report card, smallest first
+THUMBNAIL_TYPES = ("thumb310x430", "thumb364x428", "thumb428x624")
+
+
+def _to_float(value):
+    """Convert a Vinted price value (scalar, numeric string or {'amount': ...} dict) to a float."""
+    if isinstance(value, dict):
+        value = value.get('amount')
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _primary_photo_url(item):
+    """Return the URL of the listing's primary photo, falling back to the flat photo fields."""
+    photos = item.get('photos') or []
+    if isinstance(photos, list) and photos and isinstance(photos[0], dict):
+        photo = photos[0]
+        photo_url = photo.get('full_size_url') or photo.get('url')
+        thumbnails = photo.get('thumbnails')
+        if not photo_url and isinstance(thumbnails, dict):
+            photo_url = thumbnails.get('original')
+        if photo_url:
+            return photo_url
+
+    return item.get('photo_url') or item.get('full_size_url') or PLACEHOLDER_PHOTO_URL
+
+
+def _primary_thumbnail_url(item):
+    """Return the URL of the smallest suitable Vinted thumbnail of the primary photo, if any."""
+    photos = item.get('photos') or []
+    if not (isinstance(photos, list) and photos and isinstance(photos[0], dict)):
+        return None
+
+    thumbnails = photos[0].get('thumbnails')
+    if isinstance(thumbnails, list):
+        # [{'type': 'thumb310x430', 'url': ...}, ...]
+        thumbnails = {thumb.get('type'): thumb.get('url') for thumb in thumbnails if isinstance(thumb, dict)}
+    if not isinstance(thumbnails, dict):
+        return None
+
+    for thumbnail_type in THUMBNAIL_TYPES:
+        if thumbnails.get(thumbnail_type):
+            return thumbnails[thumbnail_type]
+    return None
+
+
+class VintedListing(BaseModel):
+    """
+    Pydantic model for a single Vinted listing.
+
+    Listings are normalized once when they are fetched, so later stages never have
+    to probe the raw payload for nested items, price objects or brand fallbacks.
+    """
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    id: str = Field(..., description="The unique identifier of the listing.")
+    title: str = Field("Unknown Item", description="The title of the listing.")
+    description: str = Field("No description available", description="The seller's description.")
+    price: Optional[float] = Field(None, description="The listing price as a number.")
+    currency: str = Field("€", description="The currency of the listing price.")
+    service_fee: Optional[float] = Field(None, description="The buyer protection fee.")
+    total_price: Optional[float] = Field(None, description="The price including the service fee.")
+    brand: str = Field("Unknown Brand", description="The brand of the item.")
+    status: str = Field("Unknown condition", description="The condition of the item.")
+    seller: str = Field("Unknown seller", description="The login of the seller.")
+    seller_rating: Optional[float] = Field(None, description="The seller's feedback reputation (0-1).")
+    seller_feedback_count: Optional[int] = Field(None, description="Number of feedbacks the seller received.")
+    photo_url: str = Field(PLACEHOLDER_PHOTO_URL, description="The URL of the primary photo.")
+    thumbnail_url: Optional[str] = Field(None, description="The URL of a small Vinted thumbnail of the primary photo.")
+    url: str = Field("#", description="The absolute URL of the listing on Vinted.")
+    location: str = Field("Unknown location", description="The seller's city and country.")
+    category: Optional[str] = Field(None, description="The Vinted catalog path of the listing.")
+    created_at: Optional[str] = Field(None, description="ISO timestamp of the listing's creation.")
+
+    @classmethod
+    def from_payload(cls, payload, base_url="https://www.vinted.it"):
+        """
+        Normalize a raw Vinted item payload.
+
+        Args:
+            payload: The item payload, either nested under 'item' or flat
+            base_url: Base URL used to complete relative listing URLs
+
+        Returns:
+            VintedListing: The normalized listing
+        """
+        item = payload.get('item', payload) if isinstance(payload, dict) else {}
+
+        price_obj = item.get('price')
+        price = _to_float(price_obj)
+        if price is None:
+            price = _to_float(item.get('price_numeric', item.get('original_price_numeric')))
+
+        currency = price_obj.get('currency_code') if isinstance(price_obj, dict) else None
+        currency = currency or item.get('currency') or "€"
+
+        service_fee = _to_float(item.get('service_fee'))
+        total_price = _to_float(item.get('total_item_price'))
+        if total_price is None:
+            total_price = price
+
+        brand_dto = item.get('brand_dto')
+        if isinstance(brand_dto, dict) and brand_dto.get('title'):
+            brand = brand_dto['title']
+        else:
+            brand = item.get('brand') or "Unknown Brand"
+
+        user = item.get('user') if isinstance(item.get('user'), dict) else {}
+        seller_rating = _to_float(user.get('feedback_reputation'))
+        seller_feedback_count = user.get('feedback_count')
+
+        url = item.get('url') or item.get('path') or "#"
+        if url != "#" and not url.startswith('http'):
+            url = f"{base_url}{url}"
+
+        city = item.get('city') or "Unknown location"
+        country = item.get('country') or ""
+
+        return cls(
+            id=str(item.get('id', '')),
+            title=item.get('title') or "Unknown Item",
+            description=item.get('description') or "No description available",
+            price=price,
+            currency=currency,
+            service_fee=service_fee,
+            total_price=total_price,
+            brand=brand,
+            status=item.get('status') or "Unknown condition",
+            seller=item.get('user_login') or user.get('login') or "Unknown seller",
+            seller_rating=seller_rating,
+            seller_feedback_count=seller_feedback_count if isinstance(seller_feedback_count, int) else None,
+            photo_url=_primary_photo_url(item),
+            thumbnail_url=_primary_thumbnail_url(item),
+            url=url,
+            location=f"{city}, {country}" if country else city,
+            category=item.get('catalog_branch_title'),
+            created_at=item.get('created_at_ts'),
+        )
+
+    def to_prompt_data(self):
+        """Return the listing fields worth sending to the agents."""
+        return self.model_dump(exclude_none=True, exclude={'photo_url', 'thumbnail_url'})
@@ -0,0 +1,68 @@
+"""
+Pydantic models for price statistics, comparables and price positions computed from the local Vinted price history.
+"""
+from typing import Optional
+
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class PriceStatistics(BaseModel):
+    """
+    Pydantic model for the rolling price statistics of one product.
+
+    Statistics cover the listings of the product observed on Vinted within the price
+    history window, one (latest) price per listing.
+    """
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    product_key: str = Field(..., description="The normalized product key.")
+    currency: str = Field(..., description="The currency of the prices.")
+    count: int = Field(..., description="Number of listings in the sample.")
+    median: Optional[float] = Field(None, description="Median price.")
+    q1: Optional[float] = Field(None, description="First quartile of the prices.")
+    q3: Optional[float] = Field(None, description="Third quartile of the prices.")
+    minimum: Optional[float] = Field(None, description="Lowest price.")
+    maximum: Optional[float] = Field(None, description="Highest price.")
+
+    @property
+    def iqr(self):
+        """The interquartile range of the prices, or None for an empty sample."""
+        return self.q3 - self.q1 if self.count else None
+
+
+class ComparableListing(BaseModel):
+    """Pydantic model for a previously observed Vinted listing similar to the one being valued."""
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    item_id: str = Field(..., description="The unique identifier of the comparable listing.")
+    title: str = Field(..., description="The title of the comparable listing.")
+    price: float = Field(..., description="The observed price.")
+    currency: str = Field(..., description="The currency of the price.")
+    status: Optional[str] = Field(None, description="The condition of the comparable item.")
+    similarity: float = Field(..., description="Title similarity to the listing being valued (0-1).")
+
+    def to_prompt_data(self):
+        """Return the fields worth sending to the market research agent."""
+        return self.model_dump(exclude_none=True, exclude={'item_id', 'similarity'})
+
+
+class PricePosition(BaseModel):
+    """
+    Pydantic model for where a listing's price falls among the prices seen on Vinted.
+
+    Estimated from the streaming price sketch of the listing's product, or of its category
+    when the product has too few observations.
+    """
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    scope: str = Field(..., description="What the price is compared against: 'product' or 'category'.")
+    key: str = Field(..., description="The product key or category path.")
+    count: int = Field(..., description="Number of prices the sketch has seen.")
+    percentile: float = Field(..., description="Share of observed prices at or below the listing price (0-100).")
+    median: float = Field(..., description="Estimated median price.")
+    outlier: Optional[str] = Field(None, description="'low' or 'high' when the price is outside the "
+                                                     "interquartile fences, otherwise null.")
+
+    def to_prompt_data(self):
+        """Return the fields worth sending to the analysis agent."""
+        return self.model_dump(exclude_none=True, exclude={'key'})
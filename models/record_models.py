@@ -0,0 +1,37 @@
+"""
+Pydantic model joining the results of every pipeline stage for one listing.
+"""
+from typing import Optional
+
+from pydantic import BaseModel, Field, ConfigDict
+
+from models.deal_models import DealMessageResult
+from models.item_models import ItemAnalysisResult
+from models.listing_models import VintedListing
+from models.market_models import MarketValueResult
+from models.price_models import PricePosition
+
+
+class ItemRecord(BaseModel):
+    """
+    Pydantic model for a fully processed listing.
+
+    This is the unit the pipeline emits once an item has gone through its last stage,
+    and what reports and streaming outputs are built from.
+    """
+    model_config = ConfigDict(extra='forbid')
+
+    item_id: str = Field(..., description="The unique identifier of the listing.")
+    listing: VintedListing = Field(..., description="The normalized Vinted listing.")
+    research: Optional[MarketValueResult] = Field(None, description="The market research result.")
+    analysis: ItemAnalysisResult = Field(..., description="The item analysis result.")
+    message: Optional[DealMessageResult] = Field(None, description="The suggested deal message.")
+    price_position: Optional[PricePosition] = Field(None, description="Where the price falls among the prices "
+                                                                      "seen on Vinted.")
+    duplicate_of: Optional[str] = Field(None, description="ID of the listing this one duplicates, whose results "
+                                                           "it reuses.")
+
+    @property
+    def score(self):
+        """The bargain score of the item (0-100)."""
+        return self.analysis.score
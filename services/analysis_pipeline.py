@@ -0,0 +1,628 @@
+"""
+CrewAI flow that fetches Vinted items and runs them through the research, analysis and deal message stages.
+"""
+import json
+import math
+import threading
+import time
+
+from crewai import Flow
+from crewai.flow.flow import listen, start
+
+from agents.crew_cache import CrewCache
+from config.settings import DEFAULT_SEARCH_TEXT, DEFAULT_MAX_ITEMS, VINTED_BASE_URL, MAX_CONCURRENT_ITEMS, \
+    EARLY_RECOMMENDATIONS_FRACTION
+from models.deal_models import DealMessageResult
+from models.item_models import ItemAnalysisResult
+from models.market_models import MarketValueResult
+from models.record_models import ItemRecord
+from services.cache_service import ResultCache
+from services.dedup_service import copy_record, duplicate_metrics, group_duplicates
+from services.priority_service import pre_scores, prioritize
+from services.publish_service import RunPublisher
+from services.record_store_service import RecordStore
+from services.report_service import ReportService
+from services.vinted_service import VintedService
+from utils.attribute_utils import extract_attributes
+from utils.profile_utils import profile_stage, profiling_enabled
+from utils.trace_utils import propagate, span
+
+
+class SecondHandItemAnalysisPipeline(Flow):
+    """Flow for analyzing second-hand items from Vinted."""
+
+    def __init__(self, search_text=DEFAULT_SEARCH_TEXT, max_items=DEFAULT_MAX_ITEMS, max_searches=1,
+                 search_site="amazon", vinted_base_url=VINTED_BASE_URL, crew_cache=None, result_cache=None,
+                 vinted_service=None, report_service=None, open_report=True, on_record=None, listings=None,
+                 generate_report=True, report_layout="auto", history_service=None,
+                 incremental_report=False, export_formats=(), price_history=None, deduplicate=True,
+                 spill_records=False, max_concurrent_items=MAX_CONCURRENT_ITEMS, on_early_recommendations=None,
+                 run_started_at=None, record_prices=True, pre_scores=None):
+        """
+        Initialize the analysis pipeline.
+
+        Args:
+            search_text: The search query to use on Vinted
+            max_items: Maximum number of items to analyze
+            max_searches: Maximum number of searches to perform per item (default: 1)
+            search_site: Site to focus search on (default: "amazon")
+            vinted_base_url: Base URL for Vinted (default: https://www.vinted.it)
+            crew_cache: Optional CrewCache to reuse crews built by previous runs
+            result_cache: Optional ResultCache used to skip crew runs for requests already answered
+            vinted_service: Optional VintedService to reuse an open HTTP session
+            report_service: Optional ReportService to reuse
+            open_report: Whether to open the HTML report in the browser once generated
+            on_record: Optional callback receiving each ItemRecord as soon as the item is complete
+            listings: Optional prefetched VintedListing objects to analyze instead of searching Vinted
+            generate_report: Whether to render the HTML report at the end of the run
+            report_layout: HTML report layout: "auto", "cards" or "virtual"
+            history_service: Optional HistoryService recording the run's records
+            incremental_report: Whether to update the search query's stable report instead of writing a new one
+            export_formats: Formats to export the records to ("jsonl", "csv", "parquet", "arrow")
+            price_history: Optional PriceHistoryService recording fetched prices and used as the market
+                reference for well-known products
+            deduplicate: Whether near-duplicate listings reuse the results of one representative
+                instead of being analyzed separately
+            spill_records: Whether to keep finished records in a RecordStore on disk instead of in
+                memory, so memory use stays flat on large sweeps
+            max_concurrent_items: Maximum number of items going through the stages at the same time;
+                the crew cache's adaptive limits decide how many of their LLM and search calls run
+            on_early_recommendations: Optional callback receiving provisional recommendations once the
+                most promising share of the items is done, before the rest of the run completes
+            run_started_at: Optional time.time() value the run started at; listings the price history
+                first saw from then on (the run's new listings) aren't used to value its items.
+                Defaults to when the flow fetches its listings
+            record_prices: Whether to record the fetched prices in price_history (False when
+                the caller already did, e.g. the parent of a sharded run)
+            pre_scores: Optional pre-scores by listing ID, taken by a caller that recorded the
+                prices itself; computed when the listings are fetched otherwise
+        """
+        super().__init__()
+        self.search_text = search_text
+        self.max_items = max_items
+        self.max_searches = max_searches
+        self.search_site = search_site
+        self.vinted_base_url = vinted_base_url
+        self.on_record = on_record
+        self.on_early_recommendations = on_early_recommendations
+        self.run_started_at = run_started_at
+        self.record_prices = record_prices
+        self._pre_scores = pre_scores  # Listing ID -> pre-score, taken before the run's prices are recorded
+        self.prefetched_listings = listings
+        self.listings = []  # Store the normalized listings
+        # Store the completed item records for HTML generation
+        self.records = RecordStore() if spill_records else []
+        self.metrics = {}  # Run statistics for the summary (e.g. the duplicate rate)
+        self.deduplicate = deduplicate
+        self.max_concurrent_items = max_concurrent_items
+        self._record_lock = threading.Lock()
+        self._processed = 0  # Items done (analyzed or not) in the current run
+        self._early_threshold = None  # Items done when provisional recommendations are emitted
+        self.report_file = None
+        self.export_files = {}
+        self.crew_cache = crew_cache or CrewCache()
+        self.result_cache = result_cache
+        self.price_history = price_history
+        self.vinted_service = vinted_service or VintedService(base_url=vinted_base_url)
+        self.report_service = report_service or ReportService()
+        self.publisher = RunPublisher(
+            self.report_service,
+            history_service=history_service,
+            generate_report=generate_report,
+            report_layout=report_layout,
+            incremental_report=incremental_report,
+            export_formats=export_formats,
+            open_report=open_report
+        )
+
+    def _run_crew(self, namespace, inputs, get_crew, model_class, item_id, cache_inputs=None):
+        """
+        Run a crew for one item, answering from the result cache when possible.
+
+        Identical requests made at the same time (e.g. the same product by two threads) wait for
+        a single crew run and share its result.
+
+        Args:
+            namespace: Cache namespace of the request (the stage and its settings)
+            inputs: The kickoff inputs
+            get_crew: Callable returning the crew to run on a cache miss
+            model_class: The Pydantic model of the task output
+            item_id: The ID of the listing the crew is run for
+            cache_inputs: Optional data identifying the request in the result cache instead of the inputs
+
+        Returns:
+            The task's Pydantic result, keyed to the listing ID
+        """
+        key = ResultCache.fingerprint(namespace, inputs if cache_inputs is None else cache_inputs)
+        result, shared = self.crew_cache.llm_requests.do(key, self._request_crew, key, namespace, inputs, get_crew,
+                                                         model_class, item_id)
+        if shared:
+            with self._record_lock:
+                self.metrics['shared_requests'] = self.metrics.get('shared_requests', 0) + 1
+        return result.model_copy(update={'item_id': item_id})
+
+    def _request_crew(self, key, namespace, inputs, get_crew, model_class, item_id):
+        """Answer a crew request from the result cache, or run the crew and cache its result."""
+        if self.result_cache is not None:
+            with span("result_cache.lookup", namespace=namespace) as lookup_span:
+                cached = self.result_cache.get_model(key, model_class)
+                lookup_span.set_attribute("hit", cached is not None)
+            if cached is not None:
+                return cached
+
+        crew = get_crew()
+        with self.crew_cache.llm_limiter.slot(namespace), \
+                span("crew.kickoff", namespace=namespace, item_id=item_id) as kickoff_span:
+            crew_output = crew.kickoff(inputs)
+            kickoff_span.set_attributes(model=_crew_model(crew), **_token_usage(crew_output))
+        result = _structured_output(crew_output, item_id)
+        if self.result_cache is not None:
+            self.result_cache.set_model(key, result)
+        return result
+
+    @start()
+    def fetch_items_from_vinted(self):
+        """Fetch items from Vinted using the vinted_scraper."""
+        with span("stage.fetch", search_text=self.search_text, max_items=self.max_items) as stage_span, \
+                profile_stage("fetch"):
+            if self.prefetched_listings is not None:
+                print(f"1- Using {len(self.prefetched_listings)} prefetched items")
+                listings = self.prefetched_listings
+            else:
+                print("1- Fetching items from Vinted")
+
+                # Use the VintedService to search for items, normalized into VintedListing objects
+                listings = self.vinted_service.search_items(
+                    self.search_text,
+                    self.max_items
+                )
+
+            # Store the listings for later use
+            self.listings = listings
+            stage_span.set_attribute("listings", len(listings))
+
+            # Every observed price feeds the local market reference of later runs; listings first
+            # seen from now on are this run's new ones, so they aren't used to value each other
+            if self.run_started_at is None:
+                self.run_started_at = time.time()
+            # Items are prioritized against the prices known before this run's are added
+            if self._pre_scores is None:
+                self._pre_scores = self._score_listings(listings)
+            if self.price_history is not None and self.record_prices:
+                with span("price_history.record", listings=len(listings)):
+                    try:
+                        self.price_history.record_listings(listings)
+                    except Exception as e:
+                        print(f"Error recording price history: {str(e)}")
+
+        return listings
+
+    @listen(fetch_items_from_vinted)
+    def process_items(self, listings):
+        """
+        Run each listing through market research, analysis and deal message generation.
+
+        Each item goes through all three stages one after the other, so its record is
+        complete (and handed to on_record) as soon as its last stage finishes. Several items
+        are processed at the same time, as many as the adaptive LLM and search limits let
+        through. Items start in order of a cheap pre-score (see prioritize), so the best deals
+        tend to finish first. Near-duplicates of a listing get a copy of its record instead of
+        going through the stages again.
+
+        Args:
+            listings: List of VintedListing objects
+
+        Returns:
+            List of ItemRecord objects for the items that could be analyzed
+        """
+        with span("stage.process_items", listings=len(listings)) as stage_span, profile_stage("process_items"):
+            groups = self._group_duplicates(listings)
+            duplicates = {group[0].id: group[1:] for group in groups}
+            listings = self._prioritize([group[0] for group in groups])
+            stage_span.set_attributes(items=len(listings), duplicates=self.metrics['duplicates'])
+
+            self._processed = 0
+            self._early_threshold = early_recommendations_threshold(len(listings)) \
+                if self.on_early_recommendations else None
+
+            print(f"2- Researching, analyzing and writing deal messages for {len(listings)} items")
+
+            llm_limiter = self.crew_cache.llm_limiter
+            search_limiter = self.crew_cache.search_limiter
+            checkpoints = llm_limiter.checkpoint(), search_limiter.checkpoint()
+
+            # Profiles attribute allocations per stage, which only works one item at a time
+            workers = 1 if profiling_enabled() else min(self.max_concurrent_items, len(listings))
+            if workers <= 1:
+                for i, listing in enumerate(listings):
+                    self._process_listing(i, len(listings), listing, duplicates[listing.id])
+            else:
+                # The crew cache's item threads keep their crews warm between runs
+                self.crew_cache.run_items(
+                    propagate(self._process_listing),
+                    [(i, len(listings), listing, duplicates[listing.id]) for i, listing in enumerate(listings)],
+                    workers
+                )
+
+            self.metrics['llm_concurrency'] = llm_limiter.metrics(since=checkpoints[0])
+            self.metrics['search_concurrency'] = search_limiter.metrics(since=checkpoints[1])
+            stage_span.set_attributes(llm_limit=self.metrics['llm_concurrency']['limit'],
+                                      search_limit=self.metrics['search_concurrency']['limit'])
+
+        return self.records
+
+    def _process_listing(self, position, count, listing, duplicates):
+        """Process one listing of the run in its own item span."""
+        print(f"  Item {position + 1}/{count} (ID: {listing.id})")
+        with span("item", item_id=listing.id, title=listing.title, price=listing.price):
+            self._process_item(listing, duplicates)
+
+        early_recommendations = None
+        with self._record_lock:
+            self._processed += 1
+            if self._processed == self._early_threshold and self.records:
+                early_recommendations = format_recommendations(rank_records(self.records))
+        if early_recommendations:
+            try:
+                self.on_early_recommendations(early_recommendations)
+            except Exception as e:
+                print(f"Error emitting early recommendations: {str(e)}")
+
+    def _score_listings(self, listings):
+        """Return the pre-scores of listings by ID, or None on error."""
+        try:
+            return dict(zip([listing.id for listing in listings], pre_scores(listings, self.price_history)))
+        except Exception as e:
+            print(f"Error prioritizing items: {str(e)}")
+            return None
+
+    def _prioritize(self, listings):
+        """Order listings best first by the pre-scores taken at fetch; they keep their order on error."""
+        if self._pre_scores is None:
+            return listings
+        return prioritize(listings, scores=self._pre_scores)
+
+    def _process_item(self, listing, duplicates):
+        """
+        Run one listing through the three stages and emit its record and its duplicates' records.
+
+        Args:
+            listing: The VintedListing to process
+            duplicates: Near-duplicate VintedListing objects reusing its results
+        """
+        with span("stage.market_research") as stage_span, profile_stage("market_research"):
+            research = self._research_market_value(listing)
+            stage_span.set_attributes(average_price=research.average_price, confidence=research.confidence_score)
+        price_position = self._price_position(listing)
+        with span("stage.item_analysis") as stage_span, profile_stage("item_analysis"):
+            analysis = self._analyze_item(listing, research, price_position)
+            stage_span.set_attribute("score", analysis.score if analysis else None)
+        if analysis is None:
+            # Continue with next item
+            return
+        with span("stage.deal_message"), profile_stage("deal_message"):
+            message = self._generate_deal_message(listing, research, analysis)
+
+        record = ItemRecord(item_id=listing.id, listing=listing, research=research, analysis=analysis,
+                            message=message, price_position=price_position)
+        with self._record_lock:
+            for completed in [record] + [copy_record(record, duplicate) for duplicate in duplicates]:
+                self.records.append(completed)
+                if self.on_record:
+                    self.on_record(completed)
+
+    def _group_duplicates(self, listings):
+        """Group near-duplicate listings, recording the duplicate rate; each listing is alone on error."""
+        groups = [[listing] for listing in listings]
+        if self.deduplicate and len(listings) > 1:
+            try:
+                groups = group_duplicates(listings, thumbnail_service=self.report_service.thumbnail_service)
+            except Exception as e:
+                print(f"Error detecting duplicate listings: {str(e)}")
+        self.metrics.update(duplicate_metrics(len(listings), groups))
+        if self.metrics['duplicates']:
+            print(f"   {self.metrics['duplicates']} near-duplicate listings will reuse the results of their original")
+        return groups
+
+    def _research_market_value(self, listing):
+        """Research the market value of a listing using the Market Research agent."""
+        print("    Researching market value")
+
+        # Well-known products are valued from the prices already seen on Vinted
+        comparables = []
+        if self.price_history is not None:
+            with span("price_history.local_value") as lookup_span:
+                try:
+                    comparables = self.price_history.find_comparables(listing, first_seen_before=self.run_started_at)
+                    local_value = self.price_history.local_market_value(listing, comparables,
+                                                                        first_seen_before=self.run_started_at)
+                except Exception as e:
+                    print(f"Error reading price history for item {listing.id}: {str(e)}")
+                    local_value = None
+                lookup_span.set_attributes(comparables=len(comparables), hit=local_value is not None)
+            if local_value is not None:
+                print("    Using the local price history as market reference")
+                return local_value
+
+        # Format the item data for the market research task, with the closest Vinted listings as a head start
+        item_data, cache_inputs = self._research_item_data(listing)
+        if comparables:
+            item_data["similar_vinted_listings"] = [comparable.to_prompt_data() for comparable in comparables]
+        formatted_data = {"item_data": json.dumps(item_data, indent=2)}
+
+        try:
+            return self._run_crew(
+                f"market_research:{self.search_site}:{self.max_searches}",
+                formatted_data,
+                lambda: self.crew_cache.market_research_crew(self.max_searches, self.search_site),
+                MarketValueResult,
+                listing.id,
+                cache_inputs=cache_inputs
+            )
+        except Exception as e:
+            print(f"Error researching market value for item {listing.id}: {str(e)}")
+            # Create a minimal research result to avoid breaking the pipeline
+            return MarketValueResult(
+                item_id=listing.id,
+                average_price=0.0,
+                price_range=[0.0, 0.0],
+                comparable_items=[],
+                value_assessment="Could not determine due to error",
+                market_demand="Unknown",
+                price_factors=["Error during research"],
+                confidence_score=1,
+                notes=f"Error during market research: {str(e)}"
+            )
+
+    def _price_position(self, listing):
+        """Place a listing's price among the prices seen on Vinted, or return None."""
+        if self.price_history is None:
+            return None
+        try:
+            return self.price_history.price_position(listing)
+        except Exception as e:
+            print(f"Error reading price sketches for item {listing.id}: {str(e)}")
+            return None
+
+    def _research_item_data(self, listing):
+        """
+        Build the item data of a market research request.
+
+        Listings recognized by the attribute rule packs are sent as their extracted specs
+        instead of the full listing, and are cached per product, condition and price.
+
+        Args:
+            listing: The VintedListing to research
+
+        Returns:
+            A tuple of the item data and the data identifying the request in the result cache
+            (None to use the prompt inputs)
+        """
+        attributes = extract_attributes(listing)
+        if attributes is None:
+            return listing.to_prompt_data(), None
+
+        item_data = {
+            'title': listing.title,
+            'specs': attributes.to_prompt_data(),
+            'status': listing.status,
+            'price': listing.price,
+            'currency': listing.currency
+        }
+        cache_inputs = {'product': attributes.product_key, 'status': listing.status, 'price': listing.price,
+                        'currency': listing.currency}
+        return item_data, cache_inputs
+
+    def _analyze_item(self, listing, research, price_position=None):
+        """Analyze a listing using the AI crew, incorporating its market research."""
+        print("    Analyzing item")
+
+        # Combine item data with market research for more informed analysis
+        # Use model_dump with exclude_defaults to remove any unwanted default keys
+        enhanced_item_data = {
+            "item_data": listing.to_prompt_data(),
+            "market_research": research.model_dump(exclude_defaults=True)
+        }
+        if price_position is not None:
+            enhanced_item_data["vinted_price_position"] = price_position.to_prompt_data()
+
+        # Convert the enhanced data to a JSON string
+        formatted_data = {"item_data": json.dumps(enhanced_item_data, indent=2)}
+
+        try:
+            return self._run_crew("item_analysis", formatted_data, self.crew_cache.item_analysis_crew,
+                                  ItemAnalysisResult, listing.id)
+        except Exception as e:
+            print(f"Error analyzing item {listing.id}: {str(e)}")
+            return None
+
+    def _generate_deal_message(self, listing, research, analysis):
+        """Generate a deal message for an analyzed listing."""
+        print("    Generating deal message")
+
+        # Prepare item data for deal message generation with all available information
+        item_info = {
+            'id': listing.id,
+            'title': analysis.title,
+            'price': analysis.price,
+            'status': analysis.status,
+            'seller_rating': listing.seller_rating if listing.seller_rating is not None else 'Unknown',
+            'analysis_score': analysis.score,
+            'analysis_notes': analysis.notes
+        }
+
+        # Format the data for the deal message task
+        formatted_data = {
+            "item_data": json.dumps(item_info, indent=2),
+            "market_data": json.dumps(research.model_dump(exclude_defaults=True), indent=2)
+        }
+
+        try:
+            return self._run_crew("deal_message", formatted_data, self.crew_cache.deal_message_crew,
+                                  DealMessageResult, listing.id)
+        except Exception as e:
+            print(f"Error generating deal message for item {listing.id}: {str(e)}")
+            return None
+
+    @listen(process_items)
+    def prepare_recommendations(self, records):
+        """
+        Prepare recommendations based on the analysis results.
+
+        Args:
+            records: List of ItemRecord objects
+
+        Returns:
+            A formatted string with recommendations
+        """
+        print("3- Preparing recommendations")
+
+        if not records:
+            return "No analysis results available to prepare recommendations."
+
+        with span("stage.recommendations", records=len(records)), profile_stage("recommendations"):
+            sorted_records = rank_records(records)
+            recommendations = format_recommendations(sorted_records)
+
+        # The report, exports and history are written in the background; see wait_for_report
+        self.publisher.publish(self.search_text, self.search_site, sorted_records)
+
+        return recommendations
+
+    def wait_for_report(self, timeout=None):
+        """
+        Wait for the run's report, exports and history to be written.
+
+        Args:
+            timeout: Optional maximum number of seconds to wait
+
+        Returns:
+            The filename of the HTML report, or None
+        """
+        self.report_file = self.publisher.wait(timeout)
+        self.export_files = self.publisher.export_files
+        return self.report_file
+
+    def close(self):
+        """
+        Delete the records spilled to disk, once the report, exports and history are written.
+
+        The services passed in (caches, history, sessions) are shared and stay open.
+        """
+        self.publisher.wait()
+        if isinstance(self.records, RecordStore):
+            self.records.close()
+
+
+def rank_records(records):
+    """
+    Sort records best first.
+
+    Records are ordered by bargain score; ties are broken by the price-based deal score against
+    the researched average price, computed for the whole batch in one vectorized pass.
+
+    Args:
+        records: List of ItemRecord objects, or a RecordStore
+
+    Returns:
+        A new list of the records, best first (the store itself, ranked, for a RecordStore)
+    """
+    if isinstance(records, RecordStore):
+        return records.ranked()
+    if not records:
+        return []
+    order = rank_order(
+        [record.score for record in records],
+        [record.listing.price if record.listing.price is not None else float('nan') for record in records],
+        [record.research.average_price if record.research else float('nan') for record in records]
+    )
+    return [records[i] for i in order]
+
+
+def rank_order(scores, prices, average_prices):
+    """
+    Return the positions of records sorted best first.
+
+    Args:
+        scores: Bargain score of each record
+        prices: Listing price of each record (NaN when unknown)
+        average_prices: Researched average price of each record (NaN when unknown)
+
+    Returns:
+        List of positions, best first; ties keep their original order
+    """
+    from agents.market_research_agent import calculate_deal_scores
+
+    deal_scores = calculate_deal_scores(prices, average_prices).tolist()
+    return sorted(range(len(scores)), key=lambda i: (scores[i], deal_scores[i]), reverse=True)
+
+
+def early_recommendations_threshold(count):
+    """
+    Return after how many of a run's items provisional recommendations are emitted.
+
+    Args:
+        count: Number of items the run processes
+
+    Returns:
+        int: The number of items, or None when too few items would remain after it to be worth it
+    """
+    threshold = max(3, math.ceil(count * EARLY_RECOMMENDATIONS_FRACTION))
+    return threshold if threshold < count else None
+
+
+def format_recommendations(sorted_records):
+    """
+    Format the top three records as markdown recommendations.
+
+    Args:
+        sorted_records: ItemRecord objects sorted by score, best first
+
+    Returns:
+        A formatted string with recommendations
+    """
+    recommendations = "# Recommended Items\n\n"
+
+    for i, record in enumerate(sorted_records[:3], 1):
+        recommendations += f"## {i}. Item ID: {record.item_id}\n"
+        recommendations += f"**Score: {record.score}/100**\n\n"
+        recommendations += f"{record.analysis.notes}\n\n"
+        recommendations += "---\n\n"
+
+    return recommendations
+
+
+def _structured_output(crew_output, item_id):
+    """
+    Return the Pydantic output of a crew run, keyed to the listing it was produced for.
+
+    Args:
+        crew_output: The CrewOutput returned by crew.kickoff
+        item_id: The ID of the listing the crew was run for
+
+    Returns:
+        The task's Pydantic result with its item_id set to the listing ID
+    """
+    result = getattr(crew_output, 'pydantic', None)
+    if result is None:
+        raise ValueError("The crew did not return a structured result")
+    return result.model_copy(update={'item_id': item_id})
+
+
+def _crew_model(crew):
+    """Return the LLM model name of a crew's first agent, or None."""
+    agents = getattr(crew, 'agents', None) or []
+    return getattr(getattr(agents[0], 'llm', None), 'model', None) if agents else None
+
+
+def _token_usage(crew_output):
+    """Return the token counts of a crew run as span attributes."""
+    usage = getattr(crew_output, 'token_usage', None)
+    if usage is None:
+        return {}
+    return {
+        'tokens.prompt': getattr(usage, 'prompt_tokens', None),
+        'tokens.completion': getattr(usage, 'completion_tokens', None),
+        'tokens.total': getattr(usage, 'total_tokens', None),
+        'llm.requests': getattr(usage, 'successful_requests', None)
+    }
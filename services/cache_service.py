@@ -0,0 +1,128 @@
+"""
+Service for caching stage results between items, runs and processes.
+Results are stored as JSON in SQLite, with the most recent entries kept in memory.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.settings import RESULT_CACHE_PATH, RESULT_CACHE_TTL, RESULT_CACHE_MEMORY_ENTRIES
+
+
+class ResultCache:
+    """Cache for stage results, keyed by a fingerprint of the request that produced them."""
+
+    def __init__(self, path=RESULT_CACHE_PATH, ttl=RESULT_CACHE_TTL, memory_entries=RESULT_CACHE_MEMORY_ENTRIES):
+        """
+        Initialize the result cache.
+
+        Args:
+            path: Path of the SQLite database, or None to keep results in memory only
+            ttl: Seconds before a cached result is considered stale
+            memory_entries: Maximum number of results kept in memory
+        """
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @staticmethod
+    def fingerprint(namespace, payload):
+        """
+        Compute the cache key of a request.
+
+        Args:
+            namespace: The kind of request (e.g. the pipeline stage)
+            payload: JSON-serializable data identifying the request
+
+        Returns:
+            str: A hex digest identifying the request
+        """
+        data = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(f"{namespace}\0{data}".encode('utf-8')).hexdigest()
+
+    def _get_connection(self):
+        """Open the SQLite store on first use."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _remember(self, key, stored_at, value):
+        """Keep a result in memory, evicting the least recently used entries."""
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return the cached result for a key.
+
+        Args:
+            key: The request fingerprint
+
+        Returns:
+            The cached JSON value, or None if it is missing or stale
+        """
+        oldest = time.time() - self.ttl
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self.path:
+                row = self._get_connection().execute(
+                    "SELECT stored_at, value FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+            if entry is None or entry[0] < oldest:
+                return None
+            self._remember(key, *entry)
+            return entry[1]
+
+    def set(self, key, value):
+        """
+        Store a result.
+
+        Args:
+            key: The request fingerprint
+            value: The JSON-serializable result
+        """
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+            if self.path:
+                connection = self._get_connection()
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), stored_at)
+                )
+                connection.commit()
+
+    def get_model(self, key, model_class):
+        """Return the cached result for a key as an instance of the given Pydantic model."""
+        value = self.get(key)
+        return model_class.model_validate(value) if value is not None else None
+
+    def set_model(self, key, model):
+        """Store a Pydantic model result."""
+        self.set(key, model.model_dump(mode='json'))
+
+    def close(self):
+        """Close the SQLite store."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,128 @@
+"""
+Service for spotting reposted and duplicated listings before they are analyzed.
+
+Sellers often relist an item under a new ID, often at a new price, or post it several times.
+Listings of the same seller at close prices are duplicates when they share a photo (the same
+URL or the same image content) or their title and description are near-identical (MinHash LSH
+over character shingles). Only one listing per group goes through the pipeline; the others get
+a copy of its results.
+"""
+from config.settings import DEDUP_SIMILARITY, DEDUP_SHINGLE_SIZE, DEDUP_NUM_PERM, DEDUP_BANDS, \
+    DEDUP_PRICE_TOLERANCE
+from models.listing_models import PLACEHOLDER_PHOTO_URL
+from models.record_models import ItemRecord
+from utils.similarity_utils import MinHashLSH, jaccard, shingles
+
+UNKNOWN_SELLER = "Unknown seller"
+
+
+def _photo_keys(listing, photo_hashes):
+    """Return the keys identifying a listing's photo: its URL and its content hash, when known."""
+    keys = set()
+    url = listing.photo_url
+    if url and url != PLACEHOLDER_PHOTO_URL:
+        # Vinted signs its photo URLs in the query string; the path identifies the photo
+        keys.add(("url", url.split('?')[0]))
+    if listing.id in photo_hashes:
+        # A photo uploaded again gets a new URL, but keeps its content
+        keys.add(("content", photo_hashes[listing.id]))
+    return keys
+
+
+def _same_offer(first, second, price_tolerance=DEDUP_PRICE_TOLERANCE):
+    """Whether two listings come from the same known seller at close prices in the same currency."""
+    if first.seller == UNKNOWN_SELLER or first.seller != second.seller or first.currency != second.currency:
+        return False
+    if first.price is None or second.price is None:
+        return first.price == second.price
+    return abs(first.price - second.price) <= price_tolerance * max(first.price, second.price)
+
+
+def group_duplicates(listings, similarity=DEDUP_SIMILARITY, thumbnail_service=None):
+    """
+    Group near-duplicate listings.
+
+    Args:
+        listings: The VintedListing objects of a run
+        similarity: Minimum Jaccard similarity of the title and description shingles
+        thumbnail_service: Optional ThumbnailService hashing the listings' photos, so the same
+            photo under different URLs is recognized; photos are compared by URL otherwise
+
+    Returns:
+        A list of groups in the order of their first listing; each group is a list of
+        listings whose first one is the representative to analyze
+    """
+    photo_hashes = thumbnail_service.photo_hashes(listings) if thumbnail_service is not None else {}
+    lsh = MinHashLSH(num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS)
+    text_shingles = []
+    photo_keys = []
+    by_photo = {}
+    parents = list(range(len(listings)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, listing in enumerate(listings):
+        text_shingles.append(shingles(f"{listing.title} {listing.description}", DEDUP_SHINGLE_SIZE))
+        candidates = lsh.add(i, text_shingles[i])
+
+        photo_keys.append(_photo_keys(listing, photo_hashes))
+        for photo_key in photo_keys[i]:
+            candidates.update(by_photo.setdefault(photo_key, []))
+            by_photo[photo_key].append(i)
+
+        for j in candidates:
+            if not _same_offer(listing, listings[j]):
+                continue
+            if photo_keys[i] & photo_keys[j] or jaccard(text_shingles[i], text_shingles[j]) >= similarity:
+                parents[find(i)] = find(j)
+
+    groups = {}
+    for i, listing in enumerate(listings):
+        groups.setdefault(find(i), []).append(listing)
+    return list(groups.values())
+
+
+def copy_record(record, listing):
+    """
+    Build the record of a duplicate listing from the record of its representative.
+
+    Args:
+        record: The ItemRecord of the representative listing
+        listing: The duplicate VintedListing
+
+    Returns:
+        ItemRecord: The representative's results, keyed to the duplicate listing
+    """
+    update = {'item_id': listing.id}
+    return ItemRecord(
+        item_id=listing.id,
+        listing=listing,
+        research=record.research.model_copy(update=update) if record.research else None,
+        analysis=record.analysis.model_copy(update={**update, 'title': listing.title}),
+        message=record.message.model_copy(update=update) if record.message else None,
+        price_position=record.price_position,
+        duplicate_of=record.item_id
+    )
+
+
+def duplicate_metrics(listing_count, groups):
+    """
+    Summarize the duplicates of a run.
+
+    Args:
+        listing_count: Number of listings fetched
+        groups: The groups returned by group_duplicates
+
+    Returns:
+        dict: listings, duplicates and duplicate_rate (0-1)
+    """
+    duplicates = listing_count - len(groups)
+    return {
+        'listings': listing_count,
+        'duplicates': duplicates,
+        'duplicate_rate': duplicates / listing_count if listing_count else 0.0
+    }
@@ -0,0 +1,254 @@
+"""
+Service for keeping a searchable history of every analysis run.
+
+Each run's records are stored in SQLite next to the result cache, with an FTS5 index over
+titles, descriptions and analysis notes and regular indexes on score, price and time, so
+questions like "the best SSD seen last week" are answered without opening old reports.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config.settings import HISTORY_DB_PATH, HISTORY_RETENTION_DAYS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    search_text TEXT NOT NULL,
+    search_site TEXT,
+    started_at REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    report_file TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    item_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    notes TEXT,
+    brand TEXT,
+    status TEXT,
+    price REAL,
+    currency TEXT,
+    score INTEGER NOT NULL,
+    confidence INTEGER,
+    average_price REAL,
+    url TEXT,
+    observed_at REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_score ON items (score);
+CREATE INDEX IF NOT EXISTS items_price ON items (price);
+CREATE INDEX IF NOT EXISTS items_observed_at ON items (observed_at);
+CREATE INDEX IF NOT EXISTS items_run_id ON items (run_id);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+"""
+
+# Full-text index kept in sync with the items table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, description, notes, content='items', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, title, description, notes) VALUES (new.id, new.title, new.description, new.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, description, notes)
+    VALUES ('delete', old.id, old.title, old.description, old.notes);
+END;
+"""
+
+RESULT_COLUMNS = ("item_id", "title", "brand", "status", "price", "currency", "score", "confidence",
+                  "average_price", "url", "observed_at", "search_text")
+
+
+def _match_expression(query):
+    """Turn free text into an FTS5 query matching every word (the last one as a prefix)."""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryService:
+    """Service class for recording and querying past analysis results."""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        """
+        Initialize the history service.
+
+        Args:
+            path: Path of the SQLite database
+        """
+        self.path = path
+        self._connection = None
+        self._has_fts = False
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        """Open the SQLite database and create the schema on first use."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self._has_fts = True
+            except sqlite3.OperationalError as e:
+                # SQLite built without FTS5: text queries fall back to LIKE
+                print(f"Full-text search unavailable, history queries will be slower: {str(e)}")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def record_run(self, search_text, records, search_site=None, report_file=None):
+        """
+        Store the records of a run.
+
+        Args:
+            search_text: The search query of the run
+            records: The ItemRecord objects produced by the run (a list or a RecordStore)
+            search_site: The site used for market research
+            report_file: The HTML report of the run, if any
+
+        Returns:
+            The ID of the stored run
+        """
+        observed_at = time.time()
+
+        def rows(run_id):
+            # Generated while inserting, so spilled records are read back one at a time
+            for record in records:
+                listing = record.listing
+                research = record.research
+                yield (
+                    run_id,
+                    record.item_id,
+                    listing.title,
+                    listing.description,
+                    record.analysis.notes,
+                    listing.brand,
+                    listing.status,
+                    listing.price,
+                    listing.currency,
+                    record.score,
+                    research.confidence_score if research else None,
+                    research.average_price if research else None,
+                    listing.url,
+                    observed_at,
+                    record.model_dump_json()
+                )
+
+        with self._lock:
+            connection = self._get_connection()
+            with connection:
+                run_id = connection.execute(
+                    "INSERT INTO runs (search_text, search_site, started_at, item_count, report_file) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (search_text, search_site, observed_at, len(records), report_file)
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO items (run_id, item_id, title, description, notes, brand, status, price, currency, "
+                    "score, confidence, average_price, url, observed_at, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows(run_id)
+                )
+        return run_id
+
+    def search(self, query=None, min_score=None, max_price=None, days=None, limit=20):
+        """
+        Find past items, best score first.
+
+        Args:
+            query: Optional words to look for in titles, descriptions and notes
+            min_score: Optional minimum bargain score
+            max_price: Optional maximum listing price
+            days: Optional number of days to look back
+            limit: Maximum number of items returned
+
+        Returns:
+            A list of dictionaries with the RESULT_COLUMNS of each matching item; an item seen in
+            several runs is returned once, with its latest observation
+        """
+        conditions = []
+        parameters = []
+        with self._lock:
+            connection = self._get_connection()
+
+            match = _match_expression(query) if query else None
+            if match and self._has_fts:
+                conditions.append("items.id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)")
+                parameters.append(match)
+            elif query:
+                for word in re.findall(r"\w+", query):
+                    conditions.append("(items.title LIKE ? OR items.description LIKE ? OR items.notes LIKE ?)")
+                    parameters.extend([f"%{word}%"] * 3)
+            if min_score is not None:
+                conditions.append("items.score >= ?")
+                parameters.append(min_score)
+            if max_price is not None:
+                conditions.append("items.price <= ?")
+                parameters.append(max_price)
+            if days is not None:
+                conditions.append("items.observed_at >= ?")
+                parameters.append(time.time() - days * 24 * 60 * 60)
+
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            columns = ", ".join(f"items.{column}" for column in RESULT_COLUMNS if column != "search_text")
+            rows = connection.execute(
+                f"SELECT {columns}, runs.search_text, MAX(items.observed_at) "
+                f"FROM items JOIN runs ON runs.id = items.run_id {where} "
+                f"GROUP BY items.item_id ORDER BY items.score DESC, items.observed_at DESC LIMIT ?",
+                (*parameters, limit)
+            ).fetchall()
+
+        return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
+
+    def get_record(self, item_id):
+        """Return the latest stored record of an item as a dictionary, or None."""
+        with self._lock:
+            row = self._get_connection().execute(
+                "SELECT record FROM items WHERE item_id = ? ORDER BY observed_at DESC LIMIT 1", (item_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self, retention_days=HISTORY_RETENTION_DAYS):
+        """
+        Delete runs older than the retention period and compact the database.
+
+        Args:
+            retention_days: Number of days of history to keep
+
+        Returns:
+            The number of deleted runs
+        """
+        oldest = time.time() - retention_days * 24 * 60 * 60
+        with self._lock:
+            connection = self._get_connection()
+            with connection:
+                connection.execute(
+                    "DELETE FROM items WHERE run_id IN (SELECT id FROM runs WHERE started_at < ?)", (oldest,)
+                )
+                deleted = connection.execute("DELETE FROM runs WHERE started_at < ?", (oldest,)).rowcount
+                if self._has_fts:
+                    connection.execute("INSERT INTO items_fts (items_fts) VALUES ('optimize')")
+            connection.execute("VACUUM")
+        return deleted
+
+    def close(self):
+        """Close the SQLite database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,317 @@
+"""
+Long-running service mode exposing the analysis pipeline through a small local HTTP/JSON API.
+
+Endpoints:
+    POST /jobs               Submit a search ({"search_text": ..., "max_items": ..., "max_searches": ..., "search_site": ...})
+    GET  /jobs               List all jobs
+    GET  /jobs/<id>          Poll the status of a job
+    GET  /jobs/<id>/report   Fetch the HTML report of a completed job
+    GET  /jobs/<id>/thumbnails/<file>   Fetch a photo thumbnail referenced by the report
+"""
+import datetime
+import json
+import mimetypes
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agents.crew_cache import CrewCache
+from config.settings import (DEFAULT_SEARCH_TEXT, DEFAULT_MAX_ITEMS, VINTED_BASE_URL, SERVICE_HOST, SERVICE_PORT,
+                             SERVICE_MAX_CONCURRENT_JOBS, SERVICE_MAX_QUEUED_JOBS, SERVICE_MAX_FINISHED_JOBS,
+                             MAX_CONCURRENT_ITEMS)
+from services.analysis_pipeline import SecondHandItemAnalysisPipeline
+from services.cache_service import ResultCache
+from services.history_service import HistoryService
+from services.price_history_service import PriceHistoryService
+from services.report_service import ReportService
+from services.vinted_service import VintedService
+
+SEARCH_SITES = ("amazon", "ebay", "all")
+
+
+class AnalysisJob:
+    """A search submitted to the service and its progress."""
+
+    def __init__(self, search_text, max_items, max_searches, search_site):
+        self.id = uuid.uuid4().hex[:12]
+        self.search_text = search_text
+        self.max_items = max_items
+        self.max_searches = max_searches
+        self.search_site = search_site
+        self.status = "queued"
+        self.recommendations = None
+        self.report_file = None
+        self.metrics = {}
+        self.error = None
+        self.submitted_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        """Return the job as a JSON-serializable dictionary."""
+        return {
+            'id': self.id,
+            'search_text': self.search_text,
+            'max_items': self.max_items,
+            'max_searches': self.max_searches,
+            'search_site': self.search_site,
+            'status': self.status,
+            'recommendations': self.recommendations,
+            'report_url': f"/jobs/{self.id}/report" if self.report_file else None,
+            'metrics': self.metrics,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class AnalysisJobService:
+    """Queue of analysis jobs sharing warm LLM clients, crews, HTTP sessions and caches."""
+
+    def __init__(self, llm_instance=None, max_concurrent_jobs=SERVICE_MAX_CONCURRENT_JOBS,
+                 max_queued_jobs=SERVICE_MAX_QUEUED_JOBS, result_cache=None, vinted_base_url=VINTED_BASE_URL,
+                 history_service=None, max_finished_jobs=SERVICE_MAX_FINISHED_JOBS):
+        """
+        Initialize the job service.
+
+        Args:
+            llm_instance: Optional LLM instance shared by all jobs
+            max_concurrent_jobs: Number of searches analyzed at the same time
+            max_queued_jobs: Number of searches allowed to wait for a free slot
+            result_cache: Optional ResultCache shared by all jobs
+            vinted_base_url: Base URL for Vinted
+            history_service: Optional HistoryService shared by all jobs
+            max_finished_jobs: Number of completed or failed jobs kept for polling
+        """
+        # Enough item threads for every running job; they keep their crews warm between jobs
+        self.crew_cache = CrewCache(llm_instance, max_item_threads=MAX_CONCURRENT_ITEMS * max_concurrent_jobs)
+        self.result_cache = result_cache or ResultCache()
+        self.report_service = ReportService()
+        self.history_service = history_service or HistoryService()
+        self.price_history = PriceHistoryService()
+        self.vinted_base_url = vinted_base_url
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="analysis-job")
+
+    def _get_vinted_service(self):
+        """Return the calling worker's VintedService, keeping its HTTP session open between jobs."""
+        if not hasattr(self._local, 'vinted_service'):
+            self._local.vinted_service = VintedService(base_url=self.vinted_base_url)
+        return self._local.vinted_service
+
+    def submit(self, search_text=DEFAULT_SEARCH_TEXT, max_items=DEFAULT_MAX_ITEMS, max_searches=1,
+               search_site="amazon"):
+        """
+        Queue a search for analysis.
+
+        Returns:
+            AnalysisJob: The queued job
+
+        Raises:
+            ValueError: If a parameter is invalid
+            OverflowError: If the queue is full
+        """
+        if not isinstance(search_text, str) or not search_text.strip():
+            raise ValueError("search_text must be a non-empty string")
+        if not isinstance(max_items, int) or max_items < 1:
+            raise ValueError("max_items must be a positive integer")
+        if not isinstance(max_searches, int) or max_searches < 1:
+            raise ValueError("max_searches must be a positive integer")
+        if search_site not in SEARCH_SITES:
+            raise ValueError(f"search_site must be one of {', '.join(SEARCH_SITES)}")
+
+        with self._lock:
+            pending = sum(1 for job in self.jobs.values() if job.status in ("queued", "running"))
+            if pending >= self.max_concurrent_jobs + self.max_queued_jobs:
+                raise OverflowError("Too many pending jobs, try again later")
+            job = AnalysisJob(search_text.strip(), max_items, max_searches, search_site)
+            self.jobs[job.id] = job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given ID, or None."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        """Return all jobs, most recent first."""
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def _run(self, job):
+        """Run a job's pipeline on a worker thread."""
+        job.status = "running"
+        job.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        flow = None
+        try:
+            flow = SecondHandItemAnalysisPipeline(
+                search_text=job.search_text,
+                max_items=job.max_items,
+                max_searches=job.max_searches,
+                search_site=job.search_site,
+                vinted_base_url=self.vinted_base_url,
+                crew_cache=self.crew_cache,
+                result_cache=self.result_cache,
+                vinted_service=self._get_vinted_service(),
+                report_service=self.report_service,
+                open_report=False,
+                history_service=self.history_service,
+                incremental_report=True,
+                price_history=self.price_history
+            )
+            job.recommendations = flow.kickoff()
+            job.report_file = flow.wait_for_report()
+            job.metrics = flow.metrics
+            job.status = "completed"
+        except Exception as e:
+            print(f"Error running job {job.id}: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            if flow is not None:
+                flow.close()
+            job.finished_at = datetime.datetime.now().isoformat(timespec='seconds')
+            self._evict_finished_jobs()
+
+    def _evict_finished_jobs(self):
+        """Forget the oldest completed or failed jobs beyond max_finished_jobs."""
+        with self._lock:
+            finished = [job for job in self.jobs.values() if job.finished_at is not None]
+            finished.sort(key=lambda job: (job.finished_at, job.submitted_at))
+            for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self.jobs[job.id]
+
+    def shutdown(self):
+        """Wait for running jobs and release the shared resources."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.crew_cache.close()
+        self.result_cache.close()
+        self.history_service.close()
+        self.price_history.close()
+
+
+class _JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler translating API requests into job service calls."""
+
+    job_service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != "/jobs":
+            self._send_json(404, {'error': "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("The request body must be a JSON object")
+            job = self.job_service.submit(
+                search_text=params.get('search_text', DEFAULT_SEARCH_TEXT),
+                max_items=params.get('max_items', DEFAULT_MAX_ITEMS),
+                max_searches=params.get('max_searches', 1),
+                search_site=params.get('search_site', "amazon")
+            )
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except OverflowError as e:
+            self._send_json(429, {'error': str(e)})
+            return
+
+        self._send_json(202, job.to_dict())
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in self.job_service.list_jobs()])
+            return
+
+        job = self.job_service.get(parts[1]) if len(parts) in (2, 3, 4) and parts[0] == "jobs" else None
+        if job is None:
+            self._send_json(404, {'error': "Not found"})
+            return
+
+        if len(parts) == 2:
+            self._send_json(200, job.to_dict())
+            return
+
+        # Reports load their thumbnails relative to /jobs/<id>/report
+        if len(parts) == 4 and parts[2] == "thumbnails":
+            self._send_thumbnail(parts[3])
+            return
+
+        if len(parts) != 3 or parts[2] != "report":
+            self._send_json(404, {'error': "Not found"})
+            return
+        if not job.report_file:
+            self._send_json(409, {'error': f"No report available (job is {job.status})"})
+            return
+
+        with open(job.report_file, 'rb') as f:
+            body = f.read()
+        self._send_body(body, "text/html; charset=utf-8")
+
+    def _send_thumbnail(self, filename):
+        """Serve a cached thumbnail."""
+        thumbnail_service = self.job_service.report_service.thumbnail_service
+        path = os.path.join(thumbnail_service.cache_dir, filename) if thumbnail_service else None
+        if not path or filename != os.path.basename(filename) or not os.path.isfile(path):
+            self._send_json(404, {'error': "Not found"})
+            return
+
+        with open(path, 'rb') as f:
+            body = f.read()
+        self._send_body(body, mimetypes.guess_type(filename)[0] or "application/octet-stream")
+
+    def _send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} - {format % args}")
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, max_concurrent_jobs=SERVICE_MAX_CONCURRENT_JOBS, llm_instance=None):
+    """
+    Run the analysis service until interrupted.
+
+    Args:
+        host: Interface to listen on (default: 127.0.0.1)
+        port: Port to listen on
+        max_concurrent_jobs: Number of searches analyzed at the same time
+        llm_instance: Optional LLM instance shared by all jobs
+    """
+    job_service = AnalysisJobService(llm_instance=llm_instance, max_concurrent_jobs=max_concurrent_jobs)
+    handler = type("JobRequestHandler", (_JobRequestHandler,), {'job_service': job_service})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    print(f"DealSenseAI service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down service")
+    finally:
+        server.server_close()
+        job_service.shutdown()
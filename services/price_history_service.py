@@ -0,0 +1,417 @@
+"""
+Service for recording every observed Vinted price and deriving local market references.
+
+Each listing fetched from Vinted is stored with a normalized product key. Rolling statistics
+over a product's recent listings (median, quartiles, sample size) are then a free,
+instant market reference, used instead of web research when the sample is large enough.
+A TF-IDF index over the same observations finds similar listings of other products, and
+streaming quantile sketches (t-digests) per product and category tell how unusual a price is.
+"""
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from config.settings import (
+    PRICE_HISTORY_DB_PATH, PRICE_HISTORY_WINDOW_DAYS, PRICE_HISTORY_MIN_SAMPLES,
+    COMPARABLES_TOP_K, COMPARABLES_MIN_SIMILARITY, COMPARABLES_MIN_MATCHES,
+    PRICE_SKETCH_COMPRESSION, PRICE_OUTLIER_IQR_FACTOR
+)
+from models.market_models import ComparableItem, MarketValueResult
+from models.price_models import ComparableListing, PricePosition, PriceStatistics
+from utils.similarity_utils import TfidfIndex
+from utils.attribute_utils import extract_attributes
+from utils.sketch_utils import TDigest
+from utils.text_utils import product_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    item_id TEXT PRIMARY KEY,
+    product_key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    price REAL NOT NULL,
+    currency TEXT NOT NULL,
+    status TEXT,
+    observed_at REAL NOT NULL,
+    first_seen_at REAL
+);
+CREATE INDEX IF NOT EXISTS observations_product ON observations (product_key, currency, observed_at);
+CREATE TABLE IF NOT EXISTS sketches (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (scope, key, currency)
+);
+"""
+
+
+def listing_product_key(listing):
+    """Return the product key of a listing: its canonical key when a rule pack recognizes it."""
+    attributes = extract_attributes(listing)
+    if attributes is not None:
+        return attributes.product_key
+    return product_key(listing.title, listing.brand)
+
+
+def _sketch_keys(listing):
+    """Return the (scope, key) pairs of the price sketches a listing belongs to."""
+    keys = [("product", listing_product_key(listing))]
+    if listing.category:
+        keys.append(("category", listing.category))
+    return keys
+
+
+def price_statistics(key, currency, prices):
+    """
+    Compute the statistics of a price sample.
+
+    Args:
+        key: The product key the sample belongs to
+        currency: The currency of the prices
+        prices: The prices
+
+    Returns:
+        PriceStatistics: Median, quartiles and range of the prices
+    """
+    if not prices:
+        return PriceStatistics(product_key=key, currency=currency, count=0)
+
+    prices = sorted(prices)
+    if len(prices) > 1:
+        q1, median, q3 = statistics.quantiles(prices, n=4, method='inclusive')
+    else:
+        q1 = median = q3 = prices[0]
+    return PriceStatistics(product_key=key, currency=currency, count=len(prices), median=median, q1=q1, q3=q3,
+                           minimum=prices[0], maximum=prices[-1])
+
+
+class PriceHistoryService:
+    """Service class for the local Vinted price history."""
+
+    def __init__(self, path=PRICE_HISTORY_DB_PATH, window_days=PRICE_HISTORY_WINDOW_DAYS,
+                 min_samples=PRICE_HISTORY_MIN_SAMPLES):
+        """
+        Initialize the price history.
+
+        Args:
+            path: Path of the SQLite database
+            window_days: Age in days beyond which observations are ignored
+            min_samples: Listings of a product needed for a local market reference
+        """
+        self.path = path
+        self.window_days = window_days
+        self.min_samples = min_samples
+        self._connection = None
+        self._index = None  # Built from the observations on the first comparables lookup
+        # Item ID -> (title, price, currency, status, observed_at, first_seen_at) of indexed listings
+        self._observations = {}
+        self._sketches = {}  # (scope, key, currency) -> TDigest, or None when the database has none
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        """Open the SQLite database and create the schema on first use."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            # Databases created before first_seen_at get it, starting from the last observation
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(observations)")]
+            if "first_seen_at" not in columns:
+                self._connection.execute("ALTER TABLE observations ADD COLUMN first_seen_at REAL")
+                self._connection.execute("UPDATE observations SET first_seen_at = observed_at")
+            self._connection.commit()
+        return self._connection
+
+    def record_listings(self, listings):
+        """
+        Record the current price of listings; a listing seen again replaces its earlier observation
+        but keeps the time it was first seen.
+
+        Listings seen for the first time are also added to the price sketches of their product
+        and category. Sketches are merged into the stored ones inside the write transaction, so
+        runs and processes sharing the database all contribute to the same sketches.
+
+        Args:
+            listings: The VintedListing objects to record
+
+        Returns:
+            The number of listings recorded (listings without a price are skipped)
+        """
+        observed_at = time.time()
+        listings = [listing for listing in listings if listing.price]
+        with self._lock:
+            connection = self._get_connection()
+            known_ids = {}  # Item ID -> time the listing was first seen
+            ids = [listing.id for listing in listings]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                known_ids.update(connection.execute(
+                    f"SELECT item_id, first_seen_at FROM observations WHERE item_id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ))
+            rows = [
+                (listing.id, listing_product_key(listing), listing.title, listing.price, listing.currency,
+                 listing.status, observed_at, known_ids.get(listing.id, observed_at))
+                for listing in listings
+            ]
+
+            # Sketch the prices of new listings only, so relisted or re-fetched items aren't counted twice
+            new_sketches = {}
+            for listing in listings:
+                if listing.id not in known_ids:
+                    for scope, key in _sketch_keys(listing):
+                        new_sketches.setdefault((scope, key, listing.currency),
+                                                TDigest(PRICE_SKETCH_COMPRESSION)).add(listing.price)
+
+            with connection:
+                connection.executemany(
+                    "INSERT INTO observations "
+                    "(item_id, product_key, title, price, currency, status, observed_at, first_seen_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (item_id) DO UPDATE SET product_key = excluded.product_key, title = excluded.title, "
+                    "price = excluded.price, currency = excluded.currency, status = excluded.status, "
+                    "observed_at = excluded.observed_at",
+                    rows
+                )
+                # The insert above holds the write lock, so no other process updates a sketch in between
+                for sketch_key, sketch in new_sketches.items():
+                    stored = self._read_sketch(sketch_key)
+                    if stored is not None:
+                        sketch = stored.merge(sketch)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO sketches (scope, key, currency, digest) VALUES (?, ?, ?, ?)",
+                        (*sketch_key, json.dumps(sketch.to_dict()))
+                    )
+                    self._sketches[sketch_key] = sketch
+            if self._index is not None:
+                for row in rows:
+                    self._index_observation(*row)
+        return len(rows)
+
+    def get_statistics(self, key, currency, exclude_item_id=None, first_seen_before=None):
+        """
+        Compute the rolling price statistics of a product.
+
+        Args:
+            key: The product key
+            currency: Only prices in this currency are used
+            exclude_item_id: Optional listing to leave out (the one being valued)
+            first_seen_before: Optional time.time() value; listings first seen from then on (e.g.
+                the new listings of the run being valued) are left out
+
+        Returns:
+            PriceStatistics: The statistics of the product's recent listings
+        """
+        oldest = time.time() - self.window_days * 24 * 60 * 60
+        newest = first_seen_before if first_seen_before is not None else float('inf')
+        with self._lock:
+            prices = [row[0] for row in self._get_connection().execute(
+                "SELECT price FROM observations WHERE product_key = ? AND currency = ? AND observed_at >= ? "
+                "AND first_seen_at < ? AND item_id != ?",
+                (key, currency, oldest, newest, exclude_item_id or "")
+            )]
+
+        return price_statistics(key, currency, prices)
+
+    def _read_sketch(self, sketch_key):
+        """Load a price sketch from the database; the lock must be held."""
+        row = self._get_connection().execute(
+            "SELECT digest FROM sketches WHERE scope = ? AND key = ? AND currency = ?", sketch_key
+        ).fetchone()
+        return TDigest.from_dict(json.loads(row[0])) if row else None
+
+    def get_sketch(self, scope, key, currency):
+        """
+        Return the price sketch of a product or category.
+
+        Args:
+            scope: "product" or "category"
+            key: The product key or category path
+            currency: The currency of the prices
+
+        Returns:
+            TDigest of every price seen for the product or category, or None
+        """
+        sketch_key = (scope, key, currency)
+        with self._lock:
+            if sketch_key not in self._sketches:
+                self._sketches[sketch_key] = self._read_sketch(sketch_key)
+            return self._sketches[sketch_key]
+
+    def price_position(self, listing):
+        """
+        Place a listing's price among the prices seen for its product, or its category when the
+        product has fewer than min_samples prices.
+
+        Args:
+            listing: The VintedListing
+
+        Returns:
+            PricePosition with the price's percentile and outlier flag, or None when the listing
+            has no price or neither sketch is large enough
+        """
+        if not listing.price:
+            return None
+        for scope, key in _sketch_keys(listing):
+            sketch = self.get_sketch(scope, key, listing.currency)
+            if sketch is None or sketch.count < self.min_samples:
+                continue
+            q1, median, q3 = sketch.quantile(0.25), sketch.quantile(0.5), sketch.quantile(0.75)
+            fence = PRICE_OUTLIER_IQR_FACTOR * (q3 - q1)
+            outlier = "low" if listing.price < q1 - fence else "high" if listing.price > q3 + fence else None
+            return PricePosition(scope=scope, key=key, count=len(sketch),
+                                 percentile=round(sketch.cdf(listing.price) * 100, 1), median=round(median, 2),
+                                 outlier=outlier)
+        return None
+
+    def _index_observation(self, item_id, key, title, price, currency, status, observed_at, first_seen_at):
+        """Add an observation to the comparables index; the lock must be held."""
+        self._index.add(item_id, key.split())
+        self._observations[item_id] = (title, price, currency, status, observed_at, first_seen_at)
+
+    def _get_index(self):
+        """Build the comparables index from the recent observations on first use; the lock must be held."""
+        if self._index is None:
+            self._index = TfidfIndex()
+            oldest = time.time() - self.window_days * 24 * 60 * 60
+            for row in self._get_connection().execute(
+                "SELECT item_id, product_key, title, price, currency, status, observed_at, first_seen_at "
+                "FROM observations WHERE observed_at >= ?", (oldest,)
+            ):
+                self._index_observation(*row)
+        return self._index
+
+    def find_comparables(self, listing, k=COMPARABLES_TOP_K, min_similarity=COMPARABLES_MIN_SIMILARITY,
+                         first_seen_before=None):
+        """
+        Find the recent Vinted listings with the most similar titles.
+
+        Args:
+            listing: The VintedListing to find comparables for
+            k: Maximum number of comparables returned
+            min_similarity: Minimum title similarity (0-1) of a comparable
+            first_seen_before: Optional time.time() value; listings first seen from then on are left out
+
+        Returns:
+            A list of ComparableListing objects in the listing's currency, most similar first
+        """
+        oldest = time.time() - self.window_days * 24 * 60 * 60
+        newest = first_seen_before if first_seen_before is not None else float('inf')
+
+        with self._lock:
+            index = self._get_index()
+
+            def accept(item_id):
+                _, _, currency, _, observed_at, first_seen_at = self._observations[item_id]
+                return (item_id != listing.id and currency == listing.currency and observed_at >= oldest
+                        and first_seen_at < newest)
+
+            matches = index.query(listing_product_key(listing).split(), k=k, accept=accept)
+            return [
+                ComparableListing(item_id=item_id, title=self._observations[item_id][0],
+                                  price=self._observations[item_id][1], currency=self._observations[item_id][2],
+                                  status=self._observations[item_id][3], similarity=round(similarity, 3))
+                for item_id, similarity in matches if similarity >= min_similarity
+            ]
+
+    def local_market_value(self, listing, comparables=None, first_seen_before=None):
+        """
+        Value a listing from the price history alone.
+
+        The listings of the same product are used when there are at least min_samples of them;
+        otherwise the comparables are used when there are enough of them. Pass the time the run
+        started as first_seen_before so the listings the run sees for the first time don't count
+        as the market: a sweep full of overpriced new listings would otherwise rate itself as fair.
+        Listings already seen by earlier runs still count when the run fetches them again.
+
+        Args:
+            listing: The VintedListing to value
+            comparables: Optional ComparableListing objects from find_comparables
+            first_seen_before: Optional time.time() value; listings first seen from then on are left out
+
+        Returns:
+            MarketValueResult based on the prices of similar Vinted listings, or None when
+            neither sample is large enough
+        """
+        comparables = comparables or []
+        key = listing_product_key(listing)
+        stats = self.get_statistics(key, listing.currency, exclude_item_id=listing.id,
+                                    first_seen_before=first_seen_before)
+        if stats.count >= self.min_samples and stats.median:
+            return market_value_from_statistics(listing, stats, self.window_days, comparables=comparables)
+
+        if len(comparables) < COMPARABLES_MIN_MATCHES:
+            return None
+        stats = price_statistics(key, listing.currency, [comparable.price for comparable in comparables])
+        if not stats.median:
+            return None
+        return market_value_from_statistics(listing, stats, self.window_days, comparables=comparables,
+                                            from_comparables=True)
+
+    def close(self):
+        """Close the SQLite database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._index = None
+            self._observations = {}
+            self._sketches = {}
+
+
+def market_value_from_statistics(listing, stats, window_days, comparables=(), from_comparables=False):
+    """
+    Build a market research result from price statistics.
+
+    The price range is the interquartile range, so a few mispriced listings don't stretch it.
+    Confidence grows with the sample size and drops when prices are spread out.
+
+    Args:
+        listing: The VintedListing being valued
+        stats: PriceStatistics of similar listings
+        window_days: The window the statistics cover, in days
+        comparables: Optional ComparableListing objects listed as the result's comparable items
+        from_comparables: Whether the statistics were computed from the comparables rather than
+            from listings of the same product; confidence is one point lower
+
+    Returns:
+        MarketValueResult: The local market value
+    """
+    # The agent module imports crewai, so it is only loaded once a listing is valued locally
+    from agents.market_research_agent import deal_score_label
+
+    # The bands of calculate_deal_score, so local and researched valuations agree
+    ratio = listing.price / stats.median * 100 if listing.price else None
+    assessment = deal_score_label(ratio) if ratio is not None else "Unknown: the listing has no price"
+    sample = "most similar" if from_comparables else "similar"
+    if ratio is not None:
+        assessment += f" ({ratio:.0f}% of the median price of {stats.count} {sample} Vinted listings)"
+
+    if from_comparables:
+        basis = f"the {stats.count} listings with titles most similar to '{listing.title}'"
+    else:
+        basis = f"'{stats.product_key}'"
+
+    spread = stats.iqr / stats.median
+    confidence = 4 + min(4, stats.count // 8) - (2 if spread > 0.5 else 1 if spread > 0.25 else 0)
+
+    return MarketValueResult(
+        item_id=listing.id,
+        average_price=round(stats.median, 2),
+        price_range=[round(stats.q1, 2), round(stats.q3, 2)],
+        comparable_items=[ComparableItem(source="Vinted", price=comparable.price,
+                                         condition=comparable.status or "Unknown") for comparable in comparables],
+        value_assessment=assessment,
+        market_demand=f"{stats.count} {sample} listings on Vinted in the last {window_days} days",
+        price_factors=["Recent Vinted prices of " + ("similar products" if from_comparables else "the same product")],
+        confidence_score=max(1, min(10, confidence - (1 if from_comparables else 0))),
+        notes=(f"Based on the local Vinted price history for {basis}: median {stats.median:.2f} "
+               f"{stats.currency}, interquartile range {stats.q1:.2f}-{stats.q3:.2f}, "
+               f"full range {stats.minimum:.2f}-{stats.maximum:.2f}.")
+    )
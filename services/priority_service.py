@@ -0,0 +1,97 @@
+"""
+Service ordering listings so the most promising ones go through the pipeline first.
+
+Before any agent runs, each listing gets a cheap pre-score from what is already known: its
+price against the local market reference (the median of the prices seen for its product or
+category), its seller's rating and how recently it was listed. Processing listings best
+first makes the top recommendations available early in long runs.
+"""
+import datetime
+import math
+
+from config.settings import PRIORITY_WEIGHTS, PRIORITY_FRESHNESS_DAYS, PRIORITY_SELLER_MIN_FEEDBACKS
+
+NEUTRAL = 0.5  # Component score of a listing missing the data to judge it
+
+
+def _seller_score(listing):
+    """Return the seller's rating (0-1), pulled towards neutral when it rests on few feedbacks."""
+    if listing.seller_rating is None:
+        return NEUTRAL
+    confidence = min(1.0, (listing.seller_feedback_count or 0) / PRIORITY_SELLER_MIN_FEEDBACKS)
+    return NEUTRAL + (min(max(listing.seller_rating, 0.0), 1.0) - NEUTRAL) * confidence
+
+
+def _freshness_score(listing, now):
+    """Return 1 for a listing created now, decaying with its age, or neutral when unknown."""
+    if not listing.created_at:
+        return NEUTRAL
+    try:
+        created_at = datetime.datetime.fromisoformat(listing.created_at)
+    except ValueError:
+        return NEUTRAL
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    age_days = max(0.0, (now - created_at).total_seconds() / 86400)
+    return math.exp(-age_days / PRIORITY_FRESHNESS_DAYS)
+
+
+def pre_scores(listings, price_history=None, now=None):
+    """
+    Compute the pre-score of each listing.
+
+    Args:
+        listings: The VintedListing objects to score
+        price_history: Optional PriceHistoryService providing the local market reference
+        now: Optional timezone-aware datetime the listing ages are measured at (default: now)
+
+    Returns:
+        List of scores between 0 and 1, aligned with listings; higher is more promising
+    """
+    from agents.market_research_agent import calculate_deal_scores
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    references = []
+    for listing in listings:
+        position = None
+        if price_history is not None:
+            try:
+                position = price_history.price_position(listing)
+            except Exception as e:
+                print(f"Error reading the price reference of item {listing.id}: {str(e)}")
+        references.append(position.median if position is not None else float('nan'))
+
+    # Invalid prices or missing references get a deal score of 0, i.e. no price signal
+    deal_scores = calculate_deal_scores(
+        [listing.price if listing.price is not None else float('nan') for listing in listings], references
+    ).tolist()
+    return [
+        PRIORITY_WEIGHTS['price'] * (deal_score / 100 if deal_score else NEUTRAL)
+        + PRIORITY_WEIGHTS['seller'] * _seller_score(listing)
+        + PRIORITY_WEIGHTS['freshness'] * _freshness_score(listing, now)
+        for listing, deal_score in zip(listings, deal_scores)
+    ]
+
+
+def prioritize(listings, price_history=None, scores=None):
+    """
+    Order listings best first by pre-score.
+
+    Pre-scores should be computed before the run records its own prices in the price history,
+    or a new product's listings are scored against themselves; pass them as scores when the
+    listings are ordered after that.
+
+    Args:
+        listings: The VintedListing objects to order
+        price_history: Optional PriceHistoryService providing the local market reference
+        scores: Optional pre-scores by listing ID; computed from price_history when omitted
+
+    Returns:
+        A new list of the listings, most promising first; ties keep their original order
+    """
+    if len(listings) < 2:
+        return list(listings)
+    if scores is None:
+        scores = dict(zip([listing.id for listing in listings], pre_scores(listings, price_history)))
+    order = sorted(range(len(listings)), key=lambda i: scores.get(listings[i].id, 0.0), reverse=True)
+    return [listings[i] for i in order]
@@ -0,0 +1,106 @@
+"""
+Service for writing a run's outputs (HTML report, exports, history) off the critical path.
+
+Recommendations are ready as soon as the records are; the report, the exports and the
+history are written by a background thread that the caller only waits for at the end.
+"""
+import threading
+
+from utils.profile_utils import profile_stage
+from utils.trace_utils import propagate, span
+
+
+class RunPublisher:
+    """Writes the report, exports and history of a run on a background thread."""
+
+    def __init__(self, report_service, history_service=None, generate_report=True, report_layout="auto",
+                 incremental_report=False, export_formats=(), open_report=True):
+        """
+        Initialize the publisher.
+
+        Args:
+            report_service: ReportService rendering the report and exports
+            history_service: Optional HistoryService recording the run's records
+            generate_report: Whether to render the HTML report
+            report_layout: HTML report layout: "auto", "cards" or "virtual"
+            incremental_report: Whether to update the search query's stable report instead of writing a new one
+            export_formats: Formats to export the records to ("jsonl", "csv", "parquet", "arrow")
+            open_report: Whether to open the HTML report in the browser; when False the browser
+                utilities are never imported
+        """
+        self.report_service = report_service
+        self.history_service = history_service
+        self.generate_report = generate_report
+        self.report_layout = report_layout
+        self.incremental_report = incremental_report
+        self.export_formats = export_formats
+        self.open_report = open_report
+        self.report_file = None
+        self.export_files = {}
+        self._thread = None
+
+    def publish(self, search_text, search_site, records):
+        """
+        Start writing the outputs of a run and return immediately.
+
+        Args:
+            search_text: The search query of the run
+            search_site: The site used for market research
+            records: The ItemRecord objects of the run, in display order
+        """
+        if not (self.generate_report or self.export_formats or self.history_service):
+            return
+        # Not a daemon thread: the interpreter waits for it at exit even if nobody calls wait()
+        self._thread = threading.Thread(target=propagate(self._write), args=(search_text, search_site, records),
+                                        name="run-publisher")
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the outputs of the run to be written.
+
+        Args:
+            timeout: Optional maximum number of seconds to wait
+
+        Returns:
+            The filename of the HTML report, or None
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.report_file
+
+    def _write(self, search_text, search_site, records):
+        """Write the report, exports and history, reporting rather than raising errors."""
+        if self.generate_report:
+            # Generate HTML report and open it
+            with span("publish.report", records=len(records), layout=self.report_layout,
+                      incremental=self.incremental_report), profile_stage("report"):
+                try:
+                    if self.incremental_report:
+                        self.report_file = self.report_service.update_report(search_text, records,
+                                                                             layout=self.report_layout)
+                    else:
+                        self.report_file = self.report_service.generate_html_report(search_text, records,
+                                                                                    layout=self.report_layout)
+                    if self.report_file and self.open_report:
+                        from utils.browser_utils import open_html_report
+
+                        open_html_report(self.report_file)
+                except Exception as e:
+                    print(f"Error generating/opening HTML report: {str(e)}")
+
+        if self.export_formats:
+            with span("publish.export", formats=",".join(self.export_formats)), profile_stage("export"):
+                try:
+                    self.export_files = self.report_service.export_records(search_text, records,
+                                                                           self.export_formats)
+                except Exception as e:
+                    print(f"Error exporting results: {str(e)}")
+
+        if self.history_service:
+            with span("publish.history", records=len(records)), profile_stage("history"):
+                try:
+                    self.history_service.record_run(search_text, records, search_site=search_site,
+                                                    report_file=self.report_file)
+                except Exception as e:
+                    print(f"Error recording run history: {str(e)}")
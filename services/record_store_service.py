@@ -0,0 +1,92 @@
+"""
+Service keeping a run's finished records on disk instead of in memory.
+
+In memory-bounded mode each record is appended to a temporary JSONL file as soon as it is
+complete; only a small index (score, prices and file offset per record) stays in memory.
+Reports, exports and history read the records back one at a time, in rank order, so memory
+use stays flat however many items a sweep analyzes.
+"""
+import os
+import tempfile
+import threading
+from array import array
+
+from config.settings import RECORD_SPILL_DIR
+from models.record_models import ItemRecord
+
+
+class RecordStore:
+    """Append-only store of ItemRecord objects spilled to a temporary JSONL file."""
+
+    def __init__(self, directory=RECORD_SPILL_DIR):
+        """
+        Initialize an empty store.
+
+        Args:
+            directory: Directory of the temporary file, which is deleted when the store is closed
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.TemporaryFile(mode='w+b', dir=directory, prefix="records-", suffix=".jsonl")
+        self._lock = threading.Lock()
+        # Index of the records in file order; NaN marks a missing price
+        self._offsets = array('q')
+        self._scores = array('q')
+        self._prices = array('d')
+        self._average_prices = array('d')
+        self._order = None  # Positions in rank order, once ranked
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        order = self._order if self._order is not None else range(len(self._offsets))
+        for position in order:
+            yield self._read(self._offsets[position])
+
+    def __getitem__(self, index):
+        """Return the record at a position, or a list of records for a slice, in rank order once ranked."""
+        order = self._order if self._order is not None else range(len(self._offsets))
+        if isinstance(index, slice):
+            return [self._read(self._offsets[position]) for position in order[index]]
+        return self._read(self._offsets[order[index]])
+
+    def append(self, record):
+        """
+        Spill a finished record.
+
+        Args:
+            record: The ItemRecord to store
+        """
+        line = record.model_dump_json().encode('utf-8') + b"\n"
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._offsets.append(self._file.tell())
+            self._file.write(line)
+            self._scores.append(record.score)
+            self._prices.append(record.listing.price if record.listing.price is not None else float('nan'))
+            self._average_prices.append(record.research.average_price if record.research else float('nan'))
+            self._order = None
+
+    def ranked(self):
+        """
+        Order the store best first, the way rank_records orders a list.
+
+        Returns:
+            RecordStore: This store, now iterated in rank order
+        """
+        from services.analysis_pipeline import rank_order
+
+        with self._lock:
+            self._order = rank_order(self._scores, self._prices, self._average_prices)
+        return self
+
+    def close(self):
+        """Delete the spilled records."""
+        self._file.close()
+
+    def _read(self, offset):
+        """Read the record stored at a file offset."""
+        with self._lock:
+            self._file.seek(offset)
+            line = self._file.readline()
+        return ItemRecord.model_validate_json(line)
@@ -1,39 +1,125 @@
 """
 Service for generating HTML reports from item analysis results.
 """
+import contextlib
 import datetime
+import glob
+import hashlib
+import json
 import os
-
-import jinja2
+import re
+import threading
+
+from config.settings import TEMPLATE_BYTECODE_CACHE_DIR, REPORT_VIRTUAL_THRESHOLD, THUMBNAIL_DIR_NAME
+from models.export_models import ItemExportRow
+from models.record_models import ItemRecord
+from services.thumbnail_service import ThumbnailService
+from utils.trace_utils import span
+
+REPORT_TEMPLATE = "vinted_report_template.html"
+VIRTUAL_REPORT_TEMPLATE = "vinted_report_virtual_template.html"
+ITEM_CARD_TEMPLATE = "partials/item_card.html"
+REPORT_LAYOUTS = ("auto", "cards", "virtual")
+RENDER_BUFFER_SIZE = 64  # Template chunks joined before each write to the report file
+
+# Incremental reports keep their manifest, records and rendered fragments here, per query
+INCREMENTAL_DIR_NAME = ".incremental"
+MANIFEST_FILENAME = "manifest.json"
+COMPACT_ROW_VERSION = 1  # Bump when _build_compact_row changes, to re-render cached rows
+FRAGMENT_SUFFIXES = {'cards': ".card.html", 'virtual': ".row.json"}
+
+# Export formats of the flat ItemExportRow schema and their file extensions
+EXPORT_FORMATS = {'jsonl': ".jsonl", 'csv': ".csv", 'parquet': ".parquet", 'arrow': ".arrow"}
+EXPORT_DIR_NAME = "exports"
+
+# Jinja2 environments shared by every ReportService, keyed by template and bytecode cache directory
+_environments = {}
+_environments_lock = threading.Lock()
+
+# Locks serializing updates of the same incremental report, keyed by report path
+_report_locks = {}
+_report_locks_lock = threading.Lock()
+
+
+def _get_environment(template_dir, bytecode_cache_dir):
+    """
+    Return the shared Jinja2 environment for a template directory, creating it on first use.
+
+    The environment keeps compiled templates in memory and only reloads a template when
+    its file's mtime changes. Compiled bytecode is also cached on disk, so a new process
+    doesn't have to re-parse the template either.
+    """
+    key = (os.path.abspath(template_dir), bytecode_cache_dir)
+    with _environments_lock:
+        environment = _environments.get(key)
+        if environment is None:
+            import jinja2
+
+            bytecode_cache = None
+            if bytecode_cache_dir:
+                os.makedirs(bytecode_cache_dir, exist_ok=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+
+            environment = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(searchpath=template_dir),
+                bytecode_cache=bytecode_cache,
+                auto_reload=True
+            )
+            _environments[key] = environment
+        return environment
+
+
+def _get_report_lock(file_path):
+    """Return the lock guarding updates of an incremental report."""
+    with _report_locks_lock:
+        return _report_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+
+
+def _slugify(text):
+    """Turn a search query or item ID into a safe file name component."""
+    return re.sub(r"[^a-z0-9_-]+", "-", str(text).lower()).strip("-") or "all"
+
+
+def _write_atomically(path, content):
+    """Write a text file so readers never see it half-written."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp_path, path)
 
 
 class ReportService:
     """Service class for generating reports from analysis results."""
 
-    def __init__(self, template_dir="./templates", output_dir="./output"):
+    def __init__(self, template_dir="./templates", output_dir="./output",
+                 bytecode_cache_dir=TEMPLATE_BYTECODE_CACHE_DIR, thumbnails=True):
         """
         Initialize the report service.
 
         Args:
             template_dir: Directory containing the HTML templates
             output_dir: Directory where the HTML reports will be saved
+            bytecode_cache_dir: Directory for compiled templates, or None to disable the disk cache
+            thumbnails: Whether reports use locally cached thumbnails instead of the remote photos
         """
         self.template_dir = template_dir
         self.output_dir = output_dir
+        self.bytecode_cache_dir = bytecode_cache_dir
+        self.thumbnail_service = ThumbnailService(os.path.join(output_dir, THUMBNAIL_DIR_NAME)) if thumbnails else None
         # Ensure the template and output directories exist
         os.makedirs(template_dir, exist_ok=True)
         os.makedirs(output_dir, exist_ok=True)
 
-    def generate_html_report(self, search_query, raw_items, analysis_results, market_research=None, deal_messages=None):
+    def generate_html_report(self, search_query, records, layout="auto"):
         """
         Generate an HTML report with item analysis results.
 
         Args:
             search_query: The search query used to find items
-            raw_items: The raw item data from Vinted
-            analysis_results: The analysis results from the AI crew
-            market_research: Optional market research results
-            deal_messages: Optional deal messages for items
+            records: The ItemRecord objects to include, in display order
+            layout: "cards" for one full card per item, "virtual" for a compact JSON data block
+                rendered a screenful at a time by the browser, or "auto" to pick "virtual" above
+                REPORT_VIRTUAL_THRESHOLD items
 
         Returns:
             The filename of the generated report
@@ -42,41 +128,30 @@ class ReportService:
         filename = f"vinted_analysis_{timestamp}.html"
         file_path = os.path.join(self.output_dir, filename)
 
-        # Create a dictionary mapping item IDs to their data
-        item_data_map = self._create_item_data_map(raw_items)
-
-        # Create a dictionary mapping item IDs to their market research data
-        market_research_map = {}
-        if market_research:
-            for research in market_research:
-                if hasattr(research, 'pydantic'):
-                    item_id = research.pydantic.item_id
-                    market_research_map[item_id] = research.pydantic
-                elif isinstance(research, dict) and 'item_id' in research:
-                    item_id = research['item_id']
-                    market_research_map[item_id] = research
-
-        # Prepare data for the template
-        template_data = self._prepare_template_data(
-            search_query,
-            item_data_map,
-            analysis_results,
-            market_research_map,
-            deal_messages
-        )
+        if layout == "auto":
+            layout = "virtual" if len(records) > REPORT_VIRTUAL_THRESHOLD else "cards"
+
+        # Download the missing thumbnails in parallel before the report references them
+        if self.thumbnail_service:
+            with span("report.thumbnails"):
+                self.thumbnail_service.prefetch(record.listing for record in records)
 
         try:
-            # Load the template from file
-            template_loader = jinja2.FileSystemLoader(searchpath=self.template_dir)
-            template_env = jinja2.Environment(loader=template_loader)
-            template = template_env.get_template("vinted_report_template.html")
+            # Load the compiled template (re-parsed only if the file changed)
+            template = self._get_template(VIRTUAL_REPORT_TEMPLATE if layout == "virtual" else REPORT_TEMPLATE)
 
-            # Render the template with our data
-            html_content = template.render(**template_data)
+            # Prepare data for the template; item entries are built as the template consumes them
+            if layout == "virtual":
+                template_data = self._prepare_virtual_template_data(search_query, records)
+            else:
+                template_data = self._prepare_template_data(search_query, records)
 
-            # Write HTML to file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # Stream the rendered HTML to the file chunk by chunk
+            with span("report.render", layout=layout, items=len(records)):
+                stream = template.stream(**template_data)
+                stream.enable_buffering(RENDER_BUFFER_SIZE)
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    stream.dump(f)
 
             print(f"HTML report generated: {file_path}")
             return file_path
@@ -84,230 +159,325 @@ class ReportService:
         except Exception as e:
             print(f"Error generating HTML report: {e}")
             # Fallback to a simple HTML report if template loading fails
-            return self._generate_fallback_html_report(template_data, file_path)
-
-    def _create_item_data_map(self, raw_items):
-        """Create a dictionary mapping item IDs to their data."""
-        item_data_map = {}
-        for item in raw_items:
-            # Extract the item data from the nested structure
-            if 'item' in item:
-                item_data = item['item']
-                item_id = item_data.get('id')
-                if item_id:
-                    item_data_map[str(item_id)] = item_data
-            else:
-                # If the item is not nested, use it directly
-                item_id = item.get('id')
-                if item_id:
-                    item_data_map[str(item_id)] = item
-
-        return item_data_map
-
-    def _prepare_template_data(self, search_query, item_data_map, analysis_results, market_research_map=None,
-                               deal_messages=None):
-        """Prepare data for the HTML template."""
-        template_data = {
-            'search_query': search_query,
-            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'date': datetime.datetime.now().strftime("%Y-%m-%d at %H:%M:%S"),
-            'items': []
-        }
+            return self._generate_fallback_html_report(self._prepare_template_data(search_query, records), file_path)
 
-        # Process each analysis result
-        for result in analysis_results:
-            # Extract item data from the analysis result
-            if hasattr(result, 'pydantic'):
-                item_data = result.pydantic
-                item_id = item_data.item_id
-            elif hasattr(result, 'model_dump'):
-                item_data = result
-                item_id = item_data.item_id
-            else:
-                # Skip if we can't extract item data
-                continue
+    def update_report(self, search_query, records, layout="auto"):
+        """
+        Add or update items in the stable report of a search query.
 
-            # Get the raw item data
-            raw_item_data = item_data_map.get(str(item_id), {})
+        The report keeps every item seen for the query, best score first, at the same path
+        across runs. A manifest stores a content hash of each item, and each item's rendered
+        card (or JSON row) is cached, so only new or changed items are rendered again; the page
+        itself is reassembled from the cached fragments.
 
-            # Extract item details
-            item_entry = self._extract_item_details(raw_item_data, item_id)
+        Args:
+            search_query: The search query used to find items
+            records: The new or updated ItemRecord objects
+            layout: "cards", "virtual" or "auto" (see generate_html_report), applied to all the
+                items of the report
 
-            # Add analysis results
-            if hasattr(item_data, 'model_dump'):
-                item_dict = item_data.model_dump()
-            elif hasattr(item_data, 'dict'):
-                # For backward compatibility with Pydantic v1
-                item_dict = item_data.dict()
-            else:
-                item_dict = item_data
-
-            item_entry.update({
-                'score': item_dict.get('score', 0),
-                'status': item_dict.get('status', 'Unknown'),
-                'notes': item_dict.get('notes', ''),
-                'pros': item_dict.get('pros', []),
-                'cons': item_dict.get('cons', [])
-            })
+        Returns:
+            The filename of the report
+        """
+        slug = _slugify(search_query)
+        file_path = os.path.join(self.output_dir, f"vinted_analysis_{slug}.html")
+        state_dir = os.path.join(self.output_dir, INCREMENTAL_DIR_NAME, slug)
+
+        if self.thumbnail_service:
+            with span("report.thumbnails"):
+                self.thumbnail_service.prefetch(record.listing for record in records)
+
+        with _get_report_lock(file_path):
+            try:
+                os.makedirs(state_dir, exist_ok=True)
+                manifest = self._load_manifest(state_dir)
+
+                # Cached fragments are stale once the item card template or the row format changes
+                version = f"{os.path.getmtime(self._get_template(ITEM_CARD_TEMPLATE).filename)}:{COMPACT_ROW_VERSION}"
+                if manifest.get('version') != version:
+                    for fragment in glob.glob(os.path.join(state_dir, "*.card.html")) + \
+                            glob.glob(os.path.join(state_dir, "*.row.json")):
+                        os.remove(fragment)
+                    manifest['version'] = version
+
+                # Store the records whose content changed and drop their old fragments
+                changed = 0
+                for record in records:
+                    content = record.model_dump_json()
+                    content_hash = hashlib.sha256(
+                        f"{content}\0{self._photo_url(record.listing)}".encode('utf-8')
+                    ).hexdigest()
+                    entry = manifest['items'].get(record.item_id)
+                    if entry and entry['hash'] == content_hash:
+                        continue
+
+                    item_path = os.path.join(state_dir, _slugify(record.item_id))
+                    _write_atomically(f"{item_path}.json", content)
+                    for suffix in FRAGMENT_SUFFIXES.values():
+                        if os.path.exists(item_path + suffix):
+                            os.remove(item_path + suffix)
+                    manifest['items'][record.item_id] = {'hash': content_hash, 'score': record.score}
+                    changed += 1
+
+                if layout == "auto":
+                    layout = "virtual" if len(manifest['items']) > REPORT_VIRTUAL_THRESHOLD else "cards"
+
+                # Render the fragments that are missing: new or changed items, or a new layout
+                item_ids = sorted(manifest['items'], key=lambda item_id: manifest['items'][item_id]['score'],
+                                  reverse=True)
+                fragment_paths = []
+                rendered = 0
+                with span("report.render_fragments", layout=layout) as render_span:
+                    for item_id in item_ids:
+                        item_path = os.path.join(state_dir, _slugify(item_id))
+                        fragment_path = item_path + FRAGMENT_SUFFIXES[layout]
+                        if not os.path.exists(fragment_path):
+                            with open(f"{item_path}.json", encoding='utf-8') as f:
+                                record = ItemRecord.model_validate_json(f.read())
+                            _write_atomically(fragment_path, self._render_fragment(record, layout))
+                            rendered += 1
+                        fragment_paths.append(fragment_path)
+                    render_span.set_attributes(rendered=rendered, items=len(item_ids))
+
+                # Reassemble the page around the cached fragments and swap it in place
+                template = self._get_template(VIRTUAL_REPORT_TEMPLATE if layout == "virtual" else REPORT_TEMPLATE)
+                template_data = self._prepare_template_data(search_query, ())
+                template_data['items'] = (self._read_fragment(path) for path in fragment_paths)
+                stream = template.stream(**template_data)
+                stream.enable_buffering(RENDER_BUFFER_SIZE)
+                temp_path = f"{file_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    stream.dump(f)
+                os.replace(temp_path, file_path)
+
+                _write_atomically(os.path.join(state_dir, MANIFEST_FILENAME), json.dumps(manifest))
+                print(f"HTML report updated: {file_path} ({changed} new or changed items, "
+                      f"{rendered} rendered, {len(item_ids)} total)")
+                return file_path
+
+            except Exception as e:
+                print(f"Error updating HTML report: {e}")
+                # Fall back to a regular report of this batch
+                return self.generate_html_report(search_query, records, layout=layout)
+
+    def export_records(self, search_query, records, formats=("jsonl",)):
+        """
+        Export the records in machine-readable formats, writing every format in a single pass.
 
-            # Add market research data if available
-            market_data = market_research_map.get(str(item_id)) if market_research_map else None
-            if market_data:
-                if hasattr(market_data, 'model_dump'):
-                    market_dict = market_data.model_dump()
-                elif hasattr(market_data, 'dict'):
-                    # For backward compatibility with Pydantic v1
-                    market_dict = market_data.dict()
-                else:
-                    market_dict = market_data
-
-                item_entry['market_research'] = {
-                    'average_price': market_dict.get('average_price', 'N/A'),
-                    'price_range': market_dict.get('price_range', [0, 0]),
-                    'value_assessment': market_dict.get('value_assessment', 'N/A'),
-                    'market_demand': market_dict.get('market_demand', 'N/A'),
-                    'confidence_score': market_dict.get('confidence_score', 0),
-                    'comparable_items': market_dict.get('comparable_items', []),
-                    'price_factors': market_dict.get('price_factors', []),
-                    'notes': market_dict.get('notes', '')
-                }
-
-            # Add deal message if available
-            deal_message = deal_messages.get(str(item_id)) if deal_messages else None
-            if deal_message:
-                # Extract deal message data properly
-                if hasattr(deal_message, 'pydantic'):
-                    message_data = deal_message.pydantic
-                    item_entry['deal_message'] = {
-                        'message': message_data.message,
-                        'tone': message_data.tone,
-                        'expected_success_rate': message_data.expected_success_rate
-                    }
-                elif hasattr(deal_message, 'model_dump'):
-                    message_dict = deal_message.model_dump()
-                    item_entry['deal_message'] = {
-                        'message': message_dict.get('message', ''),
-                        'tone': message_dict.get('tone', 'friendly'),
-                        'expected_success_rate': message_dict.get('expected_success_rate', 0)
-                    }
-                elif hasattr(deal_message, 'dict'):
-                    # For backward compatibility with Pydantic v1
-                    message_dict = deal_message.dict()
-                    item_entry['deal_message'] = {
-                        'message': message_dict.get('message', ''),
-                        'tone': message_dict.get('tone', 'friendly'),
-                        'expected_success_rate': message_dict.get('expected_success_rate', 0)
-                    }
-                else:
-                    # Fallback for non-Pydantic objects
-                    item_entry['deal_message'] = {
-                        'message': getattr(deal_message, 'message', ''),
-                        'tone': getattr(deal_message, 'tone', 'friendly'),
-                        'expected_success_rate': getattr(deal_message, 'expected_success_rate', 0)
-                    }
-
-            # Add the item entry to the template data
-            template_data['items'].append(item_entry)
+        Rows follow the flat ItemExportRow schema. Parquet and Arrow IPC require pyarrow and
+        are skipped with a warning when it isn't installed.
 
-        return template_data
+        Args:
+            search_query: The search query used to find items
+            records: The ItemRecord objects to export
+            formats: Any of "jsonl", "csv", "parquet" and "arrow"
 
-    def _extract_item_details(self, item_data, item_id):
-        """Extract item details from the raw item data."""
-        # Title
-        title = item_data.get('title', 'Unknown Item')
+        Returns:
+            A dictionary mapping each written format to its file path
+        """
+        from utils.output_utils import NdjsonWriter, CsvWriter, ArrowWriter
+
+        exported_at = datetime.datetime.now(datetime.timezone.utc)
+        export_dir = os.path.join(self.output_dir, EXPORT_DIR_NAME)
+        os.makedirs(export_dir, exist_ok=True)
+        base_path = os.path.join(export_dir, f"vinted_analysis_{exported_at.strftime('%Y%m%d_%H%M%S')}")
+
+        files = {}
+        writers = []
+        with contextlib.ExitStack() as stack:
+            for file_format in dict.fromkeys(formats):
+                path = base_path + EXPORT_FORMATS[file_format]
+                try:
+                    if file_format == "jsonl":
+                        writer = NdjsonWriter(stack.enter_context(open(path, 'w', encoding='utf-8')), flush=False)
+                    elif file_format == "csv":
+                        writer = CsvWriter(stack.enter_context(open(path, 'w', encoding='utf-8', newline='')),
+                                           ItemExportRow)
+                    else:
+                        writer = ArrowWriter(path, ItemExportRow, file_format=file_format)
+                except ImportError:
+                    print(f"Skipping {file_format} export: pyarrow is not installed")
+                    continue
+                writers.append(writer)
+                files[file_format] = path
+
+            for record in records:
+                row = ItemExportRow.from_record(record, search_query, exported_at)
+                for writer in writers:
+                    writer.write(row)
+
+            for writer in writers:
+                writer.close()
+
+        for path in files.values():
+            print(f"Results exported: {path}")
+        return files
+
+    def _load_manifest(self, state_dir):
+        """Load the manifest of an incremental report, or start an empty one."""
+        try:
+            with open(os.path.join(state_dir, MANIFEST_FILENAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'version': None, 'items': {}}
+
+    def _render_fragment(self, record, layout):
+        """Render the part of the report showing one record."""
+        if layout == "virtual":
+            return self._build_compact_row(record)
+        return self._get_template(ITEM_CARD_TEMPLATE).render(item=self._build_item_entry(record))
+
+    def _read_fragment(self, path):
+        """Read a cached fragment of an incremental report."""
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def _get_template(self, name):
+        """Return a compiled template from the shared environment."""
+        return _get_environment(self.template_dir, self.bytecode_cache_dir).get_template(name)
+
+    def _prepare_template_data(self, search_query, records):
+        """
+        Prepare data for the HTML template.
 
-        # Handle price information
-        price_numeric = item_data.get('price_numeric', item_data.get('original_price_numeric', '?'))
-        if isinstance(price_numeric, str) and price_numeric.isdigit():
-            price_numeric = float(price_numeric)
+        'items' is a generator, so only one item entry needs to exist at a time while the
+        report is streamed; iterate it once.
+        """
+        template_data = {
+            'search_query': search_query,
+            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'date': datetime.datetime.now().strftime("%Y-%m-%d at %H:%M:%S"),
+            'items': (self._build_item_entry(record) for record in records)
+        }
 
-        # Get price from nested price object if available
-        price_obj = item_data.get('price', {})
-        if isinstance(price_obj, dict) and 'amount' in price_obj:
-            price = price_obj.get('amount', price_numeric)
-        else:
-            price = price_numeric
+        return template_data
 
-        # Get currency
-        currency = item_data.get('currency', '€')
+    def _prepare_virtual_template_data(self, search_query, records):
+        """
+        Prepare data for the virtualized HTML template.
 
-        # Get service fee and total price if available
-        service_fee = item_data.get('service_fee', '0')
-        total_item_price = item_data.get('total_item_price', price)
+        'items' is a generator of compact JSON rows, one per record; iterate it once.
+        """
+        template_data = self._prepare_template_data(search_query, ())
+        template_data['items'] = (self._build_compact_row(record) for record in records)
+        return template_data
 
-        # Get brand information
-        brand_dto = item_data.get('brand_dto', {})
-        if isinstance(brand_dto, dict) and 'title' in brand_dto:
-            brand = brand_dto.get('title', 'Unknown Brand')
-        else:
-            brand = item_data.get('brand', 'Unknown Brand')
+    def _build_compact_row(self, record):
+        """
+        Serialize an ItemRecord into the compact JSON row read by the virtualized template.
 
-        # Get item condition/status
-        status = item_data.get('status', 'Unknown condition')
+        Keys are kept short since they are repeated for every item: t title, p price,
+        c currency, b brand, st status, l location, img photo URL, u item URL, s score,
+        n notes, k confidence, m average market price, r price range, va value assessment,
+        md market demand, pf price factors, msg deal message, tone, sr expected success rate.
+        """
+        listing = record.listing
+        row = {
+            'id': record.item_id,
+            't': listing.title,
+            'p': listing.price,
+            'c': listing.currency,
+            'b': listing.brand,
+            'st': listing.status,
+            'l': listing.location,
+            'img': self._photo_url(listing),
+            'u': listing.url,
+            's': record.analysis.score,
+            'n': record.analysis.notes
+        }
 
-        # Get item description
-        description = item_data.get('description', 'No description available')
+        market_data = record.research
+        if market_data:
+            row.update({
+                'k': market_data.confidence_score,
+                'm': market_data.average_price,
+                'r': market_data.price_range,
+                'va': market_data.value_assessment,
+                'md': market_data.market_demand,
+                'pf': market_data.price_factors
+            })
 
-        # Get photo URL
-        photo_url = self._extract_photo_url(item_data)
+        deal_message = record.message
+        if deal_message:
+            row.update({
+                'msg': deal_message.message,
+                'tone': deal_message.tone,
+                'sr': deal_message.expected_success_rate
+            })
 
-        # Get item URL
-        item_url = item_data.get('url', '#')
-        if item_url and not item_url.startswith('http'):
-            item_url = f"https://www.vinted.it{item_url}"
+        # Escape the characters that could close the surrounding <script> element
+        return (json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+                .replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026'))
+
+    def _build_item_entry(self, record):
+        """Flatten an ItemRecord into the fields used by the HTML template."""
+        # Extract item details
+        item_entry = self._extract_item_details(record.listing, record.item_id)
+
+        # Add analysis results
+        analysis = record.analysis
+        item_entry.update({
+            'score': analysis.score,
+            'status': analysis.status,
+            'notes': analysis.notes,
+            'pros': [],
+            'cons': []
+        })
+
+        # Add market research data if available
+        market_data = record.research
+        if market_data:
+            item_entry['market_research'] = {
+                'average_price': market_data.average_price,
+                'price_range': market_data.price_range,
+                'value_assessment': market_data.value_assessment,
+                'market_demand': market_data.market_demand,
+                'confidence_score': market_data.confidence_score,
+                'comparable_items': [comparable.model_dump() for comparable in market_data.comparable_items],
+                'price_factors': market_data.price_factors,
+                'notes': market_data.notes
+            }
 
-        # Get seller information if available
-        user_login = item_data.get('user_login', 'Unknown seller')
+        # Add deal message if available
+        deal_message = record.message
+        if deal_message:
+            item_entry['deal_message'] = {
+                'message': deal_message.message,
+                'tone': deal_message.tone,
+                'expected_success_rate': deal_message.expected_success_rate
+            }
 
-        # Get location information
-        city = item_data.get('city', 'Unknown location')
-        country = item_data.get('country', '')
-        location = f"{city}, {country}" if country else city
+        return item_entry
 
+    def _extract_item_details(self, listing, item_id):
+        """Extract the template fields from a normalized listing."""
         return {
-            'title': title,
-            'price': price,
-            'currency': currency,
-            'service_fee': service_fee,
-            'total_price': total_item_price,
-            'brand': brand,
-            'status': status,
-            'description': description,
-            'photo_url': photo_url,
-            'item_url': item_url,
-            'seller': user_login,
-            'location': location
+            'id': item_id,
+            'title': listing.title,
+            'price': listing.price if listing.price is not None else '?',
+            'currency': listing.currency,
+            'service_fee': listing.service_fee if listing.service_fee is not None else 0,
+            'total_price': listing.total_price if listing.total_price is not None else '?',
+            'brand': listing.brand,
+            'status': listing.status,
+            'description': listing.description,
+            'photo_url': self._photo_url(listing),
+            'item_url': listing.url,
+            'seller': listing.seller,
+            'location': listing.location
         }
 
-    def _extract_photo_url(self, item_data):
-        """Extract the photo URL from the item data."""
-        photo_url = None
-        # Try to get photos from the photos array
-        photos = item_data.get('photos', [])
-        if photos and isinstance(photos, list) and len(photos) > 0:
-            # Get the first photo object
-            photo = photos[0]
-            if isinstance(photo, dict):
-                # Try different possible photo URL fields
-                photo_url = photo.get('full_size_url',
-                                      photo.get('url', None))
-                # If thumbnails exist and is a dictionary
-                thumbnails = photo.get('thumbnails')
-                if not photo_url and thumbnails and isinstance(thumbnails, dict):
-                    photo_url = thumbnails.get('original')
-
-        # If no photo found, try alternative fields
-        if not photo_url:
-            photo_url = item_data.get('photo_url', item_data.get('full_size_url',
-                                                                 'https://via.placeholder.com/350x250?text=No+Image'))
-
-        return photo_url
+    def _photo_url(self, listing):
+        """Return the cached thumbnail of a listing relative to the report, or its remote photo URL."""
+        if self.thumbnail_service:
+            return self.thumbnail_service.get_thumbnail(listing, relative_to=self.output_dir)
+        return listing.photo_url
 
     def _generate_fallback_html_report(self, template_data, filename):
         """Generate a simple HTML report as fallback if template loading fails."""
         print("Using fallback HTML report generation")
 
-        html_content = """
+        header = """
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -361,16 +531,41 @@ class ReportService:
                 </header>
 
                 <div class="items-container">
-        """.format(search_query=template_data['search_query'], timestamp=template_data['timestamp'])
+        """.replace("{search_query}", str(template_data['search_query'])).replace("{timestamp}",
+                                                                                 template_data['timestamp'])
+
+        footer = """
+                </div>
+                <footer>
+                    <p>Generated on {date} by Vinted Item Analysis Tool</p>
+                </footer>
+            </div>
+        </body>
+        </html>
+        """.format(date=template_data['date'])
 
-        # Add item cards to HTML
-        for item in template_data['items']:
-            item_card = f"""
+        # Write HTML to file, one item card at a time
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(header)
+                for item in template_data['items']:
+                    f.write(self._render_fallback_item_card(item))
+                f.write(footer)
+            print(f"Fallback HTML report generated: {filename}")
+            return filename
+        except Exception as e:
+            print(f"Error generating fallback HTML report: {e}")
+            return None
+
+    def _render_fallback_item_card(self, item):
+        """Render one item card of the fallback HTML report."""
+        score_class = 'high-score' if item['score'] >= 80 else 'medium-score' if item['score'] >= 60 else 'low-score'
+        item_card = f"""
                 <div class="item-card">
                     <h3 class="item-title">{item['title']}</h3>
                     <div>Price: {item['price']} {item['currency']}</div>
                     <div>ID: {item['id']} | Brand: {item['brand']}</div>
-                    <div>Bargain Score: <span class="{item['score_class']}">{item['score']}/100</span></div>
+                    <div>Bargain Score: <span class="{score_class}">{item['score']}/100</span></div>
                     <div class="notes-container">
                         <div class="notes-preview">
                             <strong>Analysis:</strong> {item['notes'][:100]}{'...' if len(item['notes']) > 100 else ''}
@@ -383,10 +578,10 @@ class ReportService:
                     </div>
             """
 
-            # Add market research data if available
-            if 'market_research' in item:
-                market_data = item['market_research']
-                item_card += f"""
+        # Add market research data if available
+        if 'market_research' in item:
+            market_data = item['market_research']
+            item_card += f"""
                     <div class="market-data">
                         <h4>Market Research</h4>
                         <div>Average Price: {market_data['average_price']} {item['currency']}</div>
@@ -397,31 +592,10 @@ class ReportService:
                     </div>
                 """
 
-            item_card += f"""
+        item_card += f"""
                     <div>
                         <a href="{item['item_url']}" target="_blank">View on Vinted</a>
                     </div>
                 </div>
             """
-            html_content += item_card
-
-        # Close HTML tags
-        html_content += """
-                </div>
-                <footer>
-                    <p>Generated on {date} by Vinted Item Analysis Tool</p>
-                </footer>
-            </div>
-        </body>
-        </html>
-        """.format(date=template_data['date'])
-
-        # Write HTML to file
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            print(f"Fallback HTML report generated: {filename}")
-            return filename
-        except Exception as e:
-            print(f"Error generating fallback HTML report: {e}")
-            return None
\ No newline at end of file
+        return item_card
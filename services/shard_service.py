@@ -0,0 +1,292 @@
+"""
+Sharded execution of large sweeps across worker processes.
+
+The parent fetches the listings once and splits them across N worker processes, each
+running the research, analysis and deal message stages on its shard. Workers share the
+SQLite-backed ResultCache, which is safe to use from several processes, and stream their
+records back to the parent, which merges them into one report.
+"""
+import contextlib
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from config.settings import DEFAULT_SEARCH_TEXT, DEFAULT_MAX_ITEMS, VINTED_BASE_URL
+from models.record_models import ItemRecord
+from services.dedup_service import copy_record, duplicate_metrics, group_duplicates
+from services.priority_service import pre_scores, prioritize
+from services.publish_service import RunPublisher
+from services.record_store_service import RecordStore
+from services.report_service import ReportService
+from services.vinted_service import VintedService
+from utils.profile_utils import enable_profiling, profile_directory, profile_stage, write_profiles
+from utils.trace_utils import add_spans, collect_spans, enable_tracing, span, trace_context
+
+
+def _run_shard(options, listings, record_queue):
+    """
+    Analyze one shard of listings in a worker process.
+
+    Args:
+        options: Dictionary of pipeline settings shared by all shards
+        listings: The VintedListing objects of this shard
+        record_queue: Queue receiving each record as JSON as soon as it is complete
+
+    Returns:
+        The spans the shard traced, or None when the parent isn't tracing
+    """
+    from agents.crew_cache import CrewCache
+    from services.analysis_pipeline import SecondHandItemAnalysisPipeline
+    from services.cache_service import ResultCache
+    from services.price_history_service import PriceHistoryService
+
+    if options['stdout_to_stderr']:
+        # The parent's stdout carries the record stream
+        sys.stdout = sys.stderr
+    if options.get('trace'):
+        # Continue the parent's trace under its shard span
+        enable_tracing(*options['trace'])
+    if options.get('profile'):
+        # Each worker writes its own stage profiles next to the parent's
+        enable_profiling(os.path.join(options['profile'], f"shard-{os.getpid()}"))
+
+    # Workers call the same providers, so they split the concurrency limits between them
+    crew_cache = CrewCache(processes=options['workers'])
+    flow = SecondHandItemAnalysisPipeline(
+        search_text=options['search_text'],
+        max_searches=options['max_searches'],
+        search_site=options['search_site'],
+        vinted_base_url=options['vinted_base_url'],
+        crew_cache=crew_cache,
+        result_cache=ResultCache() if options['use_cache'] else None,
+        price_history=PriceHistoryService() if options['use_price_history'] else None,
+        on_record=lambda record: record_queue.put(record.model_dump_json()),
+        listings=listings,
+        generate_report=False,
+        deduplicate=False,
+        spill_records=options['spill_records'],
+        run_started_at=options.get('run_started_at'),
+        record_prices=False,  # The parent recorded the whole sweep, after scoring it
+        pre_scores=options.get('pre_scores')
+    )
+    try:
+        flow.kickoff()
+    finally:
+        flow.close()
+        crew_cache.close()
+    if options.get('profile'):
+        write_profiles()
+    return collect_spans() if options.get('trace') else None
+
+
+class ShardedAnalysisRunner:
+    """Runs the analysis pipeline over a sweep split across several worker processes."""
+
+    def __init__(self, search_text=DEFAULT_SEARCH_TEXT, max_items=DEFAULT_MAX_ITEMS, max_searches=1,
+                 search_site="amazon", workers=2, vinted_base_url=VINTED_BASE_URL, use_cache=True,
+                 open_report=True, on_record=None, stdout_to_stderr=False, vinted_service=None, report_service=None,
+                 report_layout="auto", history_service=None, incremental_report=False, export_formats=(),
+                 price_history=None, spill_records=False, on_early_recommendations=None):
+        """
+        Initialize the sharded runner.
+
+        Args:
+            search_text: The search query to use on Vinted
+            max_items: Maximum number of items to analyze
+            max_searches: Maximum number of searches to perform per item
+            search_site: Site to focus search on
+            workers: Number of worker processes
+            vinted_base_url: Base URL for Vinted
+            use_cache: Whether workers reuse cached stage results
+            open_report: Whether to open the merged HTML report in the browser
+            on_record: Optional callback receiving each ItemRecord as soon as any worker completes it
+            stdout_to_stderr: Whether workers should print their progress to stderr
+            vinted_service: Optional VintedService used to fetch the listings
+            report_service: Optional ReportService used to render the merged report
+            report_layout: HTML report layout: "auto", "cards" or "virtual"
+            history_service: Optional HistoryService recording the merged records
+            incremental_report: Whether to update the search query's stable report instead of writing a new one
+            export_formats: Formats to export the merged records to ("jsonl", "csv", "parquet", "arrow")
+            price_history: Optional PriceHistoryService; the parent records every fetched price and
+                workers use the same database as their market reference
+            spill_records: Whether the parent and workers keep finished records in a RecordStore on
+                disk instead of in memory
+            on_early_recommendations: Optional callback receiving provisional recommendations once
+                records for the most promising share of the items have come back from the workers
+        """
+        self.search_text = search_text
+        self.max_items = max_items
+        self.workers = workers
+        self.on_record = on_record
+        self.on_early_recommendations = on_early_recommendations
+        self.options = {
+            'search_text': search_text,
+            'max_searches': max_searches,
+            'search_site': search_site,
+            'vinted_base_url': vinted_base_url,
+            'use_cache': use_cache,
+            'use_price_history': price_history is not None,
+            'stdout_to_stderr': stdout_to_stderr,
+            'spill_records': spill_records
+        }
+        self.vinted_service = vinted_service or VintedService(base_url=vinted_base_url)
+        self.report_service = report_service or ReportService()
+        self.price_history = price_history
+        self.publisher = RunPublisher(
+            self.report_service,
+            history_service=history_service,
+            report_layout=report_layout,
+            incremental_report=incremental_report,
+            export_formats=export_formats,
+            open_report=open_report
+        )
+        self.records = RecordStore() if spill_records else []
+        self.metrics = {}  # Run statistics for the summary (e.g. the duplicate rate)
+        self._duplicates = {}  # Representative ID -> its near-duplicate listings
+        self._analyzed = 0  # Items whose record came back from a worker
+        self._early_threshold = None  # Records received when provisional recommendations are emitted
+        self.report_file = None
+        self.export_files = {}
+
+    def kickoff(self):
+        """
+        Fetch, analyze and report on the sweep.
+
+        Returns:
+            A formatted string with recommendations
+        """
+        from services.analysis_pipeline import early_recommendations_threshold, format_recommendations, rank_records
+
+        print("1- Fetching items from Vinted")
+        with span("stage.fetch", max_items=self.max_items) as fetch_span, profile_stage("fetch"):
+            listings = self.vinted_service.search_items(self.search_text, self.max_items)
+            fetch_span.set_attribute("listings", len(listings))
+        if not listings:
+            return "No analysis results available to prepare recommendations."
+
+        # Record every price before sharding, so the sketches each worker reads cover the whole sweep;
+        # local market values leave out the listings first seen from the start of the run
+        run_started_at = time.time()
+        # Items are prioritized against the prices known before the sweep's are added
+        try:
+            scores = dict(zip([listing.id for listing in listings], pre_scores(listings, self.price_history)))
+        except Exception as e:
+            print(f"Error prioritizing items: {str(e)}")
+            scores = None
+        if self.price_history is not None:
+            try:
+                with span("price_history.record", listings=len(listings)):
+                    self.price_history.record_listings(listings)
+            except Exception as e:
+                print(f"Error recording price history: {str(e)}")
+
+        # Duplicates are grouped across the whole sweep; workers only see the representatives
+        groups = [[listing] for listing in listings]
+        try:
+            groups = group_duplicates(listings, thumbnail_service=self.report_service.thumbnail_service)
+        except Exception as e:
+            print(f"Error detecting duplicate listings: {str(e)}")
+        self.metrics.update(duplicate_metrics(len(listings), groups))
+        if self.metrics['duplicates']:
+            print(f"   {self.metrics['duplicates']} near-duplicate listings will reuse the results of their original")
+        self._duplicates = {group[0].id: group[1:] for group in groups}
+        listings = [group[0] for group in groups]
+
+        # Shards take every N-th listing best first, so each worker starts with its most promising ones
+        if scores is not None:
+            listings = prioritize(listings, scores=scores)
+
+        self._analyzed = 0
+        self._early_threshold = early_recommendations_threshold(len(listings)) \
+            if self.on_early_recommendations else None
+
+        shards = [listings[i::self.workers] for i in range(self.workers)]
+        shards = [shard for shard in shards if shard]
+        print(f"2- Analyzing {len(listings)} items in {len(shards)} worker processes")
+
+        completed_ids = set()
+        context = multiprocessing.get_context("spawn")
+        with span("stage.shards", shards=len(shards), items=len(listings)), profile_stage("shards"), \
+                context.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            record_queue = manager.Queue()
+            options = dict(self.options, trace=trace_context(), profile=profile_directory(),
+                           run_started_at=run_started_at, workers=len(shards), pre_scores=scores)
+            pending = {executor.submit(_run_shard, options, shard, record_queue) for shard in shards}
+
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                self._drain(record_queue, completed_ids)
+                for future in done:
+                    try:
+                        add_spans(future.result())
+                    except Exception as e:
+                        print(f"Error in worker process: {str(e)}")
+
+            self._drain(record_queue, completed_ids)
+
+        print("3- Preparing recommendations")
+        with span("stage.recommendations", records=len(self.records)), profile_stage("recommendations"):
+            self.records = rank_records(self.records)
+        if not self.records:
+            return "No analysis results available to prepare recommendations."
+
+        # The report, exports and history are written in the background; see wait_for_report
+        self.publisher.publish(self.search_text, self.options['search_site'], self.records)
+
+        return format_recommendations(self.records)
+
+    def wait_for_report(self, timeout=None):
+        """
+        Wait for the run's report, exports and history to be written.
+
+        Args:
+            timeout: Optional maximum number of seconds to wait
+
+        Returns:
+            The filename of the HTML report, or None
+        """
+        self.report_file = self.publisher.wait(timeout)
+        self.export_files = self.publisher.export_files
+        return self.report_file
+
+    def close(self):
+        """
+        Delete the records spilled to disk, once the report, exports and history are written.
+
+        The services passed in (caches, history, sessions) are shared and stay open.
+        """
+        self.publisher.wait()
+        if isinstance(self.records, RecordStore):
+            self.records.close()
+
+    def _drain(self, record_queue, completed_ids):
+        """Collect the records workers have completed so far."""
+        with contextlib.suppress(queue.Empty):
+            while True:
+                record = ItemRecord.model_validate_json(record_queue.get_nowait())
+                if record.item_id in completed_ids:
+                    continue
+                duplicates = self._duplicates.get(record.item_id, [])
+                for completed in [record] + [copy_record(record, duplicate) for duplicate in duplicates]:
+                    completed_ids.add(completed.item_id)
+                    self.records.append(completed)
+                    if self.on_record:
+                        self.on_record(completed)
+
+                # Workers start with their best items, so the first records are the most promising ones
+                self._analyzed += 1
+                if self._analyzed == self._early_threshold:
+                    self._emit_early_recommendations()
+
+    def _emit_early_recommendations(self):
+        """Hand the provisional recommendations of the records received so far to the callback."""
+        from services.analysis_pipeline import format_recommendations, rank_records
+
+        try:
+            self.on_early_recommendations(format_recommendations(rank_records(self.records)))
+        except Exception as e:
+            print(f"Error emitting early recommendations: {str(e)}")
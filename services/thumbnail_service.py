@@ -0,0 +1,225 @@
+"""
+Service for caching listing photos as small local thumbnails.
+
+Each photo is downloaded once and stored under the SHA-256 of its content, so a photo
+reached through several URLs is stored once, and reports keep working offline and after
+the remote URLs expire. A JSON index maps the photo URLs already seen to their files.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import DEFAULT_USER_AGENT, THUMBNAIL_SIZE, THUMBNAIL_DOWNLOAD_TIMEOUT, \
+    THUMBNAIL_DOWNLOAD_WORKERS
+from models.listing_models import PLACEHOLDER_PHOTO_URL
+from utils.trace_utils import propagate, span
+
+INDEX_FILENAME = "index.json"
+
+
+def _image_extension(data):
+    """Guess the file extension of an image from its first bytes."""
+    if data.startswith(b"\x89PNG"):
+        return ".png"
+    if data.startswith(b"GIF8"):
+        return ".gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".jpg"
+
+
+def _url_key(url):
+    """Return the index key of a photo URL."""
+    # Vinted signs its photo URLs in the query string; the path identifies the photo
+    return url.split('?')[0]
+
+
+class ThumbnailService:
+    """Service class for downloading, shrinking and caching listing photos."""
+
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE, timeout=THUMBNAIL_DOWNLOAD_TIMEOUT,
+                 workers=THUMBNAIL_DOWNLOAD_WORKERS, user_agent=DEFAULT_USER_AGENT):
+        """
+        Initialize the thumbnail service.
+
+        Args:
+            cache_dir: Directory where the thumbnails are stored
+            size: (width, height) bounding box of the thumbnails; applied only when Pillow is installed
+            timeout: Timeout in seconds of each download
+            workers: Number of photos downloaded at the same time
+            user_agent: User agent sent with the downloads
+        """
+        self.cache_dir = cache_dir
+        self.size = size
+        self.timeout = timeout
+        self.workers = workers
+        self.user_agent = user_agent
+        self._index = None  # Photo URL (without query string) -> cached filename
+        self._index_dirty = False
+        self._failed = set()  # URL keys whose download failed, not retried by this instance
+        self._lock = threading.Lock()
+
+    def prefetch(self, listings):
+        """
+        Cache the thumbnails of several listings, downloading the missing ones in parallel.
+
+        Args:
+            listings: The VintedListing objects whose photos should be cached
+
+        Returns:
+            The number of photos downloaded
+        """
+        urls = {_url_key(url): url for url in map(self._source_url, listings) if url}
+        missing = [url for key, url in urls.items()
+                   if key not in self._failed and self._cached_filename(url) is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                downloaded = sum(1 for filename in executor.map(propagate(self._cache_photo), missing) if filename)
+        else:
+            downloaded = 0
+        self._save_index()
+        return downloaded
+
+    def photo_hashes(self, listings):
+        """
+        Return the content hashes of listings' photos, downloading the photos not cached yet.
+
+        Args:
+            listings: The VintedListing objects whose photos should be hashed
+
+        Returns:
+            dict: Listing ID -> hash of the photo's content (its cached file name without the
+            extension), for the listings whose photo could be cached
+        """
+        listings = list(listings)
+        self.prefetch(listings)
+        hashes = {}
+        for listing in listings:
+            url = self._source_url(listing)
+            filename = self._cached_filename(url) if url else None
+            if filename:
+                hashes[listing.id] = os.path.splitext(filename)[0]
+        return hashes
+
+    def get_thumbnail(self, listing, relative_to=None):
+        """
+        Return where a report should load a listing's photo from.
+
+        Args:
+            listing: The VintedListing whose photo is needed
+            relative_to: Optional directory the returned path should be relative to (the report's)
+
+        Returns:
+            The path of the cached thumbnail, or the remote photo URL if it couldn't be cached
+        """
+        url = self._source_url(listing)
+        if not url:
+            return listing.photo_url
+
+        filename = self._cached_filename(url)
+        if filename is None and _url_key(url) not in self._failed:
+            filename = self._cache_photo(url)
+            self._save_index()
+        if filename is None:
+            return url
+
+        path = os.path.join(self.cache_dir, filename)
+        if relative_to:
+            return os.path.relpath(path, relative_to).replace(os.sep, '/')
+        return path
+
+    def _source_url(self, listing):
+        """Return the URL to download for a listing, preferring Vinted's small thumbnail."""
+        url = listing.thumbnail_url or listing.photo_url
+        if not url or url == PLACEHOLDER_PHOTO_URL or not url.startswith('http'):
+            return None
+        return url
+
+    def _load_index(self):
+        """Load the URL index from disk on first use. Must be called with the lock held."""
+        if self._index is None:
+            try:
+                with open(os.path.join(self.cache_dir, INDEX_FILENAME), encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        """Write the URL index to disk if it changed."""
+        with self._lock:
+            if not self._index_dirty:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            index_path = os.path.join(self.cache_dir, INDEX_FILENAME)
+            temp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(temp_path, index_path)
+            self._index_dirty = False
+
+    def _cached_filename(self, url):
+        """Return the cached filename of a photo URL, or None if it isn't cached."""
+        with self._lock:
+            filename = self._load_index().get(_url_key(url))
+        if filename and os.path.exists(os.path.join(self.cache_dir, filename)):
+            return filename
+        return None
+
+    def _cache_photo(self, url):
+        """
+        Download a photo, shrink it and store it under its content hash.
+
+        Returns:
+            The cached filename, or None if the download failed
+        """
+        try:
+            request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+            with span("http.thumbnail", url=_url_key(url)) as request_span, \
+                    urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content_type = response.headers.get('Content-Type', '')
+                data = response.read()
+                request_span.set_attributes(content_type=content_type, bytes=len(data))
+            if content_type and not content_type.startswith('image/'):
+                raise ValueError(f"unexpected content type {content_type}")
+
+            data = self._shrink(data)
+            filename = hashlib.sha256(data).hexdigest()[:32] + _image_extension(data)
+            path = os.path.join(self.cache_dir, filename)
+            if not os.path.exists(path):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error caching thumbnail {url}: {str(e)}")
+            with self._lock:
+                self._failed.add(_url_key(url))
+            return None
+
+        with self._lock:
+            self._load_index()[_url_key(url)] = filename
+            self._index_dirty = True
+        return filename
+
+    def _shrink(self, data):
+        """Resize an image to fit the thumbnail size; returned unchanged if Pillow isn't installed."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return data
+
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width <= self.size[0] and image.height <= self.size[1]:
+                return data
+            image.thumbnail(self.size)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=80, optimize=True)
+        return output.getvalue()
@@ -1,9 +1,15 @@
 """
 Service for interacting with Vinted API through the vinted_scraper wrapper.
 """
-from vinted_scraper import VintedWrapper
-
 from config.settings import VINTED_BASE_URL, DEFAULT_USER_AGENT
+from models.listing_models import VintedListing
+from services.cache_service import ResultCache
+from utils.concurrency_utils import SingleFlight
+from utils.trace_utils import span
+
+# Shared by every VintedService, so concurrent jobs looking up the same search or item
+# (e.g. in service mode) make a single request
+_requests = SingleFlight()
 
 
 class VintedService:
@@ -17,7 +23,18 @@ class VintedService:
             base_url: The base URL for Vinted (default: https://www.vinted.it)
             user_agent: The user agent to use for requests
         """
-        self.wrapper = VintedWrapper(base_url, agent=user_agent)
+        self.base_url = base_url
+        self.user_agent = user_agent
+        self._wrapper = None
+
+    @property
+    def wrapper(self):
+        """The VintedWrapper, created (and vinted_scraper imported) on first use."""
+        if self._wrapper is None:
+            from vinted_scraper import VintedWrapper
+
+            self._wrapper = VintedWrapper(self.base_url, agent=self.user_agent)
+        return self._wrapper
 
     def search_items(self, search_text, max_items=5):
         """
@@ -28,7 +45,7 @@ class VintedService:
             max_items: Maximum number of items to return
 
         Returns:
-            A list of detailed item information
+            A list of VintedListing objects normalized from the detailed item information
         """
         # Set search parameters
         params = {
@@ -36,7 +53,10 @@ class VintedService:
         }
 
         # Perform the search
-        search_results = self.wrapper.search(params)
+        with span("http.vinted.search", search_text=search_text, base_url=self.base_url) as request_span:
+            search_results, shared = _requests.do(ResultCache.fingerprint("vinted.search", [self.base_url, params]),
+                                                  self.wrapper.search, params)
+            request_span.set_attributes(results=len(search_results.get("items") or []), shared=shared)
 
         # Check if items were found
         if not search_results.get("items"):
@@ -46,14 +66,17 @@ class VintedService:
         # Limit the number of items to process
         items = search_results["items"][:max_items]
 
-        # Fetch detailed information for each item
-        detailed_items = []
+        # Fetch detailed information for each item and normalize it once
+        listings = []
         for item in items:
             item_id = item["id"]
-            item_details = self.wrapper.item(item_id)
-            detailed_items.append(item_details)
+            with span("http.vinted.item", item_id=str(item_id)) as request_span:
+                item_details, shared = _requests.do(ResultCache.fingerprint("vinted.item", [self.base_url, item_id]),
+                                                    self.wrapper.item, item_id)
+                request_span.set_attribute("shared", shared)
+            listings.append(VintedListing.from_payload(item_details, base_url=self.base_url))
 
-        return detailed_items
+        return listings
 
     def get_item_url(self, item_url):
         """
@@ -0,0 +1,198 @@
+"""
+Utility functions for extracting product attributes from listings with per-category rule packs.
+
+Each rule pack recognizes one kind of product from the listing title, then reads the model
+and specs from the title (or the description when the title lacks them). A pack succeeds
+only when it finds every field of the product's canonical key; otherwise the listing is
+left to the agents.
+"""
+import re
+
+from models.attribute_models import ProductAttributes
+from utils.text_utils import normalize_text
+
+# Spellings of brands found in titles and Vinted brand names, mapped to their canonical name
+BRAND_ALIASES = {
+    "samsung": "samsung", "crucial": "crucial", "western digital": "wd", "wd": "wd", "kingston": "kingston",
+    "sandisk": "sandisk", "seagate": "seagate", "intel": "intel", "corsair": "corsair", "adata": "adata",
+    "lexar": "lexar", "sk hynix": "sk hynix", "hynix": "sk hynix", "kioxia": "kioxia", "toshiba": "toshiba",
+    "apple": "apple", "google": "google", "xiaomi": "xiaomi", "redmi": "xiaomi", "oneplus": "oneplus",
+    "huawei": "huawei", "motorola": "motorola", "oppo": "oppo", "realme": "realme", "sony": "sony",
+}
+_BRAND_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, BRAND_ALIASES), key=len, reverse=True)) + r")\b"
+)
+
+_SIZE_PATTERN = re.compile(r"\b(\d+(?:\.\d+)?)(gb|tb)\b")
+_RAM_PATTERN = re.compile(r"\b(\d{1,2})gb\s?(?:di\s)?ram\b|\bram\s?(\d{1,2})gb\b")
+
+
+def _gigabytes(match):
+    """Return the size of a _SIZE_PATTERN match in GB."""
+    value = float(match.group(1))
+    return round(value * 1000 if match.group(2) == "tb" else value)
+
+
+def _format_size(gigabytes):
+    """Format a size in GB the way keys spell it ("500gb", "1tb")."""
+    for unit in (1000, 1024):
+        if gigabytes >= unit and gigabytes % unit == 0:
+            return f"{gigabytes // unit}tb"
+    return f"{gigabytes}gb"
+
+
+def _ssd_capacity(text):
+    """Return the first drive size in a text."""
+    match = _SIZE_PATTERN.search(text)
+    return _format_size(_gigabytes(match)) if match else None
+
+
+def _ssd_interface(text):
+    """Return the interface of a drive."""
+    if re.search(r"\b(nvme|pcie)\b", text):
+        return "nvme"
+    if re.search(r"\bsata\b", text):
+        return "sata"
+    return None
+
+
+def _ssd_form_factor(text):
+    """Return the form factor of a drive."""
+    if re.search(r"\bm\.?2\b", text):
+        return "m.2"
+    if re.search(r"\bmsata\b", text):
+        return "msata"
+    if re.search(r"\b2[.,]5\b", text):
+        return "2.5in"
+    return None
+
+
+def _phone_storage(text):
+    """Return the storage of a phone: the largest size that isn't its RAM."""
+    ram = {int(size) for match in _RAM_PATTERN.finditer(text) for size in match.groups() if size}
+    sizes = [_gigabytes(match) for match in _SIZE_PATTERN.finditer(text)]
+    sizes = [size for size in sizes if size >= 16 and size not in ram]
+    return _format_size(max(sizes)) if sizes else None
+
+
+def _phone_ram(text):
+    """Return the RAM of a phone."""
+    match = _RAM_PATTERN.search(text)
+    return f"{match.group(1) or match.group(2)}gb" if match else None
+
+
+def _suffix(match, group):
+    """Return ' <group>' when an optional group matched, with '+' spelled 'plus'."""
+    value = (match.group(group) or "").strip()
+    if not value:
+        return ""
+    return " " + ("plus" if value == "+" else value)
+
+
+# Each pack: the title pattern recognizing the product (a model named in the title is enough
+# too), a pattern excluding accessories, the
+# (brand, pattern, formatter) rules naming a model, spec extractors, the fields the pack needs
+# to succeed and the fields of the canonical key
+RULE_PACKS = [
+    {
+        'kind': "ssd",
+        'detect': re.compile(r"\b(ssd|nvme|m\.2|solid state)\b"),
+        'exclude': re.compile(r"\b(case|enclosure|box|adapter|adattatore|dock|cavo|cable|heatsink|dissipatore)\b"),
+        'models': [
+            ("samsung", re.compile(r"\b(8[3-7]0|9[5-9]0)\s?(evo|pro|qvo)(\s?plus|\+)?"),
+             lambda m: f"{m.group(1)} {m.group(2)}" + _suffix(m, 3)),
+            ("samsung", re.compile(r"\b(evo|pro|qvo)\s?(8[3-7]0|9[5-9]0)\b(\s?plus|\+)?"),
+             lambda m: f"{m.group(2)} {m.group(1)}" + _suffix(m, 3)),
+            ("crucial", re.compile(r"\b(mx[1-5]00|bx[1-5]00|p[1-5](?:\s?plus)?|t[5-7]00)\b"),
+             lambda m: m.group(1).replace(" ", "")),
+            ("wd", re.compile(r"\b(sn\d{3,4}x?)\b"), lambda m: m.group(1)),
+            ("wd", re.compile(r"\bwd\s?(blue|black|green|red)\b"), lambda m: m.group(1)),
+            ("kingston", re.compile(r"\b(a400|a2000|nv[1-3]|kc[1-3]000|kc600|fury renegade)\b"),
+             lambda m: m.group(1)),
+            ("sandisk", re.compile(r"\bsandisk\s(ultra 3d|extreme pro|extreme|plus|ultra)\b"), lambda m: m.group(1)),
+        ],
+        'specs': {'capacity': _ssd_capacity, 'interface': _ssd_interface, 'form_factor': _ssd_form_factor},
+        'required': ("model", "capacity"),
+        'key': ("brand", "model", "capacity"),
+    },
+    {
+        'kind': "phone",
+        'detect': re.compile(r"\b(iphone|galaxy|pixel|redmi|oneplus|smartphone|cellulare|telefono)\b"),
+        'exclude': re.compile(r"\b(cover|case|custodia|pellicola|vetro|glass|caricatore|charger|cavo|cable|watch|"
+                              r"buds|airpods|tab|supporto|holder)\b"),
+        'models': [
+            ("apple", re.compile(r"\biphone\s?(\d{1,2}|se|xr|xs|x)\b(\s?(?:pro max|pro|plus|mini|max))?"),
+             lambda m: f"iphone {m.group(1)}" + _suffix(m, 2)),
+            ("samsung", re.compile(r"\bgalaxy\s?((?:s|a|m|note|z\s?fold|z\s?flip)\s?\d{1,2})(\s?(?:ultra|plus|fe|lite)"
+                                   r"\b|\+)?"),
+             lambda m: "galaxy " + re.sub(r"\s", "", m.group(1)) + _suffix(m, 2)),
+            ("google", re.compile(r"\bpixel\s?(\d{1,2}a?)\b(\s?(?:pro|xl))?"),
+             lambda m: f"pixel {m.group(1)}" + _suffix(m, 2)),
+            ("xiaomi", re.compile(r"\bredmi\s?(note\s?)?(\d{1,2}[a-z]?)\b(\s?pro)?"),
+             lambda m: "redmi " + ("note " if m.group(1) else "") + m.group(2) + _suffix(m, 3)),
+            ("oneplus", re.compile(r"\boneplus\s?(\d{1,2}t?|nord(?:\s?\d)?)\b(\s?pro)?"),
+             lambda m: f"oneplus {m.group(1)}" + _suffix(m, 2)),
+        ],
+        'specs': {'storage': _phone_storage, 'ram': _phone_ram},
+        'required': ("model",),
+        'key': ("brand", "model", "storage"),
+    },
+]
+
+
+def _listing_brand(brand, title):
+    """Return the canonical brand of a listing from its Vinted brand or its title."""
+    for text in (normalize_text(brand), title):
+        match = _BRAND_PATTERN.search(text)
+        if match:
+            return BRAND_ALIASES[match.group(1)]
+    return None
+
+
+def _apply_pack(pack, listing, title, description):
+    """Extract a listing's attributes with one rule pack, or return None when a key field is missing."""
+    brand = model = None
+    for text in (title, description):
+        for model_brand, pattern, formatter in pack['models']:
+            match = pattern.search(text)
+            if match:
+                brand, model = model_brand, formatter(match)
+                break
+        if model:
+            break
+    brand = brand or _listing_brand(listing.brand, title)
+
+    specs = {}
+    for name, extract in pack['specs'].items():
+        value = extract(title) or extract(description)
+        if value:
+            specs[name] = value
+
+    fields = {'brand': brand, 'model': model, **specs}
+    if any(fields.get(name) is None for name in pack['required']):
+        return None
+    key = " ".join([pack['kind']] + [fields[name] for name in pack['key'] if fields.get(name)])
+    return ProductAttributes(kind=pack['kind'], brand=brand, model=model, specs=specs, product_key=key)
+
+
+def extract_attributes(listing):
+    """
+    Extract the structured specs of a listing with the first matching rule pack.
+
+    Args:
+        listing: The VintedListing
+
+    Returns:
+        ProductAttributes, or None when no rule pack recognizes the listing
+    """
+    title = normalize_text(listing.title)
+    description = normalize_text(listing.description)
+    for pack in RULE_PACKS:
+        if pack['exclude'].search(title):
+            continue
+        if not pack['detect'].search(title) and not any(pattern.search(title) for _, pattern, _ in pack['models']):
+            continue
+        attributes = _apply_pack(pack, listing, title, description)
+        if attributes is not None:
+            return attributes
+    return None
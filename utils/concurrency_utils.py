@@ -0,0 +1,241 @@
+"""
+Utility classes for controlling the calls made to remote APIs at the same time.
+
+AdaptiveLimiter is an AIMD (additive increase, multiplicative decrease) controller, the
+scheme TCP uses for its congestion window: while calls succeed at their usual latency the
+limit grows by about one call per round of calls; a rate-limit or server error halves it,
+and latency well above the usual gently shrinks it. The limit thus settles near the highest
+concurrency the provider allows without manual tuning.
+
+SingleFlight collapses identical requests made at the same time into one.
+"""
+import contextlib
+import threading
+import time
+import weakref
+
+from config.settings import CONCURRENCY_BACKOFF, CONCURRENCY_LATENCY_BACKOFF, CONCURRENCY_LATENCY_TOLERANCE
+
+# Words of error messages that report an overloaded or rate-limited provider
+_OVERLOAD_MARKERS = ("429", "rate limit", "ratelimit", "too many requests", "quota", "resource_exhausted",
+                     "overloaded", "503", "service unavailable")
+
+
+def is_overload_error(error):
+    """
+    Whether an error means the provider is rate limiting or overloaded (HTTP 429 or 5xx).
+
+    Args:
+        error: The exception raised by the call
+
+    Returns:
+        bool: True for rate-limit and server errors
+    """
+    for source in (error, getattr(error, 'response', None)):
+        status = getattr(source, 'status_code', None) or getattr(source, 'status', None)
+        if isinstance(status, int):
+            return status == 429 or status >= 500
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _OVERLOAD_MARKERS)
+
+
+class _Checkpoint:
+    """Counters of a limiter when a run started, and the peak concurrency reached since."""
+
+    def __init__(self, calls, overloads, total_latency, peak_in_flight, started):
+        self.calls = calls
+        self.overloads = overloads
+        self.total_latency = total_latency
+        self.peak_in_flight = peak_in_flight
+        self.started = started
+
+
+class AdaptiveLimiter:
+    """Limits concurrent calls to a provider, adapting the limit to its latency and errors."""
+
+    def __init__(self, name, initial_limit=2, min_limit=1, max_limit=16):
+        """
+        Initialize the limiter.
+
+        Args:
+            name: Name of the limited provider, used in the metrics
+            initial_limit: Concurrent calls allowed at first
+            min_limit: Concurrent calls always allowed
+            max_limit: Concurrent calls never exceeded
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.overloads = 0
+        self.total_latency = 0.0
+        self._baselines = {}  # Kind of call -> usual latency in seconds
+        self._last_decrease = 0.0
+        self._started = None
+        self._checkpoints = weakref.WeakSet()  # Checkpoints still measuring their peak concurrency
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self, kind="call"):
+        """
+        Wait for a free slot and hold it for the duration of one call.
+
+        Args:
+            kind: Kind of call (e.g. the pipeline stage); latencies are compared per kind
+
+        Yields:
+            None; an exception raised by the call is fed to the controller and re-raised
+        """
+        with self._condition:
+            while self.in_flight >= max(self.min_limit, int(self.limit)):
+                self._condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            for checkpoint in self._checkpoints:
+                checkpoint.peak_in_flight = max(checkpoint.peak_in_flight, self.in_flight)
+            if self._started is None:
+                self._started = time.monotonic()
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._complete(kind, started, time.monotonic() - started, error)
+
+    def _complete(self, kind, started, latency, error):
+        """Release a slot and adjust the limit from the outcome of its call."""
+        with self._condition:
+            self.in_flight -= 1
+            self.calls += 1
+            self.total_latency += latency
+            # Calls started before the last decrease report congestion it already reacted to
+            can_decrease = started >= self._last_decrease
+
+            if error is not None:
+                if is_overload_error(error):
+                    self.overloads += 1
+                    if can_decrease:
+                        self._decrease(CONCURRENCY_BACKOFF)
+            else:
+                baseline = self._baselines.get(kind)
+                if baseline is not None and latency > baseline * CONCURRENCY_LATENCY_TOLERANCE:
+                    if can_decrease:
+                        self._decrease(CONCURRENCY_LATENCY_BACKOFF)
+                else:
+                    # About one more concurrent call per round of `limit` successful calls
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                # The baseline follows faster latencies at once and slower ones slowly
+                self._baselines[kind] = latency if baseline is None or latency < baseline \
+                    else baseline + (latency - baseline) * 0.05
+            self._condition.notify_all()
+
+    def _decrease(self, factor):
+        """Shrink the limit by a factor."""
+        self.limit = max(self.min_limit, self.limit * factor)
+        self._last_decrease = time.monotonic()
+
+    def checkpoint(self):
+        """
+        Return the state metrics(since=...) measures a run from.
+
+        The checkpoint tracks its own peak concurrency for as long as it is referenced, so runs
+        sharing the limiter (e.g. service jobs) each report the peak reached during the run.
+        """
+        with self._condition:
+            checkpoint = _Checkpoint(self.calls, self.overloads, self.total_latency, self.in_flight,
+                                     time.monotonic())
+            self._checkpoints.add(checkpoint)
+            return checkpoint
+
+    def metrics(self, since=None):
+        """
+        Summarize the limiter for the run metrics.
+
+        Args:
+            since: Optional checkpoint() taken when the run started; counts cover the whole
+                life of the limiter otherwise
+
+        Returns:
+            dict: current limit, peak concurrent calls, calls, overload errors, throughput
+                (calls per second) and average latency (seconds)
+        """
+        with self._condition:
+            since = since or _Checkpoint(0, 0, 0.0, self.peak_in_flight, self._started)
+            calls = self.calls - since.calls
+            elapsed = time.monotonic() - since.started if since.started is not None else 0.0
+            return {
+                'limit': int(self.limit),
+                'peak_in_flight': since.peak_in_flight,
+                'calls': calls,
+                'overloads': self.overloads - since.overloads,
+                'throughput': round(calls / elapsed, 3) if elapsed else 0.0,
+                'average_latency': round((self.total_latency - since.total_latency) / calls, 3) if calls else None
+            }
+
+
+class _Call:
+    """A call in flight, and its outcome once done."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers asking for a key already in flight wait
+    for that call and share its result (or exception) instead of repeating the request.
+
+    Keys are the same request fingerprints the caches use, so identical requests that miss
+    the cache together only go to the network once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # Key -> _Call in flight
+        self.shared = 0  # Calls answered with another caller's result
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Run a call unless an identical one is in flight, then return its result.
+
+        Args:
+            key: Fingerprint of the request
+            function: Callable making the request
+            *args: Positional arguments of the callable
+            **kwargs: Keyword arguments of the callable
+
+        Returns:
+            A (result, shared) tuple; shared is True when another caller made the request
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
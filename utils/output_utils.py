@@ -0,0 +1,144 @@
+"""
+Utility functions for machine-readable output.
+"""
+import csv
+import datetime
+import threading
+import typing
+
+ARROW_BATCH_SIZE = 1000  # Rows buffered before each Parquet/Arrow record batch is written
+
+
+class NdjsonWriter:
+    """Write one JSON document per line, flushing each so consumers can act on it immediately."""
+
+    def __init__(self, stream, flush=True):
+        """
+        Initialize the writer.
+
+        Args:
+            stream: The text stream to write to (e.g. sys.stdout)
+            flush: Whether to flush the stream after every line
+        """
+        self.stream = stream
+        self.flush = flush
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        """
+        Write a Pydantic model as a single NDJSON line.
+
+        Args:
+            record: The Pydantic model to write
+        """
+        line = record.model_dump_json()
+        with self._lock:
+            self.stream.write(line + "\n")
+            if self.flush:
+                self.stream.flush()
+
+    def close(self):
+        """Flush the stream; the caller owns and closes it."""
+        self.stream.flush()
+
+
+class CsvWriter:
+    """Write flat Pydantic models as CSV rows, one column per field."""
+
+    def __init__(self, stream, model_class):
+        """
+        Initialize the writer and write the header row.
+
+        Args:
+            stream: The text stream to write to, opened with newline=''
+            model_class: The Pydantic model class of the rows
+        """
+        self.stream = stream
+        self._writer = csv.DictWriter(stream, fieldnames=list(model_class.model_fields))
+        self._writer.writeheader()
+
+    def write(self, record):
+        """Write a Pydantic model as a CSV row."""
+        self._writer.writerow(record.model_dump(mode='json'))
+
+    def close(self):
+        """Flush the stream; the caller owns and closes it."""
+        self.stream.flush()
+
+
+def arrow_schema(model_class):
+    """
+    Build the Arrow schema of a flat Pydantic model.
+
+    Args:
+        model_class: A Pydantic model class whose fields are str, int, float, bool or datetime
+
+    Returns:
+        pyarrow.Schema: One nullable column per optional field
+    """
+    import pyarrow as pa
+
+    types = {
+        str: pa.string(),
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime.datetime: pa.timestamp('us', tz='UTC'),
+    }
+    fields = []
+    for name, field in model_class.model_fields.items():
+        annotation = field.annotation
+        # Optional[X] is Union[X, None]
+        arguments = [argument for argument in typing.get_args(annotation) if argument is not type(None)]
+        if arguments:
+            annotation = arguments[0]
+        fields.append(pa.field(name, types[annotation], nullable=not field.is_required()))
+    return pa.schema(fields)
+
+
+class ArrowWriter:
+    """Write flat Pydantic models to a Parquet or Arrow IPC file in record batches."""
+
+    def __init__(self, path, model_class, file_format="parquet", batch_size=ARROW_BATCH_SIZE):
+        """
+        Initialize the writer. Requires pyarrow.
+
+        Args:
+            path: Path of the file to write
+            model_class: The Pydantic model class of the rows
+            file_format: "parquet" or "arrow" (Arrow IPC file)
+            batch_size: Rows buffered before each record batch is written
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.schema = arrow_schema(model_class)
+        self.batch_size = batch_size
+        self._columns = {name: [] for name in self.schema.names}
+        self._rows = 0
+        if file_format == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, record):
+        """Buffer a Pydantic model as a row, writing a record batch when the buffer is full."""
+        for name, value in record:
+            self._columns[name].append(value)
+        self._rows += 1
+        if self._rows >= self.batch_size:
+            self._write_batch()
+
+    def _write_batch(self):
+        """Write the buffered rows as one record batch."""
+        import pyarrow as pa
+
+        if self._rows:
+            self._writer.write_batch(pa.RecordBatch.from_pydict(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in self.schema.names}
+            self._rows = 0
+
+    def close(self):
+        """Write the remaining rows and close the file."""
+        self._write_batch()
+        self._writer.close()
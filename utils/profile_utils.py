@@ -0,0 +1,238 @@
+"""
+Utility functions for profiling where a run spends CPU time and allocates memory.
+
+Code wraps its stages in `with profile_stage("name"):`. Profiling is off by default, and then
+profile_stage() returns a shared no-op object. Once enabled, each stage gets its own cProfile
+profiler and tracemalloc allocation statistics, accumulated over every time the stage runs
+(e.g. once per item). A stage nested in another pauses the outer one, so each stage only
+accounts for its own work.
+
+Allocation traces are cleared whenever a stage starts or resumes while no other stage is
+measuring, so the snapshot taken when it stops only holds the blocks it allocated and still
+holds; snapshots stay small and cheap no matter how much memory the process uses. Traces are
+process-wide, so a stage starting while another one runs on another thread (e.g. the background
+report) leaves them alone and diffs its snapshot against one taken when it started instead.
+"""
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+from config.settings import PROFILE_TOP_FUNCTIONS, PROFILE_TOP_ALLOCATIONS, PROFILE_TRACEMALLOC_FRAMES
+
+SUMMARY_FILENAME = "summary.txt"
+
+_state = {'enabled': False, 'directory': None, 'active': 0}  # active: stages measuring on any thread
+_stages = {}  # Stage name -> _StageProfile
+_lock = threading.Lock()
+_local = threading.local()  # Per-thread stack of running stages (cProfile profiles one thread)
+
+# Allocations made by the profiler itself aren't worth reporting
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+]
+
+
+class _StageProfile:
+    """CPU and allocation statistics of one stage, accumulated over its runs."""
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.calls = 0
+        self.wall_time = 0.0
+        self.peak_memory = 0
+        self.allocations = {}  # (filename, lineno) -> [size, count] of the blocks still held
+        self._started = None
+        self._baseline = None  # Snapshot the stage's allocations are diffed against, if traces weren't cleared
+
+    def resume(self):
+        """Start (or continue) measuring the stage on the current thread."""
+        with _lock:
+            if _state['active']:
+                # Clearing would wipe the allocations of the stages running on other threads
+                self._baseline = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            else:
+                tracemalloc.clear_traces()
+                self._baseline = None
+            _state['active'] += 1
+        self._started = time.perf_counter()
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; a stage running on another
+            # thread at the same time only gets its time and allocations
+            pass
+
+    def pause(self):
+        """Stop measuring the stage, adding the interval to its statistics."""
+        self.profiler.disable()
+        self.wall_time += time.perf_counter() - self._started
+        with _lock:
+            _state['active'] -= 1
+        self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        if self._baseline is None:
+            statistics = [(statistic, statistic.size, statistic.count) for statistic in snapshot.statistics("lineno")]
+        else:
+            statistics = [(statistic, statistic.size_diff, statistic.count_diff)
+                          for statistic in snapshot.compare_to(self._baseline, "lineno") if statistic.size_diff > 0]
+            self._baseline = None
+        for statistic, size, count in statistics:
+            frame = statistic.traceback[0]
+            totals = self.allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+            totals[0] += size
+            totals[1] += max(0, count)
+
+
+class _NoopStage:
+    """Stage returned while profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def enable_profiling(directory):
+    """
+    Start profiling stages, writing their statistics to a directory.
+
+    Args:
+        directory: The directory receiving a .prof file per stage and the summary
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    _state['directory'] = directory
+    _state['enabled'] = True
+
+
+def profiling_enabled():
+    """Whether stages are being profiled."""
+    return _state['enabled']
+
+
+def profile_directory():
+    """Return the directory profiles are written to, or None while profiling is disabled."""
+    return _state['directory'] if _state['enabled'] else None
+
+
+@contextlib.contextmanager
+def _profiled_stage(name):
+    """Measure a stage, pausing the stage it is nested in on this thread."""
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = _StageProfile(name)
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack:
+        stack[-1].pause()
+    stack.append(stage)
+    stage.calls += 1
+    stage.resume()
+    try:
+        yield stage
+    finally:
+        stage.pause()
+        stack.pop()
+        if stack:
+            stack[-1].resume()
+
+
+def profile_stage(name):
+    """
+    Create a context manager profiling a stage.
+
+    Args:
+        name: The name of the stage; runs of the same stage are accumulated
+
+    Returns:
+        The context manager, or a no-op one while profiling is disabled
+    """
+    if not _state['enabled']:
+        return _NOOP_STAGE
+    return _profiled_stage(name)
+
+
+def _short_path(filename):
+    """Shorten a file path to the part after site-packages or the working directory."""
+    for marker in ("site-packages" + os.sep, os.getcwd() + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+def _format_size(size):
+    """Format a number of bytes, e.g. 1.5 MiB."""
+    if abs(size) < 1024:
+        return f"{size} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if abs(size) < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}"
+
+
+def _stage_summary(stage):
+    """Return the summary text of one stage: its top functions and top allocation sites."""
+    lines = [
+        f"== {stage.name} ==",
+        f"runs: {stage.calls}, wall time: {stage.wall_time:.3f}s, peak memory allocated in a run: "
+        f"{_format_size(stage.peak_memory)}",
+        "",
+        "Top functions by cumulative time:",
+    ]
+    output = io.StringIO()
+    stats = pstats.Stats(stage.profiler, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+    # Keep the table, dropping the header pstats prints before it
+    table = output.getvalue()
+    lines.append(table[table.find("   ncalls"):].rstrip() if "   ncalls" in table else "  (no calls)")
+
+    lines += ["", "Top allocation sites (memory still held at the end of the stage):"]
+    sites = sorted(stage.allocations.items(), key=lambda item: item[1][0], reverse=True)
+    sites = sites[:PROFILE_TOP_ALLOCATIONS]
+    for (filename, lineno), (size, count) in sites:
+        lines.append(f"  {_format_size(size):>12} {count:>8} blocks  {_short_path(filename)}:{lineno}")
+    if not sites:
+        lines.append("  (none)")
+    return "\n".join(lines)
+
+
+def write_profiles():
+    """
+    Write a .prof file per stage (for pstats or snakeviz) and a summary of all stages.
+
+    Returns:
+        The path of the summary, or None while profiling is disabled
+    """
+    if not _state['enabled']:
+        return None
+    directory = _state['directory']
+    os.makedirs(directory, exist_ok=True)
+    with _lock:
+        stages = sorted(_stages.values(), key=lambda stage: stage.wall_time, reverse=True)
+
+    summaries = []
+    for stage in stages:
+        stage.profiler.dump_stats(os.path.join(directory, re.sub(r"[^\w.-]", "_", stage.name) + ".prof"))
+        summaries.append(_stage_summary(stage))
+
+    overview = ["Stages by wall time (nested stages excluded from their parent):"]
+    overview += [f"  {stage.wall_time:>9.3f}s  {stage.calls:>6} runs  {stage.name}" for stage in stages]
+    summary_path = os.path.join(directory, SUMMARY_FILENAME)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(["\n".join(overview)] + summaries) + "\n")
+    return summary_path
@@ -0,0 +1,204 @@
+"""
+Utility classes for finding similar listings.
+"""
+import heapq
+import math
+import random
+import re
+import zlib
+from collections import Counter, defaultdict
+
+from utils.text_utils import normalize_text
+
+MINHASH_PRIME = (1 << 31) - 1  # Modulus of the MinHash permutations; products with 32-bit hashes fit in uint64
+
+
+def shingles(text, size=5):
+    """
+    Return the set of character shingles of a text, after normalization.
+
+    Args:
+        text: The text to shingle
+        size: Number of characters per shingle
+
+    Returns:
+        set: The distinct shingles; a text shorter than size is a single shingle
+    """
+    text = re.sub(r"\s+", " ", normalize_text(text)).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(first, second):
+    """Return the Jaccard similarity of two sets (0 when both are empty)."""
+    if not first and not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHashLSH:
+    """
+    Locality-sensitive hashing of MinHash signatures, for finding near-duplicate sets.
+
+    Each set gets a signature of num_perm minimum hashes, split into bands; sets sharing all
+    the rows of any band land in the same bucket and become candidates. With b bands of r rows,
+    sets of Jaccard similarity s collide with probability 1 - (1 - s^r)^b, so candidates still
+    need checking against the real similarity.
+    """
+
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        """
+        Initialize an empty index.
+
+        Args:
+            num_perm: Number of hash permutations in a signature
+            bands: Number of bands the signature is split into; must divide num_perm
+            seed: Seed of the hash permutations
+        """
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        # numpy is only needed for deduplication, so it isn't loaded at startup
+        import numpy as np
+
+        self._np = np
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._a = np.array([rng.randrange(1, MINHASH_PRIME) for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self._b = np.array([rng.randrange(0, MINHASH_PRIME) for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self._buckets = defaultdict(list)
+
+    def signature(self, shingle_set):
+        """Return the MinHash signature of a non-empty set of strings as a tuple of ints."""
+        np = self._np
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        return tuple(((self._a * hashes + self._b) % MINHASH_PRIME).min(axis=1).tolist())
+
+    def add(self, key, shingle_set):
+        """
+        Add a set and return the keys of the sets added before that share a bucket with it.
+
+        Args:
+            key: The key of the set
+            shingle_set: The set of strings; empty sets are never candidates
+
+        Returns:
+            set: Keys of the candidate near-duplicates
+        """
+        if not shingle_set:
+            return set()
+        signature = self.signature(shingle_set)
+        candidates = set()
+        for band in range(self.bands):
+            bucket = self._buckets[(band, signature[band * self.rows:(band + 1) * self.rows])]
+            candidates.update(bucket)
+            bucket.append(key)
+        return candidates
+
+
+class TfidfIndex:
+    """
+    Incremental TF-IDF index over short token lists (listing titles), queried by cosine similarity.
+
+    Documents can be added, replaced and removed at any time; inverse document frequencies
+    are computed at query time from the current document counts, so the index never needs
+    rebuilding. Only documents sharing at least one term with the query are scored. Document
+    norms depend on every document through the IDFs, so each is computed once and kept until
+    the index next changes, rather than at every query.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._documents = {}  # Document ID -> term counts
+        self._postings = defaultdict(set)  # Term -> IDs of the documents containing it
+        self._norms = {}  # Document ID -> TF-IDF vector norm, valid until the next change
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._documents
+
+    def add(self, doc_id, tokens):
+        """
+        Add a document, replacing any previous document with the same ID.
+
+        Args:
+            doc_id: The document ID
+            tokens: The document's tokens
+        """
+        self.remove(doc_id)
+        counts = Counter(tokens)
+        if not counts:
+            return
+        self._norms.clear()
+        self._documents[doc_id] = counts
+        for term in counts:
+            self._postings[term].add(doc_id)
+
+    def remove(self, doc_id):
+        """Remove a document if present."""
+        counts = self._documents.pop(doc_id, None)
+        if counts is None:
+            return
+        self._norms.clear()
+        for term in counts:
+            postings = self._postings[term]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[term]
+
+    def _idf(self, term):
+        """Smoothed inverse document frequency of a term."""
+        return math.log((1 + len(self._documents)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _norm(self, doc_id, weight):
+        """Return the TF-IDF vector norm of a document, computing it once per index change."""
+        norm = self._norms.get(doc_id)
+        if norm is None:
+            norm = self._norms[doc_id] = math.sqrt(sum((count * weight(term)) ** 2
+                                                       for term, count in self._documents[doc_id].items()))
+        return norm
+
+    def query(self, tokens, k=5, accept=None):
+        """
+        Find the documents most similar to a token list.
+
+        Args:
+            tokens: The query tokens
+            k: Maximum number of documents returned
+            accept: Optional predicate on document IDs; rejected documents are skipped
+
+        Returns:
+            A list of (doc_id, similarity) tuples, most similar first, with similarities in (0, 1]
+        """
+        query_counts = Counter(tokens)
+        if not query_counts:
+            return []
+
+        idf = {}
+
+        def weight(term):
+            if term not in idf:
+                idf[term] = self._idf(term)
+            return idf[term]
+
+        # Terms no document contains still count in the query norm (with the highest, smoothed IDF):
+        # a query sharing one rare word with a document must not look like a close match
+        query_weights = {term: count * weight(term) for term, count in query_counts.items()}
+        query_norm = math.sqrt(sum(value * value for value in query_weights.values()))
+
+        dot_products = defaultdict(float)
+        for term, query_weight in query_weights.items():
+            for doc_id in self._postings.get(term, ()):
+                dot_products[doc_id] += query_weight * self._documents[doc_id][term] * idf[term]
+
+        def similarities():
+            for doc_id, dot_product in dot_products.items():
+                if accept is not None and not accept(doc_id):
+                    continue
+                yield doc_id, min(1.0, dot_product / (query_norm * self._norm(doc_id, weight)))
+
+        return heapq.nlargest(k, similarities(), key=lambda match: match[1])
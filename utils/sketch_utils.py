@@ -0,0 +1,192 @@
+"""
+Utility classes for summarizing large streams of prices in constant memory.
+"""
+import math
+
+
+class TDigest:
+    """
+    Mergeable t-digest for streaming quantile estimates.
+
+    Values are buffered and periodically merged into at most about `compression` weighted
+    centroids, kept small near the tails so extreme percentiles stay accurate. Digests built
+    separately (in other runs or processes) merge into one without losing accuracy.
+    """
+
+    def __init__(self, compression=100):
+        """
+        Initialize an empty digest.
+
+        Args:
+            compression: Size parameter; more centroids give more accurate quantiles
+        """
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._centroids = []  # Sorted [mean, weight] pairs
+        self._buffer = []  # Values not yet merged into the centroids
+
+    def __len__(self):
+        return int(self.count)
+
+    def add(self, value, weight=1):
+        """
+        Add a value.
+
+        Args:
+            value: The value to add
+            weight: The weight of the value
+        """
+        self._buffer.append([float(value), weight])
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Merge another digest into this one.
+
+        Args:
+            other: The TDigest to merge
+
+        Returns:
+            TDigest: This digest
+        """
+        if not other.count:
+            return self
+        self._buffer.extend([mean, weight] for mean, weight in other._centroids + other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k_limit(self, q):
+        """Return the largest quantile a centroid starting at q may reach (arcsine scale function)."""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        """Merge the buffer into the centroids."""
+        if not self._buffer:
+            return
+        items = sorted(self._centroids + self._buffer)
+        self._buffer = []
+
+        merged = []
+        mean, weight = items[0]
+        weight_before = 0
+        limit = self._k_limit(0)
+        for next_mean, next_weight in items[1:]:
+            if (weight_before + weight + next_weight) / self.count <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append([mean, weight])
+                weight_before += weight
+                limit = self._k_limit(weight_before / self.count)
+                mean, weight = next_mean, next_weight
+        merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        Args:
+            q: The quantile, between 0 and 1
+
+        Returns:
+            float: The estimated value at q, or None for an empty digest
+        """
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return self.min + (self.max - self.min) * q
+
+        index = min(max(q, 0.0), 1.0) * self.count
+        first_mean, first_weight = centroids[0]
+        if index < first_weight / 2:
+            return self.min + (first_mean - self.min) * index / (first_weight / 2)
+
+        cumulative = first_weight / 2
+        for (mean, weight), (next_mean, next_weight) in zip(centroids, centroids[1:]):
+            step = (weight + next_weight) / 2
+            if cumulative + step > index:
+                return mean + (next_mean - mean) * (index - cumulative) / step
+            cumulative += step
+
+        last_mean, last_weight = centroids[-1]
+        return min(self.max, last_mean + (self.max - last_mean) * (index - cumulative) / (last_weight / 2))
+
+    def cdf(self, value):
+        """
+        Estimate the fraction of values at or below a value.
+
+        Args:
+            value: The value
+
+        Returns:
+            float: The estimated fraction (0-1), or None for an empty digest
+        """
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        if len(centroids) == 1:
+            return (value - self.min) / (self.max - self.min)
+
+        first_mean, first_weight = centroids[0]
+        if value < first_mean:
+            return (value - self.min) / (first_mean - self.min) * first_weight / 2 / self.count
+
+        cumulative = first_weight / 2
+        for (mean, weight), (next_mean, next_weight) in zip(centroids, centroids[1:]):
+            step = (weight + next_weight) / 2
+            if value < next_mean:
+                return (cumulative + step * (value - mean) / (next_mean - mean)) / self.count
+            cumulative += step
+
+        last_mean, last_weight = centroids[-1]
+        return (cumulative + (value - last_mean) / (self.max - last_mean) * last_weight / 2) / self.count
+
+    def to_dict(self):
+        """Return the digest as a JSON-serializable dictionary."""
+        self._compress()
+        return {
+            'compression': self.compression,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'centroids': self._centroids
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a digest from to_dict output.
+
+        Args:
+            data: The dictionary
+
+        Returns:
+            TDigest: The digest
+        """
+        digest = cls(compression=data['compression'])
+        if data['count']:
+            digest.count = data['count']
+            digest.min = data['min']
+            digest.max = data['max']
+            digest._centroids = [[mean, weight] for mean, weight in data['centroids']]
+        return digest
@@ -0,0 +1,45 @@
+"""
+Utility functions for normalizing listing text.
+"""
+import re
+import unicodedata
+
+# Words describing the listing rather than the product (English and Italian)
+NOISE_WORDS = frozenset({
+    "a", "an", "and", "the", "for", "with", "of", "in", "new", "used", "like", "mint", "original", "box",
+    "boxed", "sealed", "perfect", "condition", "excellent", "good", "working", "tested", "sale", "offer",
+    "e", "il", "la", "lo", "le", "di", "da", "per", "con", "come", "nuovo", "nuova", "usato", "usata",
+    "perfetto", "perfetta", "condizioni", "ottime", "ottimo", "ottima", "funzionante", "originale",
+    "scatola", "vendo", "prezzo", "trattabile",
+})
+
+_UNIT_PATTERN = re.compile(r"\b(\d+(?:[.,]\d+)?)\s+(gb|tb|mb|mah|hz|ghz|mhz|mm|cm|ml|w|v)\b")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text):
+    """Lowercase text, strip accents and attach units to their numbers ("500 GB" -> "500gb")."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii").lower()
+    return _UNIT_PATTERN.sub(lambda match: match.group(1).replace(",", ".") + match.group(2), text)
+
+
+def title_tokens(text):
+    """Return the meaningful tokens of a listing title, in order."""
+    return [token for token in _TOKEN_PATTERN.findall(normalize_text(text)) if token not in NOISE_WORDS]
+
+
+def product_key(title, brand=None):
+    """
+    Build a normalized key grouping listings of the same product.
+
+    Args:
+        title: The listing title
+        brand: Optional brand name, included when it isn't already in the title
+
+    Returns:
+        str: The sorted, de-duplicated title tokens, e.g. "860 500gb evo samsung"
+    """
+    tokens = set(title_tokens(title))
+    if brand and brand.lower() != "unknown brand":
+        tokens.update(title_tokens(brand))
+    return " ".join(sorted(tokens))
@@ -0,0 +1,208 @@
+"""
+Utility functions for tracing where a run spends its time.
+
+Code wraps its steps in nested spans (run -> stage -> item -> crew kickoff -> HTTP request)
+with `with span("name", key=value):`. Tracing is off by default, and then span() returns a
+shared no-op object, so instrumented code costs a function call. Once enabled, finished spans
+are collected in memory and exported as OTLP/JSON, the OpenTelemetry file format trace
+viewers can load.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+
+SERVICE_NAME = "dealsenseai"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_state = {'enabled': False, 'trace_id': None, 'root_parent_id': None}
+_finished_spans = []
+_lock = threading.Lock()
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed operation, nested in the span that was current when it started."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = None
+        self._start = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else _state['root_parent_id']
+        self._token = _current_span.set(self)
+        self._start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.time_ns()
+        _current_span.reset(self._token)
+        span_data = {
+            'traceId': _state['trace_id'],
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self._start),
+            'endTimeUnixNano': str(end),
+            'attributes': _encode_attributes(self.attributes),
+            'status': {'code': 1}  # STATUS_CODE_OK
+        }
+        if self.parent_id:
+            span_data['parentSpanId'] = self.parent_id
+        if exc_type is not None:
+            span_data['status'] = {'code': 2, 'message': f"{exc_type.__name__}: {exc_value}"}  # STATUS_CODE_ERROR
+        with _lock:
+            _finished_spans.append(span_data)
+        return False
+
+    def set_attribute(self, key, value):
+        """Set an attribute of the span (None values are left out of the export)."""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        """Set several attributes of the span."""
+        self.attributes.update(attributes)
+
+
+def _encode_value(value):
+    """Encode an attribute value as an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _encode_attributes(attributes):
+    """Encode span attributes as OTLP KeyValues."""
+    return [{'key': key, 'value': _encode_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def enable_tracing(trace_id=None, parent_span_id=None):
+    """
+    Start collecting spans.
+
+    Args:
+        trace_id: Optional trace to add spans to (e.g. a parent process's); a new one by default
+        parent_span_id: Optional span the top-level spans of this process are nested in
+    """
+    _state['trace_id'] = trace_id or os.urandom(16).hex()
+    _state['root_parent_id'] = parent_span_id
+    _state['enabled'] = True
+
+
+def tracing_enabled():
+    """Whether spans are being collected."""
+    return _state['enabled']
+
+
+def span(name, **attributes):
+    """
+    Create a span to use as a context manager.
+
+    Args:
+        name: The name of the operation
+        **attributes: Attributes of the span, e.g. item_id
+
+    Returns:
+        The span, or a no-op span while tracing is disabled
+    """
+    if not _state['enabled']:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def trace_context():
+    """
+    Return what another process needs to continue the trace under the current span.
+
+    Returns:
+        A (trace_id, span_id) tuple, or None while tracing is disabled
+    """
+    if not _state['enabled']:
+        return None
+    current = _current_span.get()
+    return _state['trace_id'], current.span_id if current is not None else _state['root_parent_id']
+
+
+def propagate(function):
+    """
+    Bind a function to the current span, for running it on another thread.
+
+    Args:
+        function: The function to run elsewhere
+
+    Returns:
+        A function running the original in a copy of the current context at each call
+    """
+    if not _state['enabled']:
+        return function
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
+
+
+def collect_spans():
+    """Return the spans finished so far, as OTLP span dictionaries."""
+    with _lock:
+        return list(_finished_spans)
+
+
+def add_spans(spans):
+    """Add spans finished elsewhere (e.g. in a worker process) to this process's trace."""
+    with _lock:
+        _finished_spans.extend(spans or [])
+
+
+def export_trace(path):
+    """
+    Write the collected spans to an OTLP/JSON file.
+
+    Args:
+        path: The file to write
+
+    Returns:
+        The number of spans written
+    """
+    spans = sorted(collect_spans(), key=lambda span_data: int(span_data['startTimeUnixNano']))
+    document = {
+        'resourceSpans': [{
+            'resource': {'attributes': _encode_attributes({'service.name': SERVICE_NAME})},
+            'scopeSpans': [{'scope': {'name': SERVICE_NAME}, 'spans': spans}]
+        }]
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f)
+    return len(spans)